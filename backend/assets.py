@@ -0,0 +1,236 @@
+"""
+Production serving of the frontend build.
+
+``collectstatic`` with ``CompressedStaticFilesStorage`` writes a ``.gz`` and,
+when the ``brotli`` package is installed, a ``.br`` copy next to every
+compressible file in ``STATIC_ROOT``. ``serve_asset`` then answers each
+request for ``STATIC_URL`` with the smallest copy the client accepts.
+Fingerprinted files are cached by browsers for a year without revalidating,
+as their names change whenever their content does. Which files those are is
+read from the build manifests rather than guessed from names: the files
+listed in Vite's ``VITE_MANIFEST`` and, when the static files storage is a
+``ManifestStaticFilesStorage``, its hashed names. Anything else must be
+revalidated.
+
+``spa_shell`` answers every other non-API path with ``SPA_INDEX``, the
+``index.html`` Vite builds. It is read and compressed once per process and
+served from memory with an ETag, so page loads never reach the template
+engine and repeat visits get a 304. Under ``DEBUG`` it is reloaded whenever
+the file changes.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, StaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = frozenset((
+    '.css', '.html', '.ico', '.js', '.json', '.map', '.mjs', '.svg', '.txt', '.webmanifest', '.xml',
+))
+# Smaller files gain less from compression than the extra header costs
+MIN_COMPRESS_SIZE = 256
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Vite's build directory, relative to the dist directory its manifest lists
+# files in; STATICFILES_DIRS collects that directory to the root of STATIC_ROOT
+VITE_ASSETS_DIR = 'assets/'
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def compress(data):
+    """Return the encodings of ``data`` worth serving instead of it, by content coding."""
+    if len(data) < MIN_COMPRESS_SIZE:
+        return {}
+    compressed = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed['br'] = brotli.compress(data, quality=11)
+    # Not worth a separate file unless it saves at least 5%
+    return {encoding: body for encoding, body in compressed.items() if len(body) < len(data) * 0.95}
+
+
+class CompressedStaticFilesStorage(StaticFilesStorage):
+    """Write precompressed ``.gz`` and ``.br`` copies of collected static files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        for name in paths:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = self.path(name)
+            with open(path, 'rb') as fh:
+                variants = compress(fh.read())
+            for encoding, suffix in ENCODINGS:
+                if encoding in variants:
+                    with open(path + suffix, 'wb') as fh:
+                        fh.write(variants[encoding])
+                elif os.path.exists(path + suffix):
+                    # Left over from an earlier, different version of the file
+                    os.remove(path + suffix)
+            yield name, name, bool(variants)
+
+
+def accepted_encodings(request):
+    """Return the content codings the client accepts, ignoring ``q=0`` ones."""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, *params = (item.strip() for item in part.split(';'))
+        try:
+            quality = next((float(param[2:]) for param in params if param.startswith('q=')), 1.0)
+        except ValueError:
+            continue
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def negotiate_encoding(request, available):
+    """Return the preferred of the ``available`` content codings the client accepts, or ``None``."""
+    accepted = accepted_encodings(request)
+    return next((encoding for encoding, _ in ENCODINGS if encoding in available and encoding in accepted), None)
+
+
+@lru_cache(maxsize=None)
+def fingerprinted_files():
+    """Return the paths, relative to ``STATIC_ROOT``, of the files named after their content."""
+    names = set()
+    try:
+        with open(settings.VITE_MANIFEST, encoding='utf-8') as fh:
+            chunks = json.load(fh).values()
+    except FileNotFoundError:
+        chunks = ()
+    for chunk in chunks:
+        for name in (chunk['file'], *chunk.get('css', ()), *chunk.get('assets', ())):
+            names.add(name.removeprefix(VITE_ASSETS_DIR))
+    if isinstance(staticfiles_storage, ManifestFilesMixin):
+        names.update(staticfiles_storage.hashed_files.values())
+    return frozenset(names)
+
+
+def is_fingerprinted(path):
+    return path in fingerprinted_files()
+
+
+@lru_cache(maxsize=4096)
+def find_asset(path):
+    """
+    Return ``(content_type, variants)`` for the static file at ``path``,
+    where ``variants`` maps each available content coding (``None`` for the
+    original) to its file name and ``os.stat`` result. Raise ``Http404`` if
+    there is no such file.
+    """
+    try:
+        filename = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Not found")
+    if not os.path.isfile(filename):
+        raise Http404("Not found")
+
+    variants = {None: (filename, os.stat(filename))}
+    for encoding, suffix in ENCODINGS:
+        if os.path.isfile(filename + suffix):
+            variants[encoding] = (filename + suffix, os.stat(filename + suffix))
+    content_type, _ = mimetypes.guess_type(filename)
+    return content_type or 'application/octet-stream', variants
+
+
+def serve_asset(request, path):
+    """Serve a collected static file, precompressed if the client accepts it."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    if settings.DEBUG:
+        # Pick up files written by collectstatic or Vite without a restart
+        find_asset.cache_clear()
+        fingerprinted_files.cache_clear()
+    content_type, variants = find_asset(path)
+
+    encoding = negotiate_encoding(request, variants)
+    filename, stat = variants[encoding]
+    etag = '"%x-%x%s"' % (stat.st_mtime_ns, stat.st_size, f'-{encoding}' if encoding else '')
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = FileResponse(open(filename, 'rb'), content_type=content_type)
+        response['Content-Length'] = stat.st_size
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if len(variants) > 1:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if is_fingerprinted(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+class SpaShell:
+    """``SPA_INDEX`` and its compressed encodings, held in memory."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.load()
+
+    def load(self):
+        with open(self.path, 'rb') as fh:
+            mtime = os.fstat(fh.fileno()).st_mtime_ns
+            body = fh.read()
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        # Swapped in one assignment so readers never mix two versions
+        self.current = etag, {None: body, **compress(body)}
+        self.mtime = mtime
+
+    def reload_if_changed(self):
+        with self.lock:
+            if os.stat(self.path).st_mtime_ns != self.mtime:
+                self.load()
+
+    def response(self, request):
+        etag, variants = self.current
+        encoding = negotiate_encoding(request, variants)
+        if encoding:
+            etag = f'{etag[:-1]}-{encoding}"'
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(variants[encoding], content_type='text/html; charset=utf-8')
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        # Revalidate on every visit so a new deployment is picked up at once
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+@lru_cache(maxsize=None)
+def get_spa_shell():
+    return SpaShell(settings.SPA_INDEX)
+
+
+def spa_shell(request, *args, **kwargs):
+    """Serve the single-page app's ``index.html`` for any client-side route."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    shell = get_spa_shell()
+    if settings.DEBUG:
+        shell.reload_if_changed()
+    return shell.response(request)
@@ -0,0 +1,93 @@
+"""
+A minimal async request cycle for the hot read endpoints.
+
+DRF views are synchronous, so under an ASGI server every request holds a
+worker thread for as long as it waits on the database. Views built with
+``async_api_view`` instead run on the event loop: they authenticate the JWT
+the same way ``CachedJWTAuthentication`` does, call the handler coroutine,
+which uses the async ORM, and render its ``Response`` with ``FastJSONRenderer``.
+Errors are turned into responses by DRF's exception handler, so clients see
+the same status codes and bodies as from the DRF views.
+
+Only GET and HEAD are served asynchronously. Other methods on the same URL
+are passed to the DRF view in a thread, so write actions keep working.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from .authentication import CachedJWTAuthentication, stateless_authentication
+from .renderers import FastJSONRenderer
+
+jwt_authentication = CachedJWTAuthentication()
+
+
+async def authenticate(request, stateless=False):
+    """
+    Return the user named by the request's access token, or raise like
+    ``JWTAuthentication``. With ``stateless`` the user is a ``TokenUser``.
+    """
+    header = jwt_authentication.get_header(request)
+    raw_token = jwt_authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        raise exceptions.NotAuthenticated()
+    validated_token = jwt_authentication.get_validated_token(raw_token)
+    if stateless:
+        return stateless_authentication.get_user(validated_token)
+    return await sync_to_async(jwt_authentication.get_user)(validated_token)
+
+
+def render(response):
+    """Render a DRF ``Response`` into a plain ``HttpResponse`` on the event loop."""
+    if not isinstance(response, Response):
+        return response
+    rendered = HttpResponse(
+        FastJSONRenderer().render(response.data), status=response.status_code,
+        content_type=FastJSONRenderer.media_type,
+    )
+    for header, value in response.items():
+        rendered[header] = value
+    # DRF views offer the browsable API as well, so their responses vary by Accept
+    patch_vary_headers(rendered, ('Accept',))
+    return rendered
+
+
+def handle_exception(exc):
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        exc.auth_header = jwt_authentication.authenticate_header(None)
+    response = exception_handler(exc, {})
+    if response is None:
+        raise exc
+    return response
+
+
+def async_api_view(sync_view, stateless_read=False):
+    """
+    Serve GET and HEAD requests with the decorated coroutine, as an
+    authenticated user, and every other method with ``sync_view``. With
+    ``stateless_read`` the user is a ``TokenUser`` when ``STATELESS_READS``
+    is on.
+    """
+    def decorator(handler):
+        async def view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+            request = Request(request)
+            try:
+                request.user = await authenticate(request, stateless_read and settings.STATELESS_READS)
+                response = await handler(request, *args, **kwargs)
+            except (exceptions.APIException, Http404) as exc:
+                response = handle_exception(exc)
+            return render(response)
+
+        view.__name__ = handler.__name__
+        view.__doc__ = handler.__doc__
+        return csrf_exempt(view)
+    return decorator
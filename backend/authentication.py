@@ -0,0 +1,109 @@
+"""
+JWT authentication without a user query on every request.
+
+``CachedJWTAuthentication`` resolves the user named by an access token from
+the ``PRINCIPAL_CACHE`` cache, falling back to the database and caching the
+row for ``PRINCIPAL_CACHE_TIMEOUT`` seconds. The password hash is never
+cached. Entries are dropped whenever the user is saved or deleted and
+whenever their counters change (``users.counters``), since views put
+``feed_version`` into ETags. Updates that bypass both, such as raw SQL or
+``User.objects.update()``, are picked up when the entry expires. With the
+default local-memory cache, each process drops only its own entries; set
+``CACHE_DIR`` or configure a shared cache so a deactivation applies to every
+process at once.
+
+With ``STATELESS_READS`` on, the read actions listed in a viewset's
+``stateless_read_actions`` skip the lookup altogether: ``request.user`` is a
+``TokenUser`` built from the token's claims, which only has an ``id``. The
+token is still verified, but a user deactivated after it was issued keeps
+access to those actions until it expires.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+def principal_key(user_id):
+    return f'principal:{user_id}'
+
+
+def principal_cache():
+    return caches[settings.PRINCIPAL_CACHE]
+
+
+def forget_principals(*user_ids):
+    """Drop the cached users, now and again once the current transaction commits."""
+    if not user_ids:
+        return
+    keys = [principal_key(user_id) for user_id in user_ids]
+    principal_cache().delete_many(keys)
+    # A request may cache the old row again before the change is committed
+    transaction.on_commit(lambda: principal_cache().delete_many(keys))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that looks users up in ``PRINCIPAL_CACHE`` first."""
+
+    def get_user(self, validated_token):
+        # Checking for revoked tokens needs the password hash, which is not cached
+        if api_settings.CHECK_REVOKE_TOKEN or not settings.PRINCIPAL_CACHE_TIMEOUT:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        user = self.cached_user(user_id)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            self.cache_user(user_id, user)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+    def cached_user(self, user_id):
+        cached = principal_cache().get(principal_key(user_id))
+        if cached is None:
+            return None
+        db, values = cached
+        # The password stays deferred and is loaded if anything reads it
+        return self.user_model.from_db(db, list(values), list(values.values()))
+
+    def cache_user(self, user_id, user):
+        values = {
+            field.attname: getattr(user, field.attname)
+            for field in self.user_model._meta.concrete_fields if field.attname != 'password'
+        }
+        principal_cache().set(
+            principal_key(user_id), (user._state.db, values), settings.PRINCIPAL_CACHE_TIMEOUT
+        )
+
+
+stateless_authentication = JWTStatelessUserAuthentication()
+
+
+class StatelessReadsMixin:
+    """
+    Authenticate the viewset actions in ``stateless_read_actions`` with a
+    ``TokenUser`` instead of a user row when ``STATELESS_READS`` is on. Those
+    actions may only read ``request.user.id``.
+    """
+    stateless_read_actions = ()
+
+    def get_authenticators(self):
+        # Called before the action is resolved, so resolve it from the method
+        method = self.request.method
+        if (
+            settings.STATELESS_READS and method in SAFE_METHODS
+            and self.action_map.get(method.lower()) in self.stateless_read_actions
+        ):
+            return [stateless_authentication]
+        return super().get_authenticators()
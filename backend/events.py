@@ -0,0 +1,114 @@
+"""
+Server-Sent Events stream of the requesting user's real-time events.
+
+``GET /api/events/`` holds the response open and writes one SSE message per
+event published to the user's channel:
+
+- ``post.created`` when one of their accepted connections posts
+- ``connection.requested`` when someone sends them a connection request
+- ``connection.accepted`` when a request they sent is accepted
+
+The ``data`` of each message is the event as JSON. A comment line is sent
+every ``EVENT_STREAM_HEARTBEAT`` seconds to keep proxies from timing the
+stream out. Events are not replayed, so clients should refetch the feed
+after reconnecting.
+
+``EventSource`` cannot send an ``Authorization`` header, and access tokens
+must not end up in URLs, where access logs, proxies and browser history keep
+them. Clients therefore ``POST /api/events/ticket/`` with their access token
+for a ``StreamTicket`` and open the stream with it as the ``ticket`` query
+parameter. A ticket only opens streams, within
+``EVENT_STREAM_TICKET_LIFETIME`` seconds of being issued; it is no bearer
+token for the rest of the API. The stream is only served when
+``ASYNC_VIEWS`` is on: under WSGI it would hold a worker
+thread for as long as the client stays connected. Otherwise both routes
+answer 501, so clients know not to subscribe.
+"""
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from rest_framework import exceptions, permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .asyncapi import authenticate, handle_exception, jwt_authentication, render
+from .pubsub import get_broker, user_channel
+
+# Milliseconds EventSource waits before reconnecting
+RECONNECT_DELAY = 3000
+
+
+def format_event(event):
+    data = json.dumps(event, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+class StreamTicket(AccessToken):
+    """A short-lived token that only opens event streams."""
+    token_type = 'stream'
+
+    @property
+    def lifetime(self):
+        return timedelta(seconds=settings.EVENT_STREAM_TICKET_LIFETIME)
+
+
+async def authenticate_stream(request):
+    raw_ticket = request.query_params.get('ticket')
+    if raw_ticket is None:
+        return await authenticate(request)
+    try:
+        ticket = StreamTicket(raw_ticket)
+    except TokenError:
+        raise exceptions.AuthenticationFailed("Invalid or expired stream ticket.")
+    return await sync_to_async(jwt_authentication.get_user)(ticket)
+
+
+async def stream(subscription):
+    async with subscription:
+        yield f"retry: {RECONNECT_DELAY}\n\n"
+        while True:
+            event = await subscription.get(settings.EVENT_STREAM_HEARTBEAT)
+            yield ": keepalive\n\n" if event is None else format_event(event)
+
+
+async def event_stream(request):
+    """Stream the requesting user's events as Server-Sent Events."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        user = await authenticate_stream(Request(request))
+    except exceptions.APIException as exc:
+        return render(handle_exception(exc))
+
+    # Subscribe before responding so nothing published meanwhile is missed
+    subscription = get_broker().subscribe([user_channel(user.pk)])
+    response = StreamingHttpResponse(stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+EVENTS_UNAVAILABLE = "Real-time events are not enabled on this server."
+
+
+def events_unavailable(request):
+    """Answer ``/api/events/`` when the stream is not served, see above."""
+    return JsonResponse({"detail": EVENTS_UNAVAILABLE}, status=501)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def event_ticket(request):
+    """Issue a ``StreamTicket`` for the authenticated user."""
+    if not settings.ASYNC_VIEWS:
+        return Response({"detail": EVENTS_UNAVAILABLE}, status=status.HTTP_501_NOT_IMPLEMENTED)
+    ticket = StreamTicket.for_user(request.user)
+    return Response({"ticket": str(ticket), "expires_in": settings.EVENT_STREAM_TICKET_LIFETIME})
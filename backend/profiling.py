@@ -0,0 +1,236 @@
+"""
+Opt-in per-request SQL profiling.
+
+With ``SQL_PROFILING`` on, ``SQLProfilingMiddleware`` records for every
+request:
+
+- the number of queries and the time spent in the database
+- the time spent in serializer ``.data``, not counting queries it issued
+- the time spent rendering the response
+- the fingerprint of every query, i.e. its SQL with literals and ``IN``
+  lists collapsed
+
+Fingerprints seen more than once in a request are reported as duplicated;
+these are usually N+1 patterns. The figures are sent back in a
+``Server-Timing`` header. The last ``SQL_PROFILING_WINDOW`` requests per
+endpoint are written to ``SQL_PROFILING_DIR`` every
+``SQL_PROFILING_FLUSH_SECONDS``, one file per process, for the
+``sql_profile`` management command to merge and report.
+
+With ``SQL_PROFILING`` off the middleware removes itself at startup and no
+hook is installed, so requests pay nothing.
+"""
+import atexit
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+
+_profile = ContextVar('sql_profile', default=None)
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)')
+
+
+def fingerprint(sql):
+    """Return ``sql`` with parameters, literals and ``IN`` lists made uniform."""
+    sql = LITERAL_RE.sub('?', sql.replace('%s', '?'))
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.fingerprints = Counter()
+        self.serializing = False
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    def server_timing(self, total):
+        duplicated = sum(count - 1 for count in self.duplicates().values())
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries ({duplicated} duplicated)"',
+            f'serialize;dur={self.serialize_time * 1000:.2f}',
+            f'render;dur={self.render_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ))
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_time += time.perf_counter() - started
+        profile.queries += 1
+        profile.fingerprints[fingerprint(sql)] += 1
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def profiled_serializer_data(data):
+    def fget(serializer):
+        profile = _profile.get()
+        if profile is None or profile.serializing:
+            return data.fget(serializer)
+        profile.serializing = True
+        started, db_time = time.perf_counter(), profile.db_time
+        try:
+            return data.fget(serializer)
+        finally:
+            profile.serializing = False
+            profile.serialize_time += time.perf_counter() - started - (profile.db_time - db_time)
+    fget.profiled = True
+    return property(fget)
+
+
+_install_lock = threading.Lock()
+
+
+def install_hooks():
+    """Start recording queries and serializer time; safe to call repeatedly."""
+    with _install_lock:
+        connection_created.connect(install_query_recorder, dispatch_uid='sql_profiling')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection=connection)
+        if not getattr(BaseSerializer.data.fget, 'profiled', False):
+            BaseSerializer.data = profiled_serializer_data(BaseSerializer.data)
+
+
+class ProfileAggregate:
+    """The last ``window`` samples of every endpoint seen by this process."""
+
+    def __init__(self, window=None):
+        self.window = window or settings.SQL_PROFILING_WINDOW
+        self.endpoints = {}
+        self.lock = threading.Lock()
+        self.flushed = time.monotonic()
+
+    def add(self, endpoint, total, profile):
+        sample = (
+            round(total * 1000, 3), round(profile.db_time * 1000, 3), profile.queries,
+            round(profile.serialize_time * 1000, 3), round(profile.render_time * 1000, 3),
+            sorted(profile.duplicates().items()),
+        )
+        with self.lock:
+            self.endpoints.setdefault(endpoint, deque(maxlen=self.window)).append(sample)
+
+    def snapshot(self):
+        with self.lock:
+            return {endpoint: list(samples) for endpoint, samples in self.endpoints.items()}
+
+    def path(self):
+        return os.path.join(settings.SQL_PROFILING_DIR, f'{socket.gethostname()}-{os.getpid()}.json')
+
+    def flush(self, force=False):
+        """Write the samples to this process's file if ``SQL_PROFILING_FLUSH_SECONDS`` have passed."""
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.SQL_PROFILING_FLUSH_SECONDS:
+            return
+        self.flushed = now
+        snapshot = self.snapshot()
+        if not snapshot:
+            return
+        os.makedirs(settings.SQL_PROFILING_DIR, exist_ok=True)
+        # Replace the file atomically so sql_profile never reads half of it
+        fd, temporary = tempfile.mkstemp(dir=settings.SQL_PROFILING_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump({'endpoints': snapshot}, fh)
+        os.replace(temporary, self.path())
+
+
+aggregate = None
+
+
+def get_aggregate():
+    global aggregate
+    if aggregate is None:
+        aggregate = ProfileAggregate()
+        atexit.register(flush_at_exit)
+    return aggregate
+
+
+def flush_at_exit():
+    if aggregate is not None and settings.SQL_PROFILING:
+        aggregate.flush(force=True)
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return f"{request.method} {match.view_name if match else request.path}"
+
+
+class SQLProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SQL_PROFILING:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        install_hooks()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns
+        profile = _profile.get()
+        if profile is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                profile.render_time += time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing(total)
+        aggregate = get_aggregate()
+        aggregate.add(endpoint_name(request), total, profile)
+        aggregate.flush()
+        return response
@@ -0,0 +1,130 @@
+"""
+Publish/subscribe for real-time events.
+
+Events are JSON-serializable dicts with a ``type`` key, published to named
+channels (``user:<id>`` for everything addressed to one user) and delivered
+to the ``/api/events/`` streams subscribed to them. ``publish_event`` sends
+once the current transaction commits, so clients never hear about rows they
+cannot read yet.
+
+The broker is pluggable through ``EVENT_BROKER``. A broker implements
+``publish(channels, event)``, which may be called from any thread,
+``subscribe(channels)``, which returns a ``Subscription`` bound to the
+calling event loop, and ``unsubscribe(subscription)``.
+``InProcessBroker`` delivers events to subscribers in the same process only.
+That is enough for a single ASGI worker and for tests. Deployments with
+several workers need a broker backed by a shared message bus.
+"""
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """
+    A bounded queue of the events published to some channels, read with
+    ``await subscription.get(timeout)`` on the loop that created it. When a
+    slow reader lets the queue fill up, the oldest events are dropped.
+    """
+
+    def __init__(self, broker, channels, maxsize=None):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize or settings.EVENT_STREAM_QUEUE_SIZE)
+        self.dropped = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def deliver(self, event):
+        """Queue ``event`` from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The subscriber's loop has shut down
+            self.close()
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Return the next event, or ``None`` if none arrives within ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Deliver events to the subscribers of this process."""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, channels, event):
+        with self.lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self.subscribers.get(channel, ()))
+        for subscription in targets:
+            subscription.deliver(event)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[channel]
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.EVENT_BROKER)()
+
+
+def publish_event(user_ids, event_type, **data):
+    """Send an event to each of ``user_ids`` once the current transaction commits."""
+    channels = [user_channel(user_id) for user_id in user_ids]
+    if not channels:
+        return
+    event = {'type': event_type, **data}
+
+    def send():
+        try:
+            get_broker().publish(channels, event)
+        except Exception:
+            logger.exception("Failed to publish %s event", event_type)
+
+    transaction.on_commit(send)
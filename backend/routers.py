@@ -0,0 +1,91 @@
+"""
+Primary/replica database routing.
+
+Every write goes to the ``default`` (primary) database. Reads go there too,
+except inside ``replica_reads``, which the feed, user search and profile
+views enter through ``replica_view``: there the ORM reads from one of the
+``DATABASE_REPLICAS`` aliases. A user whose own post or connection just
+changed is pinned to the primary for ``DATABASE_REPLICA_PIN_SECONDS`` so they
+read their own writes while the replicas catch up. Pins are kept in the
+``DATABASE_REPLICA_PIN_CACHE`` cache, which must be shared by every worker
+process for pinning to follow a user between them.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_alias = ContextVar('replica_alias', default=None)
+
+
+def pin_key(user_id):
+    return f'db-primary:{user_id}'
+
+
+def pin_to_primary(*user_ids):
+    """Send the next ``DATABASE_REPLICA_PIN_SECONDS`` of replica reads by these users to the primary."""
+    if settings.DATABASE_REPLICAS and user_ids:
+        caches[settings.DATABASE_REPLICA_PIN_CACHE].set_many(
+            {pin_key(user_id): True for user_id in user_ids}, settings.DATABASE_REPLICA_PIN_SECONDS
+        )
+
+
+def is_pinned(user_id):
+    return bool(caches[settings.DATABASE_REPLICA_PIN_CACHE].get(pin_key(user_id)))
+
+
+@contextmanager
+def replica_reads(user=None):
+    """
+    Route the ORM reads made inside the block to a replica, unless ``user``
+    is pinned to the primary. Yields the alias reads will use.
+    """
+    alias = None
+    if settings.DATABASE_REPLICAS and not (user is not None and user.pk and is_pinned(user.pk)):
+        alias = random.choice(settings.DATABASE_REPLICAS)
+    token = _replica_alias.set(alias)
+    try:
+        yield alias or DEFAULT_DB_ALIAS
+    finally:
+        _replica_alias.reset(token)
+
+
+def replica_view(view):
+    """Run a viewset action or async view handler inside ``replica_reads`` for the requesting user."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with replica_reads(request.user):
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            with replica_reads(request.user):
+                return view(self, request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _replica_alias.get()
+        # Reads inside a transaction on the primary must see its writes
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
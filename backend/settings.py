@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,9 +44,11 @@ INSTALLED_APPS = [
     'rest_framework',
     'users',
     'posts',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'backend.profiling.SQLProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -79,13 +82,108 @@ AUTH_USER_MODEL = "users.User"
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Configured from the environment (see README). DB_ENGINE=postgresql selects
+# PostgreSQL, with a psycopg connection pool of up to DB_POOL_MAX_SIZE
+# connections, or persistent connections kept for DB_CONN_MAX_AGE seconds
+# when DB_POOL_MAX_SIZE is 0. Otherwise the database is the SQLite file
+# DB_NAME. DB_REPLICAS lists read replicas, comma separated: host[:port] for
+# PostgreSQL, file paths for SQLite.
+
+# SQLite production mode
+# DB_SQLITE_PRODUCTION=1 opens every SQLite connection with the pragmas below:
+# WAL journaling, so reads no longer wait for a writer to commit; NORMAL
+# syncs, which stay corruption-safe in WAL mode but may lose the last commits
+# on power loss; memory-mapped reads and a 64 MB page cache; and a busy
+# timeout in place of immediate "database is locked" errors. Transactions
+# begin IMMEDIATE, so the write endpoints, which each run in one
+# transaction, queue for the write lock up front instead of failing to
+# upgrade a read lock halfway through.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # in KiB when negative
+    'temp_store': 'MEMORY',
+}
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    'transaction_mode': 'IMMEDIATE',
+}
+
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+def database(replica=None):
+    if os.environ.get('DB_ENGINE', 'sqlite3') != 'postgresql':
+        config = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': replica or os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+        if os.environ.get('DB_SQLITE_PRODUCTION') == '1':
+            config['OPTIONS'] = dict(SQLITE_PRODUCTION_OPTIONS)
+        return config
+
+    host, _, port = (replica or '').partition(':')
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'backend'),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': host or os.environ.get('DB_HOST', ''),
+        'PORT': port or os.environ.get('DB_PORT', ''),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    pool_size = int(os.environ.get('DB_POOL_MAX_SIZE', '0'))
+    if pool_size:
+        # Pooled connections are returned to the pool at the end of each
+        # request, so they must not also be persistent
+        config['CONN_MAX_AGE'] = 0
+        config['OPTIONS'] = {'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': pool_size,
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        }}
+    else:
+        config['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+    return config
+
+
+DATABASES = {'default': database()}
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(','))):
+    # Tests read and write the primary's test database through every alias
+    DATABASES[f'replica_{index}'] = {**database(replica.strip()), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['backend.routers.PrimaryReplicaRouter']
+
+# Read replicas
+# Aliases the feed, user search and profile reads are spread over, and how
+# long a user's reads stay on the primary after they post or change a
+# connection. Pins are stored in DATABASE_REPLICA_PIN_CACHE, which has to be
+# shared between worker processes (CACHE_DIR or an external cache).
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_REPLICA_PIN_SECONDS = 5
+DATABASE_REPLICA_PIN_CACHE = 'default'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default; set CACHE_DIR to share a file-based cache between
+# worker processes on one host.
+
+if os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'backend',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
     }
-}
 
 
 # Password validation
@@ -134,6 +232,20 @@ STATICFILES_DIRS=[
         # os.path.join(BASE_DIR, 'template/build/static'),
 ]
 
+# collectstatic writes gzip (and, with the brotli package, brotli) copies of
+# compressible files. Unless DEBUG is on or DJANGO_SERVE_STATIC=0 because a
+# web server serves STATIC_ROOT itself, STATIC_URL is served from
+# STATIC_ROOT, precompressed, by backend.assets. The files listed in
+# VITE_MANIFEST are cached by browsers for a year. SPA_INDEX is the page
+# served for every path outside the API, held in memory.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'backend.assets.CompressedStaticFilesStorage'},
+}
+SERVE_STATIC = os.environ.get('DJANGO_SERVE_STATIC', '1') == '1'
+SPA_INDEX = BASE_DIR / 'frontend' / 'dist' / 'index.html'
+VITE_MANIFEST = BASE_DIR / 'frontend' / 'dist' / '.vite' / 'manifest.json'
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -142,9 +254,163 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'backend.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+}
+
+# Authentication
+# Users named by access tokens are cached in PRINCIPAL_CACHE for
+# PRINCIPAL_CACHE_TIMEOUT seconds (0 looks them up on every request) instead
+# of being read from the database on each request. With STATELESS_READS on,
+# user search, suggestions and mutual connections trust the token's user ID
+# without checking that the user still exists or is active.
+PRINCIPAL_CACHE = 'default'
+PRINCIPAL_CACHE_TIMEOUT = int(os.environ.get('PRINCIPAL_CACHE_TIMEOUT', 30))
+STATELESS_READS = os.environ.get('DJANGO_STATELESS_READS') == '1'
+
+# ASGI
+# Serve the feed, post and user retrieve, user search and connections with
+# native async views instead of DRF's synchronous ones. Enable it when running
+# under an ASGI server (see README); under WSGI every async view would need an
+# event loop of its own.
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS') == '1'
+
+# Real-time events
+# Broker carrying post and connection events to the /api/events/ Server-Sent
+# Events stream, which is served under ASGI only. The in-process broker only
+# reaches clients connected to the same process; run a single ASGI worker
+# with it, or plug in a broker backed by a shared message bus. Each stream
+# buffers up to EVENT_STREAM_QUEUE_SIZE events for a slow client and sends a
+# keepalive after EVENT_STREAM_HEARTBEAT idle seconds. Streams are opened
+# with tickets valid for EVENT_STREAM_TICKET_LIFETIME seconds.
+EVENT_BROKER = 'backend.pubsub.InProcessBroker'
+EVENT_STREAM_QUEUE_SIZE = 100
+EVENT_STREAM_HEARTBEAT = 15
+EVENT_STREAM_TICKET_LIFETIME = 30
+
+# SQL profiling
+# DJANGO_SQL_PROFILING=1 turns on backend.profiling.SQLProfilingMiddleware,
+# which adds a Server-Timing header with the query count, duplicated queries
+# and database, serialization and render time to every response. It also
+# keeps the last SQL_PROFILING_WINDOW requests per endpoint and writes them
+# to SQL_PROFILING_DIR every SQL_PROFILING_FLUSH_SECONDS for
+# `manage.py sql_profile`. Off, the middleware removes itself at startup.
+SQL_PROFILING = os.environ.get('DJANGO_SQL_PROFILING') == '1'
+SQL_PROFILING_DIR = os.environ.get('SQL_PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'backend-sql-profile'))
+SQL_PROFILING_WINDOW = 1000
+SQL_PROFILING_FLUSH_SECONDS = 5
+
+# Background jobs
+# Work that can finish after the response (image variants, private post
+# fan-out, timeline backfills) is queued in the Job table in the same
+# transaction as the write and run by `python manage.py runworker`. At most
+# JOBS_QUEUES[queue] jobs of a queue run at once, across all worker
+# processes.
+# Failed jobs are retried JOBS_MAX_ATTEMPTS times in all, after
+# JOBS_RETRY_BACKOFF seconds doubling up to JOBS_RETRY_BACKOFF_MAX. Jobs
+# running for more than JOBS_LOCK_TIMEOUT seconds are assumed lost and run
+# again; succeeded jobs are deleted after JOBS_RETENTION seconds. With
+# DJANGO_JOBS_EAGER=1 jobs run inside the request instead, with no worker;
+# that is the default under DEBUG so that a plain runserver delivers private
+# posts. Set DJANGO_JOBS_EAGER=0 to queue them anyway.
+JOBS_EAGER = os.environ.get('DJANGO_JOBS_EAGER', '1' if DEBUG else '0') == '1'
+JOBS_QUEUES = {
+    'default': 1,
+    'feed': 2,
+    'images': 1,
+}
+JOBS_POLL_INTERVAL = 1.0
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 10
+JOBS_RETRY_BACKOFF_MAX = 60 * 60
+JOBS_LOCK_TIMEOUT = 10 * 60
+JOBS_RETENTION = 7 * 24 * 60 * 60
+
+# Lean serialization
+# Render the feed and user list from .values() rows instead of model
+# instances and DRF fields. The output is identical either way.
+LEAN_SERIALIZATION = True
+
+# Post images
+# Uploaded images are re-encoded without metadata at each width below by a
+# job on the 'images' queue once the post is saved. Set POST_IMAGE_ASYNC to
+# False to build them inside the request instead.
+POST_IMAGE_VARIANTS = {
+    'thumbnail': 320,
+    'feed': 1080,
+    'full': 2048,
 }
+POST_IMAGE_FORMAT = 'WEBP'  # or 'JPEG' for progressive JPEG
+POST_IMAGE_QUALITY = 80
+POST_IMAGE_ASYNC = True
+
+# Post image uploads are streamed to disk and refused as soon as they are
+# known to exceed POST_IMAGE_MAX_UPLOAD_SIZE or are not an image. Point
+# POST_IMAGE_UPLOAD_TEMP_DIR at a directory on the same filesystem as
+# MEDIA_ROOT so storing an upload is a rename rather than a copy; None uses
+# FILE_UPLOAD_TEMP_DIR.
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POST_IMAGE_UPLOAD_TEMP_DIR = None
+
+# Serialized post fragments
+# Cache alias and lifetime of the viewer-independent representation of each
+# post; a timeout of 0 disables the fragment cache.
+POST_FRAGMENT_CACHE = 'default'
+POST_FRAGMENT_CACHE_TIMEOUT = 300
+
+# Post likes
+# Like counts are not written by the liking request. Each process adds up the
+# changes per post and writes them in one batch at most
+# LIKE_COUNT_FLUSH_INTERVAL seconds after the first one, or as soon as
+# LIKE_COUNT_BUFFER_SIZE posts have pending changes; 0 writes every change at
+# once. Changes pending in a process that dies are lost until
+# `manage.py reconcile_counters` recounts them.
+LIKE_COUNT_FLUSH_INTERVAL = 2
+LIKE_COUNT_BUFFER_SIZE = 1000
+
+# Feed pagination
+# Page size used by the keyset-paginated post endpoints when the client does
+# not ask for one, and the largest page a client may request via ?page_size=.
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+# Connection graph cache
+# Each process keeps the accepted neighbour IDs of up to
+# CONNECTION_GRAPH_CACHE_SIZE users. Local writes invalidate entries
+# immediately; CONNECTION_GRAPH_CACHE_TTL bounds staleness from other processes.
+CONNECTION_GRAPH_CACHE_SIZE = 10000
+CONNECTION_GRAPH_CACHE_TTL = 60
+
+# HTTP caching
+# max-age sent with public post responses; shared caches revalidate them by
+# ETag once it has passed.
+HTTP_CACHE_PUBLIC_MAX_AGE = 0
+
+# Bulk connection operations
+# Largest number of user IDs accepted by one bulk connection request.
+CONNECTION_BULK_MAX_IDS = 500
+
+# User search
+# Default and maximum page size for the user list and search endpoint.
+USER_SEARCH_PAGE_SIZE = 20
+USER_SEARCH_MAX_PAGE_SIZE = 100
+
+# Connection suggestions
+# Number of ranked suggestions kept per user by `manage.py compute_suggestions`.
+SUGGESTIONS_TOP_K = 20
+
+# Feed timelines
+# Private posts are pushed into the timelines of the author's connections on
+# write. Authors with more connections than FEED_FANOUT_MAX_DEGREE are pulled
+# into feeds at read time instead. FEED_BACKFILL_LIMIT caps how many recent
+# posts are copied into a timeline when a connection is accepted.
+FEED_FANOUT_MAX_DEGREE = 1000
+FEED_FANOUT_BATCH_SIZE = 500
+FEED_BACKFILL_LIMIT = 200
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
@@ -22,17 +24,22 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from django.urls import path, include, re_path
-from users.views import IndexView
+from .assets import serve_asset, spa_shell
+from .events import event_stream, event_ticket, events_unavailable
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/',include('users.urls')),
     path('api/',include('posts.urls')),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('', IndexView.as_view(), name='index'),
-    re_path(r'^(?!assets/).*$', IndexView.as_view(), name='index'),
+    path('api/events/ticket/', event_ticket, name='event_ticket'),
+    path('api/events/', event_stream if settings.ASYNC_VIEWS else events_unavailable, name='events'),
+    path('', spa_shell, name='index'),
+    re_path(r'^(?!assets/).*$', spa_shell, name='index'),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.BASE_DIR / 'frontend' / 'dist' / 'assets')
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.BASE_DIR / 'frontend' / 'dist' / 'assets')
+elif settings.SERVE_STATIC:
+    urlpatterns.append(re_path(r'^%s(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_asset))
\ No newline at end of file
@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import Auth from '../services/Auth';
 import Posts from '../services/Posts';
+import Events from '../services/Events';
 
 function Home() {
   const navigate = useNavigate();
@@ -35,6 +36,20 @@ function Home() {
     fetchData();
   }, [navigate]);
 
+  // New posts from connections are pushed by the server instead of polled for
+  useEffect(() => {
+    return Events.subscribe({
+      'post.created': async ({ post_id }) => {
+        try {
+          const post = await Posts.getPost(post_id);
+          setPosts((current) => current.some(p => p.id === post.id) ? current : [post, ...current]);
+        } catch (error) {
+          console.error('Error fetching new post:', error);
+        }
+      }
+    });
+  }, []);
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -51,7 +66,6 @@ function Home() {
       const enrichedPost = {
         ...post,
         author: currentUser,
-        likes: [],
         comments: []
       };
 
@@ -64,10 +78,10 @@ function Home() {
 
   const handleLike = async (postId) => {
     try {
-      const updatedPost = await Posts.likePost(postId, currentUser.id);
+      await Posts.likePost(postId);
       setPosts(posts.map(post =>
         post.id === postId
-          ? { ...post, likes: [...post.likes, currentUser] }
+          ? { ...post, liked_by_me: true, like_count: post.like_count + 1 }
           : post
       ));
     } catch (error) {
@@ -77,10 +91,10 @@ function Home() {
 
   const handleUnlike = async (postId) => {
     try {
-      const updatedPost = await Posts.unlikePost(postId, currentUser.id);
+      await Posts.unlikePost(postId);
       setPosts(posts.map(post =>
         post.id === postId
-          ? { ...post, likes: post.likes.filter(user => user.id !== currentUser.id) }
+          ? { ...post, liked_by_me: false, like_count: Math.max(post.like_count - 1, 0) }
           : post
       ));
     } catch (error) {
@@ -165,7 +179,7 @@ function Home() {
             {post.image && (
               <div className="mb-4">
                 <img
-                  src={`http://localhost:8000${post.image}`}
+                  src={post.image_variants?.feed || post.image}
                   alt="Post content"
                   className="rounded-lg w-full h-auto"
                   loading="lazy"
@@ -175,11 +189,10 @@ function Home() {
             <div className="flex items-center justify-between text-sm text-gray-500">
               <div className="flex items-center space-x-4">
                 <button
-                  onClick={() => {}}
-                  className="flex items-center space-x-1 text-gray-500 cursor-not-allowed"
-                  disabled
+                  onClick={() => (post.liked_by_me ? handleUnlike(post.id) : handleLike(post.id))}
+                  className={`flex items-center space-x-1 ${post.liked_by_me ? 'text-blue-500' : 'text-gray-500'}`}
                 >
-                  <span>0 Likes</span>
+                  <span>{post.like_count} {post.like_count === 1 ? 'Like' : 'Likes'}</span>
                 </button>
                 <span>0 Comments</span>
               </div>
@@ -0,0 +1,67 @@
+import api from '../config/axiosConfig';
+
+// Event types pushed by the server over /api/events/
+const EVENT_TYPES = ['post.created', 'connection.requested', 'connection.accepted'];
+
+// Milliseconds to wait before reopening a dropped stream
+const RETRY_DELAY = 3000;
+
+const Events = {
+  // Open the event stream and call handlers[type](event) for each event.
+  // Returns a function that closes the stream.
+  subscribe: (handlers) => {
+    if (!localStorage.getItem('access') || typeof EventSource === 'undefined') {
+      return () => {};
+    }
+
+    let source = null;
+    let retry = null;
+    let closed = false;
+
+    const open = async () => {
+      // EventSource cannot send headers and access tokens must stay out of
+      // URLs, so the stream is opened with a short-lived ticket instead
+      let ticket;
+      try {
+        const response = await api.post('events/ticket/');
+        ticket = response.data.ticket;
+      } catch (error) {
+        // 501: the server does not push events, so stay unsubscribed
+        if (!closed && error.response?.status !== 501) {
+          retry = setTimeout(open, RETRY_DELAY);
+        }
+        return;
+      }
+      if (closed) {
+        return;
+      }
+
+      const url = new URL('events/', api.defaults.baseURL);
+      url.searchParams.set('ticket', ticket);
+      source = new EventSource(url);
+      EVENT_TYPES.forEach((type) => {
+        if (handlers[type]) {
+          source.addEventListener(type, (message) => handlers[type](JSON.parse(message.data)));
+        }
+      });
+      // EventSource would reconnect with the same, by then expired, ticket
+      source.onerror = () => {
+        source.close();
+        if (!closed) {
+          retry = setTimeout(open, RETRY_DELAY);
+        }
+      };
+    };
+
+    open();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      if (source) {
+        source.close();
+      }
+    };
+  }
+};
+
+export default Events;
@@ -1,16 +1,26 @@
 import api from '../config/axiosConfig';
 
 const Posts = {
-  // Fetch all posts
+  // Fetch the first page of the feed (newest first)
   getAllPosts: async () => {
     try {
       const response = await api.get('/post/');
-      return response.data;
+      return response.data.results;
     } catch (error) {
       throw new Error('Unable to fetch posts');
     }
   },
 
+  // Fetch a single post
+  getPost: async (postId) => {
+    try {
+      const response = await api.get(`/post/${postId}/`);
+      return response.data;
+    } catch (error) {
+      throw new Error('Unable to fetch post');
+    }
+  },
+
   // Fetch posts for a specific user
   getUserPosts: async (userId) => {
     try {
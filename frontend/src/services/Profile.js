@@ -14,7 +14,7 @@ const UserProfile = {
     try {
       const params = search ? { search } : {};
       const response = await api.get('users/', { params });
-      return response.data;
+      return response.data.results;
     } catch (error) {
       throw new Error('Unable to fetch user');
     }
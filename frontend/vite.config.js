@@ -8,4 +8,8 @@ export default defineConfig({
     react(),
     tailwindcss(),
   ],
+  build: {
+    // Tells the backend which files are fingerprinted and safe to cache for good
+    manifest: true,
+  },
 })
@@ -0,0 +1,73 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from jobs.worker import Worker, drain, prune, requeue_stale
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs. Each queue runs at most its JOBS_QUEUES limit of jobs at once, "
+        "across all worker processes, which share its threads between them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', help="Comma-separated queues to serve; all of JOBS_QUEUES by default.")
+        parser.add_argument('--threads', type=int, help="Threads per queue in each process; enough for the JOBS_QUEUES limits by default.")
+        parser.add_argument('--processes', type=int, default=1, help="Number of worker processes.")
+        parser.add_argument('--burst', action='store_true', help="Run the jobs that are due, then exit.")
+
+    def handle(self, *args, **options):
+        names = options['queues'].split(',') if options['queues'] else list(settings.JOBS_QUEUES)
+        unknown = set(names) - set(settings.JOBS_QUEUES)
+        if unknown:
+            raise CommandError(f"Unknown queues: {', '.join(sorted(unknown))}")
+        if options['processes'] < 1 or (options['threads'] is not None and options['threads'] < 1):
+            raise CommandError("Every queue needs at least one thread and one process.")
+        # The limits are enforced when claiming, so the processes only need
+        # enough threads between them to reach each one
+        queues = {
+            name: options['threads'] or -(-settings.JOBS_QUEUES[name] // options['processes'])
+            for name in names
+        }
+        if min(queues.values()) < 1:
+            raise CommandError("Every queue needs a JOBS_QUEUES limit of at least one.")
+
+        if options['burst']:
+            requeue_stale()
+            prune()
+            ran = drain(queues)
+            self.stdout.write(f"Ran {ran} jobs.")
+            return
+
+        if options['processes'] == 1:
+            Worker(queues).run()
+            return
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError("--processes needs to fork worker processes.")
+
+        # Children must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [
+            context.Process(target=run_worker, args=(queues,), name=f'worker-{index}')
+            for index in range(options['processes'])
+        ]
+        for child in children:
+            child.start()
+
+        def stop(*args):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for child in children:
+            child.join()
+
+
+def run_worker(queues):
+    Worker(queues).run()
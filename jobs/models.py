@@ -0,0 +1,39 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+# Background job: a call of a ``jobs.tasks.task`` function, run by runworker
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.CharField(max_length=200)  # Dotted path of the task function
+    kwargs = models.JSONField(default=dict)
+    queue = models.CharField(max_length=50, default='default')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Enqueueing again with the same key returns the existing job
+    idempotency_key = models.CharField(max_length=200, null=True, blank=True, unique=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due job of their queue
+            models.Index(fields=['queue', 'run_at'], condition=Q(status='queued'), name='jobs_job_due_idx'),
+            # Jobs whose worker died are found by their lock age
+            models.Index(fields=['locked_at'], condition=Q(status='running'), name='jobs_job_running_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
@@ -0,0 +1,81 @@
+"""
+Background tasks.
+
+A module-level function decorated with ``@task`` can be enqueued as a job:
+
+    @task(queue='images')
+    def build_variants(post_id):
+        ...
+
+    build_variants.enqueue(post_id=post.pk, idempotency_key=f'variants:{post.pk}')
+
+``enqueue`` inserts a ``Job`` row in the current transaction, so the job
+becomes visible to workers exactly when the write that caused it commits,
+and disappears with it on rollback. Keyword arguments are stored as JSON.
+With ``JOBS_EAGER`` on, the task runs at once in the caller instead, which is
+what tests and single-process development without ``runworker`` want.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+
+class Task:
+    def __init__(self, func, queue, max_attempts):
+        self.func = func
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, idempotency_key=None, delay=0, **kwargs):
+        """
+        Queue a call with ``kwargs`` to run in ``delay`` seconds and return its
+        ``Job``. If a job with ``idempotency_key`` already exists, return that
+        one instead. Returns ``None`` under ``JOBS_EAGER``.
+        """
+        if settings.JOBS_EAGER:
+            self.func(**kwargs)
+            return None
+
+        job = Job(
+            task=self.name,
+            kwargs=kwargs,
+            queue=self.queue,
+            max_attempts=self.max_attempts or settings.JOBS_MAX_ATTEMPTS,
+            run_at=timezone.now() + timedelta(seconds=delay),
+            idempotency_key=idempotency_key,
+        )
+        if idempotency_key is None:
+            job.save()
+            return job
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            return Job.objects.get(idempotency_key=idempotency_key)
+        return job
+
+
+def task(queue='default', max_attempts=None):
+    """Make the decorated function enqueueable on ``queue``."""
+    def decorator(func):
+        return Task(func, queue, max_attempts)
+    return decorator
+
+
+def get_task(name):
+    """Return the task registered under ``name``; anything else is refused."""
+    candidate = import_string(name)
+    if not isinstance(candidate, Task):
+        raise ImportError(f"{name} is not a task")
+    return candidate
@@ -0,0 +1,175 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from posts.testing import ApiTestCase
+from posts.models import FeedEntry, Post
+from users.models import User, UserConnection
+from .models import Job
+from .tasks import get_task, task
+from .worker import Worker, backoff, claim, drain, requeue_stale, run_job
+
+calls = []
+
+
+@task()
+def record(value):
+    calls.append(value)
+
+
+@task(queue='flaky', max_attempts=2)
+def explode():
+    raise RuntimeError("boom")
+
+
+@override_settings(JOBS_EAGER=False, JOBS_QUEUES={'default': 1, 'flaky': 1})
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue(self):
+        job = record.enqueue(value=1)
+        self.assertEqual((job.task, job.queue, job.kwargs, job.status), ('jobs.tests.record', 'default', {'value': 1}, 'queued'))
+        self.assertEqual(calls, [])
+
+    def test_idempotency_key(self):
+        first = record.enqueue(value=1, idempotency_key='once')
+        second = record.enqueue(value=2, idempotency_key='once')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(drain(['default']), 1)
+        self.assertEqual(calls, [1])
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager(self):
+        self.assertIsNone(record.enqueue(value=1))
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_QUEUES={'default': 2, 'flaky': 1})
+    def test_claim_order_and_delay(self):
+        later = record.enqueue(value='later', delay=60)
+        first = record.enqueue(value='first')
+        record.enqueue(value='second')
+        self.assertEqual(claim('default', 'w1').pk, first.pk)
+        claimed = Job.objects.get(pk=first.pk)
+        self.assertEqual((claimed.status, claimed.locked_by, claimed.attempts), ('running', 'w1', 1))
+        self.assertNotEqual(claim('default', 'w2').pk, later.pk)
+        self.assertIsNone(claim('default', 'w3'))
+
+    @override_settings(JOBS_QUEUES={'default': 2, 'flaky': 1})
+    def test_limit_applies_across_workers(self):
+        for value in range(3):
+            record.enqueue(value=value)
+        # As if claimed by threads of different processes
+        first, second = claim('default', 'host:1:default:0'), claim('default', 'host:2:default:0')
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertIsNone(claim('default', 'host:3:default:0'))
+        self.assertEqual(Job.objects.filter(status='queued').count(), 1)
+
+        run_job(first)
+        self.assertIsNotNone(claim('default', 'host:3:default:0'))
+        # Other queues are not held up
+        explode.enqueue()
+        self.assertIsNotNone(claim('flaky', 'host:1:flaky:0'))
+
+    def test_success(self):
+        record.enqueue(value=1)
+        self.assertEqual(run_job(claim('default', 'w1')), 'succeeded')
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.locked_by, job.last_error), ('succeeded', '', ''))
+        self.assertEqual(calls, [1])
+
+    def test_retry_with_backoff_then_fail(self):
+        explode.enqueue()
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            self.assertEqual(run_job(claim('flaky', 'w1')), 'queued')
+        job = Job.objects.get()
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertIsNone(claim('flaky', 'w1'))
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            self.assertEqual(run_job(claim('flaky', 'w1')), 'failed')
+        self.assertEqual(Job.objects.get().attempts, 2)
+
+    @override_settings(JOBS_RETRY_BACKOFF=10, JOBS_RETRY_BACKOFF_MAX=60)
+    def test_backoff(self):
+        self.assertTrue(8 <= backoff(1) <= 12)
+        self.assertTrue(32 <= backoff(3) <= 48)
+        self.assertTrue(backoff(10) <= 72)
+
+    def test_only_tasks_run(self):
+        with self.assertRaises(ImportError):
+            get_task('os.getcwd')
+
+    @override_settings(JOBS_LOCK_TIMEOUT=60)
+    def test_requeue_stale(self):
+        job = record.enqueue(value=1)
+        claim('default', 'lost')
+        self.assertEqual(requeue_stale(), 0)
+        Job.objects.update(locked_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(claim('default', 'w1').pk, job.pk)
+
+    def test_worker_thread(self):
+        worker = Worker({'default': 1}, poll_interval=0.01)
+        record.enqueue(value=1)
+        # Stop as soon as the first job has run
+        with patch('jobs.worker.run_job', side_effect=lambda job: (run_job(job), worker.stop())):
+            worker.work('default', 'w1')
+        self.assertEqual(calls, [1])
+
+    @override_settings(JOBS_QUEUES={'default': 3, 'flaky': 1})
+    def test_runworker_shares_threads_between_processes(self):
+        with patch('jobs.management.commands.runworker.multiprocessing') as multiprocessing, \
+                patch('jobs.management.commands.runworker.signal'):
+            multiprocessing.get_all_start_methods.return_value = ['fork']
+            call_command('runworker', processes=2)
+        process = multiprocessing.get_context.return_value.Process
+        self.assertEqual(process.call_count, 2)
+        self.assertEqual(process.call_args.kwargs['args'], ({'default': 2, 'flaky': 1},))
+
+    def test_runworker_burst(self):
+        record.enqueue(value=1)
+        explode.enqueue()
+        out = StringIO()
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            call_command('runworker', burst=True, stdout=out)
+        self.assertIn('Ran 2 jobs.', out.getvalue())
+        self.assertEqual(calls, [1])
+
+
+@override_settings(JOBS_EAGER=False)
+class DeferredSideEffectTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_private_post_fan_out(self):
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='accepted')
+        drain(['feed'])
+        response = self.client.post('/api/post/', {'content': 'Hello', 'visibility': 'private'})
+        post = Post.objects.get(pk=response.data['id'])
+
+        # The author sees the post at once, their connections once the job ran
+        self.assertEqual(set(FeedEntry.objects.values_list('owner_id', flat=True)), {self.alice.pk})
+        self.assertTrue(Job.objects.filter(idempotency_key=f'fan-out:{post.pk}', queue='feed').exists())
+        drain(['feed'])
+        self.assertEqual(set(FeedEntry.objects.values_list('owner_id', flat=True)), {self.alice.pk, self.bob.pk})
+
+    def test_backfill_skips_removed_connection(self):
+        Post.objects.create(user=self.bob, content='Old', visibility='private')
+        connection = UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='accepted')
+        connection.delete()
+        drain(['feed'])
+        self.assertFalse(FeedEntry.objects.filter(owner=self.alice).exists())
@@ -0,0 +1,198 @@
+"""
+Claiming and running jobs.
+
+A worker thread serves one queue. It claims the oldest due job, runs it, and
+records the outcome. A queue's ``JOBS_QUEUES`` limit is the number of its
+jobs that may be running at once across every worker process: a claim is
+refused while that many are. Two claim strategies are used:
+
+- Databases with ``SELECT ... FOR UPDATE SKIP LOCKED`` (PostgreSQL, MySQL 8)
+  lock the row, so concurrent workers each get a different job without
+  waiting on one another. The running jobs are counted in the same
+  transaction, but claims racing each other cannot see one another, so a
+  queue may briefly run one job more per racing claim.
+- Elsewhere, notably SQLite, the oldest due job is taken with a conditional
+  ``UPDATE ... WHERE status = 'queued'`` that also counts the running jobs.
+  Writes are serialized there, so the limit is exact. Only one writer can
+  win a job; the losers move on to the next one.
+
+A job that raises is retried after an exponential backoff until it has been
+attempted ``max_attempts`` times, then marked failed with its traceback. A
+job whose worker died without finishing stays ``running`` until its lock is
+``JOBS_LOCK_TIMEOUT`` seconds old; it is then queued again, so tasks should
+be safe to run twice.
+"""
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Job
+from .tasks import get_task
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for stale locks and expired jobs
+MAINTENANCE_INTERVAL = 60
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed ``attempts`` times."""
+    delay = min(settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOBS_RETRY_BACKOFF_MAX)
+    # Jitter keeps jobs that failed together from retrying together
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim(queue, worker_id):
+    """
+    Lock the oldest due job of ``queue`` for ``worker_id`` and return it, or
+    ``None`` if none is due or the queue already runs its limit of jobs.
+    """
+    now = timezone.now()
+    limit = settings.JOBS_QUEUES[queue]
+    due = Job.objects.filter(queue=queue, status='queued', run_at__lte=now).order_by('run_at', 'id')
+    running = Job.objects.filter(queue=queue, status='running')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            if running.count() >= limit:
+                return None
+            job = due.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status, job.locked_by, job.locked_at = 'running', worker_id, now
+            job.attempts += 1
+            job.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts', 'updated_at'])
+            return job
+
+    running_count = running.values('queue').annotate(count=Count('pk')).values('count')
+    for pk in due.values_list('pk', flat=True)[:5]:
+        claimed = Job.objects.filter(pk=pk, status='queued').alias(
+            running=Coalesce(Subquery(running_count), 0),
+        ).filter(running__lt=limit).update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1, updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """Run a claimed job and record whether it succeeded, will be retried or failed."""
+    started = time.perf_counter()
+    try:
+        get_task(job.task).func(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s (%s) failed after %s attempts:\n%s", job.pk, job.task, job.attempts, error)
+            changes = {'status': 'failed'}
+        else:
+            logger.warning("Job %s (%s) failed on attempt %s, retrying", job.pk, job.task, job.attempts)
+            changes = {'status': 'queued', 'run_at': now + timedelta(seconds=backoff(job.attempts))}
+        outcome = changes['status']
+        changes.update(last_error=error, locked_by='', locked_at=None, updated_at=now)
+    else:
+        outcome = 'succeeded'
+        changes = {'status': 'succeeded', 'last_error': '', 'locked_by': '', 'locked_at': None,
+                   'updated_at': timezone.now()}
+        logger.info("Job %s (%s) succeeded in %.3fs", job.pk, job.task, time.perf_counter() - started)
+    # The lock may have expired and the job been claimed again meanwhile
+    Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(**changes)
+    return outcome
+
+
+def requeue_stale():
+    """Queue again the running jobs whose lock is older than ``JOBS_LOCK_TIMEOUT``."""
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT))
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', last_error='Worker lost', locked_by='', locked_at=None, updated_at=now,
+    )
+    return stale.update(status='queued', run_at=now, locked_by='', locked_at=None, updated_at=now)
+
+
+def prune():
+    """Delete succeeded jobs older than ``JOBS_RETENTION`` seconds, releasing their idempotency keys."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_RETENTION)
+    return Job.objects.filter(status='succeeded', updated_at__lt=cutoff).delete()[0]
+
+
+def drain(queues, worker_id='drain'):
+    """Run every due job of ``queues`` in this thread until none is left; return how many ran."""
+    ran = 0
+    for queue in queues:
+        while (job := claim(queue, worker_id)) is not None:
+            run_job(job)
+            ran += 1
+    return ran
+
+
+class Worker:
+    """Serve each queue with its number of threads until stopped."""
+
+    def __init__(self, queues, poll_interval=None):
+        self.queues = queues
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *args: self.stop())
+            signal.signal(signal.SIGINT, lambda *args: self.stop())
+
+        threads = [
+            threading.Thread(target=self.work, args=(queue, f'{self.name}:{queue}:{index}'), name=f'{queue}-{index}')
+            for queue, count in self.queues.items() for index in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        logger.info("Worker %s serving %s", self.name, ', '.join(f'{q} ({n})' for q, n in self.queues.items()))
+        self.maintain()
+        while not self.stopping.wait(MAINTENANCE_INTERVAL):
+            self.maintain()
+        for thread in threads:
+            thread.join()
+        close_old_connections()
+
+    def stop(self):
+        # Jobs already running are finished first
+        self.stopping.set()
+
+    def maintain(self):
+        try:
+            requeued, pruned = requeue_stale(), prune()
+            if requeued or pruned:
+                logger.info("Requeued %s stale jobs, pruned %s old ones", requeued, pruned)
+        except Exception:
+            logger.exception("Job maintenance failed")
+        finally:
+            close_old_connections()
+
+    def work(self, queue, worker_id):
+        while not self.stopping.is_set():
+            job = None
+            try:
+                job = claim(queue, worker_id)
+                if job is not None:
+                    run_job(job)
+            except Exception:
+                # Usually the database going away; back off and try again
+                logger.exception("Worker %s could not claim or record a job", worker_id)
+            finally:
+                close_old_connections()
+            if job is None:
+                self.stopping.wait(self.poll_interval)
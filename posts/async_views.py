@@ -0,0 +1,75 @@
+"""
+Async versions of the feed and post retrieve endpoints for ASGI deployments.
+
+They mirror ``PostViewSet.list`` and ``PostViewSet.retrieve`` response for
+response, including the conditional GET handling, but read through the async
+ORM and always render lean ``.values()`` rows, so no lazy query can run on
+the event loop. They are routed in place of the DRF views when
+``ASYNC_VIEWS`` is on.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework.response import Response
+
+from backend.asyncapi import async_api_view
+from backend.routers import replica_view
+from users.conditional import not_modified, with_cache_headers
+from users.graph import connection_graph
+from users.serializers import aconnection_status_map
+from .feed import feed_sources
+from .likes import aliked_post_ids
+from .models import Post
+from .pagination import KeysetCursorPagination
+from .serializers import POST_LEAN_VALUES, PostSerializer
+from .views import PostViewSet, post_etag
+
+
+async def render_posts(request, rows, liked):
+    statuses = await aconnection_status_map(request.user, {row['user__id'] for row in rows})
+    context = {"request": request, "connection_statuses": statuses, "liked_post_ids": liked}
+    return PostSerializer(rows, many=True, context=context).data
+
+
+@async_api_view(PostViewSet.as_view({'get': 'list', 'post': 'create'}))
+@replica_view
+async def feed(request):
+    """Retrieve posts with respect to visibility and connection rules."""
+    visibility = request.query_params.get('visibility')
+    neighbor_ids = None
+    if visibility in (None, 'private'):
+        neighbor_ids = await sync_to_async(connection_graph.neighbors)(request.user.id)
+
+    paginator = KeysetCursorPagination()
+    keys = await paginator.apaginate_sources(
+        feed_sources(request.user, visibility, neighbor_ids), request
+    )
+    ids = [pk for _, pk in keys]
+    posts = {row['id']: row async for row in Post.objects.filter(pk__in=ids).values(*POST_LEAN_VALUES)}
+    page = [posts[pk] for pk in ids if pk in posts]
+    liked = await aliked_post_ids(request.user, ids)
+
+    etag = post_etag(request, page, liked, paginator.get_next_link(), paginator.get_previous_link())
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    data = await render_posts(request, page, liked)
+    return with_cache_headers(paginator.get_paginated_response(data), etag)
+
+
+@async_api_view(PostViewSet.as_view({'get': 'retrieve'}))
+async def post_detail(request, pk):
+    """Retrieve a single post by ID."""
+    post = await Post.objects.filter(pk=pk).values(*POST_LEAN_VALUES).afirst()
+    if post is None:
+        raise Http404("No Post matches the given query.")
+
+    liked = await aliked_post_ids(request.user, [post['id']])
+    etag = post_etag(request, [post], liked)
+    public = post['visibility'] == 'public'
+    response = not_modified(request, etag, public)
+    if response is not None:
+        return response
+
+    data = await render_posts(request, [post], liked)
+    return with_cache_headers(Response(data[0]), etag, public)
@@ -0,0 +1,443 @@
+"""
+Synthetic data and an endpoint catalogue for query-count and latency benchmarks.
+
+``seed_graph`` bulk-loads a reproducible social graph, ``ApiBenchmark`` drives
+every ``UserViewSet`` and ``PostViewSet`` action against it, and
+``QUERY_BUDGETS`` holds the upper bound on queries each action may issue. The
+same budgets are asserted by the test suites and reported by the
+``benchmark_api`` management command. ``concurrent_feed_load`` measures feed
+reads while posts are being written, for the ``benchmark_sqlite`` command.
+"""
+import multiprocessing
+import random
+import statistics
+import time
+import timeit
+from collections import Counter
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, connection, connections
+from django.db.models import Max
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.renderers import FastJSONRenderer
+from users.counters import reconcile_counters, update_connection_counters
+from users.models import User, UserConnection
+from users.search import rebuild_search_index
+from users.serializers import UserSerializer, connection_status_map, lean_user_values
+from users.suggestions import compute_suggestions
+from .feed import rebuild_timelines
+from .likes import liked_post_ids
+from .models import Post
+from .serializers import POST_LEAN_VALUES, PostSerializer
+
+SEED_PASSWORD = 'benchmark-password'
+SEED_MOBILE_RE = r'^9[0-9]{9}$'
+BATCH_SIZE = 1000
+
+# Upper bound on queries per request, including the authentication lookup
+QUERY_BUDGETS = {
+    'users.list': 3,
+    'users.search': 4,
+    'users.retrieve': 3,
+    'users.register': 7,
+    'users.login': 1,
+    'users.me': 1,
+    'users.connections': 2,
+    'users.send_connection_request': 7,
+    'users.accept_connection_request': 9,
+    'users.reject_connection_request': 7,
+    'users.bulk_send_connection_requests': 6,
+    'users.bulk_accept_connection_requests': 8,
+    'users.bulk_reject_connection_requests': 5,
+    'users.mutual_connections': 6,
+    'users.pending_connections': 2,
+    'users.suggestions': 3,
+    'posts.list': 8,
+    'posts.list_next_page': 7,
+    'posts.retrieve': 4,
+    'posts.create': 6,
+    'posts.my_posts': 3,
+    'posts.like': 4,
+    'posts.unlike': 4,
+}
+
+
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+def power_law_weights(count, exponent):
+    """
+    Return Chung-Lu weights for ``count`` nodes. Drawing the two ends of each
+    edge in proportion to them gives degrees following a power law with the
+    given ``exponent``, as in real social graphs: a few hubs and a long tail.
+    """
+    return [(rank + 1) ** (-1 / (exponent - 1)) for rank in range(count)]
+
+
+def seed_graph(users=100, posts=1000, connections=300, seed=0, graph='uniform', exponent=2.5,
+               public_ratio=0.7, password=SEED_PASSWORD, batch_size=BATCH_SIZE):
+    """
+    Bulk-load ``users`` users, ``connections`` connections and ``posts`` posts.
+
+    Every user shares one precomputed hash of ``password`` so seeding does not
+    pay for a key derivation per row. With ``graph='power-law'`` connection
+    degrees follow a power law with ``exponent`` and the best-connected users
+    also post the most; otherwise both are uniform. Connections are mostly
+    accepted and ``public_ratio`` of posts are public. Timelines,
+    suggestions, the search index and counters are rebuilt afterwards.
+    Returns the seeded user IDs.
+    """
+    rng = random.Random(seed)
+    password = make_password(password)
+    # Seeded users number upwards from past every 9-prefixed ten-digit mobile
+    # in use, whichever users were deleted or registered meanwhile
+    highest = User.objects.filter(mobile__regex=SEED_MOBILE_RE).aggregate(highest=Max('mobile'))['highest']
+    offset = int(highest[1:]) + 1 if highest else 0
+
+    for start in range(0, users, batch_size):
+        User.objects.bulk_create([
+            User(
+                name=f"Seed User {offset + i}",
+                email=f"seed{offset + i}@example.com",
+                mobile=f"9{offset + i:09d}",
+                password=password,
+            )
+            for i in range(start, min(users, start + batch_size))
+        ])
+    user_ids = list(User.objects.filter(
+        mobile__gte=f"9{offset:09d}", mobile__lte=f"9{offset + users - 1:09d}", mobile__regex=SEED_MOBILE_RE,
+    ).order_by('id').values_list('id', flat=True))
+
+    # A dict rather than a set keeps the draw order, so statuses are reproducible
+    pairs = {}
+    connections = min(connections, len(user_ids) * (len(user_ids) - 1) // 2)
+    population, cum_weights = user_ids, None
+    if graph == 'power-law':
+        # Hubs are spread over the ID range rather than being the oldest users
+        population = rng.sample(user_ids, len(user_ids))
+        cum_weights = list(accumulate(power_law_weights(len(population), exponent)))
+        attempts = 0
+        while len(pairs) < connections and attempts < 50 * connections:
+            ends = rng.choices(population, cum_weights=cum_weights, k=2 * batch_size)
+            for user_from_id, user_to_id in zip(ends[::2], ends[1::2]):
+                attempts += 1
+                if user_from_id != user_to_id and (user_to_id, user_from_id) not in pairs:
+                    pairs[user_from_id, user_to_id] = None
+                    if len(pairs) == connections:
+                        break
+    else:
+        while len(pairs) < connections:
+            user_from_id, user_to_id = rng.sample(user_ids, 2)
+            if (user_to_id, user_from_id) not in pairs:
+                pairs[user_from_id, user_to_id] = None
+    UserConnection.objects.bulk_create(
+        [
+            UserConnection(
+                user_from_id=user_from_id,
+                user_to_id=user_to_id,
+                status=rng.choices(('accepted', 'pending', 'rejected'), (80, 15, 5))[0],
+            )
+            for user_from_id, user_to_id in pairs
+        ],
+        batch_size=batch_size,
+    )
+
+    for start in range(0, posts, batch_size):
+        authors = rng.choices(population, cum_weights=cum_weights, k=min(batch_size, posts - start))
+        Post.objects.bulk_create([
+            Post(
+                user_id=user_id,
+                content=f"Synthetic post {start + i}",
+                visibility='public' if rng.random() < public_ratio else 'private',
+            )
+            for i, user_id in enumerate(authors)
+        ])
+
+    rebuild_timelines()
+    compute_suggestions()
+    rebuild_search_index()
+    reconcile_counters()
+    return user_ids
+
+
+def data_queries(captured):
+    """
+    Return the SQL captured by a ``CaptureQueriesContext``, leaving out
+    transaction control statements, which differ between autocommit and the
+    test case's enclosing transaction.
+    """
+    return [
+        query['sql'] for query in captured.captured_queries
+        if not query['sql'].startswith(TRANSACTION_CONTROL)
+    ]
+
+
+def percentile(samples, pct):
+    """Return the ``pct`` percentile of ``samples`` using nearest-rank."""
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class ApiBenchmark:
+    """
+    Drive every API action as one seeded viewer.
+
+    Fixtures for the write actions (fresh targets for connection requests,
+    incoming and outgoing pending requests) are created up front so each
+    iteration exercises the same code path. The bulk actions take
+    ``bulk_size`` fresh users per iteration.
+    """
+    bulk_size = 3
+
+    def __init__(self, user_ids, iterations=20, seed=0):
+        self.iterations = iterations
+        rng = random.Random(seed)
+
+        # The best-connected user exercises the most expensive paths
+        degrees = {}
+        for user_from_id, user_to_id in UserConnection.objects.filter(
+            status='accepted'
+        ).values_list('user_from_id', 'user_to_id'):
+            degrees[user_from_id] = degrees.get(user_from_id, 0) + 1
+            degrees[user_to_id] = degrees.get(user_to_id, 0) + 1
+        self.viewer = User.objects.get(pk=max(user_ids, key=lambda pk: degrees.get(pk, 0)))
+
+        related = set()
+        for user_from_id, user_to_id in UserConnection.objects.filter(
+            user_from=self.viewer
+        ).values_list('user_from_id', 'user_to_id').union(
+            UserConnection.objects.filter(user_to=self.viewer).values_list('user_from_id', 'user_to_id')
+        ):
+            related.update((user_from_id, user_to_id))
+        neighbors = [pk for pk in related if pk != self.viewer.pk]
+        strangers = [pk for pk in user_ids if pk not in related and pk != self.viewer.pk]
+        rng.shuffle(strangers)
+        if len(strangers) < 3 * iterations * (1 + self.bulk_size):
+            raise ValueError("Not enough unconnected users to benchmark write actions.")
+
+        targets = iter(strangers)
+        self.send_targets, self.accept_targets, self.reject_targets = (
+            [next(targets) for _ in range(iterations)] for _ in range(3)
+        )
+        self.bulk_send_targets, self.bulk_accept_targets, self.bulk_reject_targets = (
+            [[next(targets) for _ in range(self.bulk_size)] for _ in range(iterations)] for _ in range(3)
+        )
+        incoming = self.accept_targets + [pk for batch in self.bulk_accept_targets for pk in batch]
+        outgoing = self.reject_targets + [pk for batch in self.bulk_reject_targets for pk in batch]
+        pending = [(pk, self.viewer.pk) for pk in incoming] + [(self.viewer.pk, pk) for pk in outgoing]
+        UserConnection.objects.bulk_create(
+            [UserConnection(user_from_id=user_from_id, user_to_id=user_to_id) for user_from_id, user_to_id in pending]
+        )
+        update_connection_counters(pending, None, 'pending')
+        self.profile_id = neighbors[0] if neighbors else strangers[-1]
+        public_ids = list(Post.objects.filter(visibility='public').values_list('id', flat=True)[:iterations])
+        if len(public_ids) < iterations:
+            raise ValueError("Not enough public posts to benchmark likes.")
+        self.post_id = public_ids[0]
+        # Each iteration likes, then unlikes, a post of its own
+        self.like_targets = public_ids
+        self.search = self.viewer.name.split()[-1][:3]
+        self.next_page = None
+
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.viewer).access_token}"
+        )
+        self.anonymous = APIClient()
+
+    def requests(self):
+        """Return ``(name, callable)`` pairs; each callable takes the iteration number."""
+        client = self.client
+        return [
+            ('users.list', lambda i: client.get('/api/users/')),
+            ('users.search', lambda i: client.get('/api/users/', {'search': self.search})),
+            ('users.retrieve', lambda i: client.get(f'/api/users/{self.profile_id}/')),
+            ('users.register', lambda i: self.anonymous.post('/api/users/register/', {
+                'name': f"Bench User {i}", 'email': f"bench{i}@example.com",
+                'mobile': f"8{i:09d}", 'password': SEED_PASSWORD,
+            })),
+            ('users.login', lambda i: self.anonymous.post('/api/users/login/', {
+                'mobile': self.viewer.mobile, 'password': SEED_PASSWORD,
+            })),
+            ('users.me', lambda i: client.get('/api/users/me/')),
+            ('users.connections', lambda i: client.get('/api/users/connections/')),
+            ('users.send_connection_request',
+             lambda i: client.post(f'/api/users/{self.send_targets[i]}/send_connection_request/')),
+            ('users.accept_connection_request',
+             lambda i: client.post(f'/api/users/{self.accept_targets[i]}/accept_connection_request/')),
+            ('users.reject_connection_request',
+             lambda i: client.post(f'/api/users/{self.reject_targets[i]}/reject_connection_request/')),
+            ('users.bulk_send_connection_requests', lambda i: client.post(
+                '/api/users/bulk_send_connection_requests/', {'user_ids': self.bulk_send_targets[i]}, format='json',
+            )),
+            ('users.bulk_accept_connection_requests', lambda i: client.post(
+                '/api/users/bulk_accept_connection_requests/', {'user_ids': self.bulk_accept_targets[i]}, format='json',
+            )),
+            ('users.bulk_reject_connection_requests', lambda i: client.post(
+                '/api/users/bulk_reject_connection_requests/', {'user_ids': self.bulk_reject_targets[i]}, format='json',
+            )),
+            ('users.mutual_connections',
+             lambda i: client.get(f'/api/users/{self.profile_id}/mutual_connections/')),
+            ('users.pending_connections', lambda i: client.get('/api/users/pending_connections/')),
+            ('users.suggestions', lambda i: client.get('/api/users/suggestions/')),
+            ('posts.list', self.feed),
+            ('posts.list_next_page', lambda i: client.get(self.next_page or '/api/post/')),
+            ('posts.retrieve', lambda i: client.get(f'/api/post/{self.post_id}/')),
+            ('posts.create', lambda i: client.post('/api/post/', {
+                'content': f"Benchmark post {i}", 'visibility': ('public', 'private')[i % 2],
+            })),
+            ('posts.my_posts', lambda i: client.get('/api/post/my_posts/')),
+            ('posts.like', lambda i: client.post(f'/api/post/{self.like_targets[i]}/like/')),
+            ('posts.unlike', lambda i: client.post(f'/api/post/{self.like_targets[i]}/unlike/')),
+        ]
+
+    def feed(self, i):
+        response = self.client.get('/api/post/')
+        self.next_page = response.data.get('next')
+        return response
+
+    def run(self):
+        """Run every action ``iterations`` times and return per-action results."""
+        results = {}
+        for name, send in self.requests():
+            timings, queries = [], []
+            for i in range(self.iterations):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = send(i)
+                    timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{name} failed with {response.status_code}: {response.content[:200]!r}")
+                queries.append(len(data_queries(captured)))
+            results[name] = {
+                'queries': max(queries),
+                'query_budget': QUERY_BUDGETS[name],
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'mean_ms': round(statistics.fmean(timings), 3),
+            }
+        return results
+
+
+def serialization_costs(viewer, rows=500, repeat=5):
+    """
+    Return the best-of-``repeat`` cost in microseconds per row of rendering
+    ``rows`` posts and users through the model serializers and through the
+    lean ``.values()`` path, and of writing the result with each JSON renderer.
+    """
+    request = RequestFactory().get('/api/post/')
+    request.user = viewer
+    post_ids = list(Post.objects.order_by('-id').values_list('id', flat=True)[:rows])
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True)[:rows])
+    statuses = connection_status_map(viewer, user_ids)
+    liked = liked_post_ids(viewer, post_ids)
+
+    def context():
+        return {'request': request, 'connection_statuses': statuses, 'liked_post_ids': liked}
+
+    posts = list(Post.objects.select_related('user').filter(pk__in=post_ids))
+    post_rows = list(Post.objects.filter(pk__in=post_ids).values(*POST_LEAN_VALUES))
+    users = list(User.objects.filter(pk__in=user_ids))
+    user_rows = list(User.objects.filter(pk__in=user_ids).values(*lean_user_values()))
+    data = PostSerializer(post_rows, many=True, context=context()).data
+
+    def cost(render, count):
+        best = min(timeit.repeat(render, number=1, repeat=repeat))
+        return round(best / max(count, 1) * 1e6, 2)
+
+    with override_settings(POST_FRAGMENT_CACHE_TIMEOUT=0):
+        return {
+            'posts.model_us': cost(lambda: PostSerializer(posts, many=True, context=context()).data, len(posts)),
+            'posts.lean_us': cost(lambda: PostSerializer(post_rows, many=True, context=context()).data, len(post_rows)),
+            'users.model_us': cost(lambda: UserSerializer(users, many=True, context=context()).data, len(users)),
+            'users.lean_us': cost(lambda: UserSerializer(user_rows, many=True, context=context()).data, len(user_rows)),
+            'render.json_us': cost(lambda: JSONRenderer().render(data), len(data)),
+            'render.fast_us': cost(lambda: FastJSONRenderer().render(data), len(data)),
+        }
+
+
+def _feed_load_worker(kind, token, seconds, start_line, results):
+    """Run one side of ``concurrent_feed_load`` in a forked process."""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    samples, failed, i = [], 0, 0
+    start_line.wait()
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if kind == 'writes':
+                    response = client.post('/api/post/', {
+                        'content': f"Concurrent post {i}", 'visibility': ('public', 'private')[i % 2],
+                    })
+                else:
+                    response = client.get('/api/post/')
+                ok = response.status_code < 400
+            except DatabaseError:
+                ok = False
+            if ok:
+                samples.append((time.perf_counter() - started) * 1000)
+            else:
+                failed += 1
+            i += 1
+    finally:
+        connection.close()
+        results.put((kind, samples, failed))
+
+
+def concurrent_feed_load(user_ids, readers=4, writers=2, seconds=5.0):
+    """
+    Read the feed from ``readers`` processes while ``writers`` processes
+    create posts through ``PostViewSet.create`` for ``seconds``.
+
+    Each process acts as a different seeded user over its own database
+    connection, as separate server workers would. Returns, for reads and
+    writes, the completed requests per second, p50/p95/max latency and the
+    number of requests that failed, e.g. with "database is locked".
+    """
+    users = list(User.objects.filter(pk__in=user_ids[:readers + writers]))
+    if len(users) < readers + writers:
+        raise ValueError("Not enough seeded users for one per process.")
+    tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+
+    # Forked workers inherit the configured Django; they must not inherit open connections
+    context = multiprocessing.get_context('fork')
+    connections.close_all()
+    start_line = context.Barrier(readers + writers)
+    results = context.Queue()
+    workers = [
+        context.Process(target=_feed_load_worker, args=(
+            'reads' if n < readers else 'writes', token, seconds, start_line, results,
+        ))
+        for n, token in enumerate(tokens)
+    ]
+    for worker in workers:
+        worker.start()
+
+    timings = {'reads': [], 'writes': []}
+    failures = Counter()
+    for _ in workers:
+        kind, samples, failed = results.get()
+        timings[kind].extend(samples)
+        failures[kind] += failed
+    for worker in workers:
+        worker.join()
+
+    return {
+        kind: {
+            'per_second': round(len(samples) / seconds, 1),
+            'p50_ms': round(percentile(samples, 50), 3) if samples else None,
+            'p95_ms': round(percentile(samples, 95), 3) if samples else None,
+            'max_ms': round(max(samples), 3) if samples else None,
+            'failed': failures[kind],
+        }
+        for kind, samples in timings.items()
+    }
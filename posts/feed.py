@@ -0,0 +1,199 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from jobs.tasks import task
+from users.graph import connection_graph
+from users.models import User, UserConnection
+from .models import Post, FeedEntry
+
+
+def fan_out_post(post):
+    """
+    Push a new private post into the timelines of its author and their connections.
+
+    Public posts are visible to everyone and are read straight from the post
+    table, so only private posts are materialized. The author's entry is
+    written at once so they see their post; the connections' are written by
+    a job once the post commits.
+    """
+    if post.visibility != 'private':
+        return
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(owner_id=post.user_id, post=post, created_at=post.created_at)], ignore_conflicts=True
+    )
+    fan_out_to_connections.enqueue(post_id=post.pk, idempotency_key=f'fan-out:{post.pk}')
+
+
+@task(queue='feed')
+def fan_out_to_connections(post_id):
+    """
+    Push a private post into the timelines of its author's connections.
+
+    Authors with more than ``FEED_FANOUT_MAX_DEGREE`` connections are
+    skipped; their posts are marked as not fanned out and pulled into feeds
+    at read time.
+    """
+    post = Post.objects.filter(pk=post_id, visibility='private').only('id', 'user_id', 'created_at').first()
+    if post is None:
+        return
+
+    # Workers do not see other processes' cache invalidations, so read the graph
+    owner_ids = connection_graph.load(post.user_id)
+    if len(owner_ids) > settings.FEED_FANOUT_MAX_DEGREE:
+        Post.objects.filter(pk=post.pk).update(fanned_out=False)
+        return
+
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(owner_id=owner_id, post=post, created_at=post.created_at) for owner_id in owner_ids],
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_connections(pairs):
+    """
+    Backfill the timelines of every newly connected ``(user_a_id, user_b_id)`` pair.
+
+    The most recent ``FEED_BACKFILL_LIMIT`` posts of every author involved are
+    read in one windowed query, whatever the number of pairs.
+    """
+    author_ids = {user_id for pair in pairs for user_id in pair}
+    recent = {}
+    for post_id, author_id, created_at in Post.objects.filter(
+        user_id__in=author_ids, visibility='private', fanned_out=True
+    ).annotate(
+        position=Window(RowNumber(), partition_by=F('user_id'), order_by=F('created_at').desc())
+    ).filter(position__lte=settings.FEED_BACKFILL_LIMIT).values_list('id', 'user_id', 'created_at'):
+        recent.setdefault(author_id, []).append((post_id, created_at))
+
+    entries = [
+        FeedEntry(owner_id=owner_id, post_id=post_id, created_at=created_at)
+        for user_a_id, user_b_id in pairs
+        for owner_id, author_id in ((user_a_id, user_b_id), (user_b_id, user_a_id))
+        for post_id, created_at in recent.get(author_id, ())
+    ]
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=settings.FEED_FANOUT_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+@task(queue='feed')
+def backfill_accepted_connections(pairs):
+    """
+    Backfill the timelines of the ``[user_from_id, user_to_id]`` pairs that
+    are still connected when the job runs.
+    """
+    connected = Q(pk__in=[])
+    for user_from_id, user_to_id in pairs:
+        connected |= Q(user_from_id=user_from_id, user_to_id=user_to_id)
+    with transaction.atomic():
+        # Locking the connections makes a concurrent removal, which prunes
+        # the timelines, wait for the backfill rather than be undone by it
+        accepted = list(UserConnection.objects.select_for_update().filter(
+            connected, status='accepted'
+        ).values_list('user_from_id', 'user_to_id'))
+        if accepted:
+            backfill_connections(accepted)
+
+
+def prune_connection(user_a_id, user_b_id):
+    """
+    Remove each user's posts from the other's timeline, unless a connection
+    in either direction is still accepted.
+    """
+    if UserConnection.objects.filter(
+        Q(user_from_id=user_a_id, user_to_id=user_b_id) | Q(user_from_id=user_b_id, user_to_id=user_a_id),
+        status='accepted',
+    ).exists():
+        return
+    FeedEntry.objects.filter(
+        Q(owner_id=user_a_id, post__user_id=user_b_id) |
+        Q(owner_id=user_b_id, post__user_id=user_a_id)
+    ).delete()
+
+
+def rebuild_timelines(authors_per_batch=1000):
+    """
+    Rebuild every timeline from the post and connection tables and return
+    the number of entries written.
+
+    Used after bulk loads that bypass ``fan_out_post`` or after fan-out jobs
+    failed for good. Authors are processed ``authors_per_batch`` at a time,
+    each batch in its own transaction, so only their neighbour sets are held
+    in memory and timelines stay readable meanwhile.
+    """
+    written = 0
+    last_id = 0
+    while True:
+        author_ids = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:authors_per_batch]
+        )
+        if not author_ids:
+            return written
+        last_id = author_ids[-1]
+        with transaction.atomic():
+            written += rebuild_author_timelines(author_ids)
+
+
+def rebuild_author_timelines(author_ids):
+    """Rewrite the timeline entries of the private posts of ``author_ids``."""
+    neighbors = {author_id: set() for author_id in author_ids}
+    outgoing = UserConnection.objects.filter(
+        user_from_id__in=author_ids, status='accepted'
+    ).values_list('user_from_id', 'user_to_id')
+    incoming = UserConnection.objects.filter(
+        user_to_id__in=author_ids, status='accepted'
+    ).values_list('user_to_id', 'user_from_id')
+    for author_id, neighbor_id in outgoing.union(incoming, all=True):
+        neighbors[author_id].add(neighbor_id)
+
+    high_degree = {
+        author_id for author_id, ids in neighbors.items()
+        if len(ids) > settings.FEED_FANOUT_MAX_DEGREE
+    }
+    FeedEntry.objects.filter(post__user_id__in=author_ids).delete()
+    Post.objects.filter(user_id__in=author_ids, fanned_out=False).exclude(user_id__in=high_degree).update(fanned_out=True)
+    Post.objects.filter(visibility='private', user_id__in=high_degree).update(fanned_out=False)
+
+    written = 0
+    batch = []
+    for post_id, user_id, created_at in Post.objects.filter(
+        visibility='private', user_id__in=author_ids
+    ).values_list('id', 'user_id', 'created_at').iterator():
+        owner_ids = {user_id}
+        if user_id not in high_degree:
+            owner_ids |= neighbors[user_id]
+        batch.extend(
+            FeedEntry(owner_id=owner_id, post_id=post_id, created_at=created_at)
+            for owner_id in owner_ids
+        )
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    FeedEntry.objects.bulk_create(batch)
+    return written + len(batch)
+
+
+def feed_sources(user, visibility=None, neighbor_ids=None):
+    """
+    Return the keyset sources that make up ``user``'s home feed.
+
+    The feed is the merge of the user's materialized timeline, all public
+    posts (fan-out on read) and private posts from connections whose posts
+    were too widely shared to fan out on write. Async callers pass the
+    user's ``neighbor_ids`` so building the sources runs no query.
+    """
+    if neighbor_ids is None and visibility in (None, 'private'):
+        neighbor_ids = connection_graph.neighbors(user.id)
+    sources = []
+    if visibility in (None, 'public'):
+        sources.append((Post.objects.filter(visibility='public'), 'created_at', 'id'))
+    if visibility in (None, 'private'):
+        sources.append((FeedEntry.objects.filter(owner=user), 'created_at', 'post_id'))
+        sources.append((Post.objects.filter(
+            visibility='private', fanned_out=False, user_id__in=neighbor_ids
+        ), 'created_at', 'id'))
+    return sources
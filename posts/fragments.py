@@ -0,0 +1,59 @@
+"""
+Cached, viewer-independent post representations.
+
+The serialized form of a post, nested author included, is the same for every
+viewer except for the author's ``connection_status`` and ``liked_by_me``.
+Lists of posts are therefore rendered once per post version into
+``POST_FRAGMENT_CACHE`` and the viewer's connection statuses and likes are
+overlaid on copies of the cached fragments. Model instances and lean
+``.values()`` rows render the same fragments under the same keys.
+Fragment keys include the post's ``updated_at`` and the author's version, so
+editing either makes the old fragment unreachable and it simply expires.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from users.conditional import user_version
+
+
+def fragment_cache():
+    return caches[settings.POST_FRAGMENT_CACHE]
+
+
+def fragment_key(post, request):
+    """Key of the fragment of ``post``, a model instance or a lean ``.values()`` row."""
+    if isinstance(post, dict):
+        pk, version = post["id"], (post["updated_at"], user_version(post, "user__"))
+    else:
+        pk, version = post.pk, (post.updated_at, user_version(post.user))
+    # Image URLs are absolute, so the scheme and host are part of the representation
+    version = repr(version + (request.build_absolute_uri("/") if request else None,))
+    return f"post-fragment:{pk}:{hashlib.blake2b(version.encode(), digest_size=12).hexdigest()}"
+
+
+def render_posts(posts, request, statuses, liked, render):
+    """
+    Return the representation of each of ``posts``, model instances or lean
+    ``.values()`` rows, for a viewer with the connection ``statuses`` and the
+    ``liked`` post IDs. ``render(post)`` renders a post missing from the cache
+    as a viewer with neither would see it.
+    """
+    cache = fragment_cache()
+    keys = [fragment_key(post, request) for post in posts]
+    fragments = cache.get_many(keys)
+    missing = {}
+    for post, key in zip(posts, keys):
+        if key not in fragments:
+            fragments[key] = missing[key] = render(post)
+    if missing:
+        cache.set_many(missing, settings.POST_FRAGMENT_CACHE_TIMEOUT)
+
+    results = []
+    for key in keys:
+        data = dict(fragments[key])
+        data["user"] = {**data["user"], "connection_status": statuses.get(data["user"]["id"], "none")}
+        data["liked_by_me"] = data["id"] in liked
+        results.append(data)
+    return results
@@ -0,0 +1,69 @@
+"""
+Resized, re-encoded variants of post images.
+
+Every uploaded image is decoded once, rotated according to its EXIF
+orientation and saved at each width in ``POST_IMAGE_VARIANTS``. Variants are
+written without any metadata in ``POST_IMAGE_FORMAT`` (WebP, or progressive
+JPEG). The work is queued as a job on the ``images`` queue with the post, so
+uploads return without waiting for Pillow.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from jobs.tasks import task
+from .models import Post
+
+
+def encode(image, width):
+    """Return ``image`` scaled down to at most ``width`` pixels wide, encoded."""
+    variant = image.copy()
+    if variant.width > width:
+        variant = variant.resize((width, round(variant.height * width / variant.width)), Image.LANCZOS)
+
+    buffer = BytesIO()
+    if settings.POST_IMAGE_FORMAT == 'JPEG':
+        variant.convert('RGB').save(
+            buffer, 'JPEG', quality=settings.POST_IMAGE_QUALITY, optimize=True, progressive=True
+        )
+    else:
+        variant.save(buffer, 'WEBP', quality=settings.POST_IMAGE_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+@task(queue='images')
+def build_variants(post_id):
+    """Generate every configured variant for a post and record their names."""
+    post = Post.objects.filter(pk=post_id).only('id', 'image').first()
+    if post is None or not post.image:
+        return
+
+    extension = 'jpg' if settings.POST_IMAGE_FORMAT == 'JPEG' else 'webp'
+    with post.image.open('rb') as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        variants = {}
+        for name, width in settings.POST_IMAGE_VARIANTS.items():
+            path = f"posts/variants/{post.pk}/{name}.{extension}"
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variants[name] = default_storage.save(path, ContentFile(encode(image, width)))
+
+    Post.objects.filter(pk=post.pk).update(image_variants=variants, updated_at=timezone.now())
+    return variants
+
+
+def schedule_variants(post):
+    """Queue the variants of ``post`` to be built once the current transaction commits."""
+    if not post.image:
+        return
+    if settings.POST_IMAGE_ASYNC:
+        build_variants.enqueue(post_id=post.pk, idempotency_key=f'post-variants:{post.pk}')
+    else:
+        post.image_variants = build_variants(post.pk) or {}
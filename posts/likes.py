@@ -0,0 +1,139 @@
+"""
+Post likes and their buffered counts.
+
+Liking a post inserts a ``PostLike`` row, which no other liker contends with.
+Adding to ``Post.like_count`` in the same request would make every liker of
+a popular post queue for that post's row lock. Instead, once a like or
+unlike commits, the change is added to ``like_counts``, this process's
+per-post sums, which are written in batches: one UPDATE per distinct sum
+rather than one per like. Counts therefore lag by up to
+``LIKE_COUNT_FLUSH_INTERVAL`` seconds. A batch also moves the posts'
+``updated_at``, which retires their ETags and cached fragments.
+
+Processes write their sums independently, so a post's count can briefly
+drop below zero when an unlike is written before the like it undoes; it is
+rendered as 0 meanwhile. ``reconcile_like_counts`` recounts every post, e.g.
+after a process died with changes pending.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Post, PostLike
+
+logger = logging.getLogger(__name__)
+
+
+class LikeCountBuffer:
+    """Per-process sums of the like count changes not written yet, keyed by post ID."""
+
+    def __init__(self):
+        self._deltas = Counter()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, post_id, delta):
+        with self._lock:
+            self._deltas[post_id] += delta
+            flush_now = (
+                not settings.LIKE_COUNT_FLUSH_INTERVAL
+                or len(self._deltas) >= settings.LIKE_COUNT_BUFFER_SIZE
+            )
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(settings.LIKE_COUNT_FLUSH_INTERVAL, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        """Write the pending changes and return how many posts they touched."""
+        with self._lock:
+            deltas, self._deltas = self._deltas, Counter()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        by_delta = defaultdict(list)
+        for post_id, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(post_id)
+        if not by_delta:
+            return 0
+        try:
+            now = timezone.now()
+            with transaction.atomic():
+                for delta, post_ids in by_delta.items():
+                    Post.objects.filter(pk__in=post_ids).update(
+                        like_count=F('like_count') + delta, updated_at=now
+                    )
+        except Exception:
+            # Keep the changes for the next batch
+            with self._lock:
+                self._deltas.update(deltas)
+            raise
+        return sum(len(post_ids) for post_ids in by_delta.values())
+
+    def clear(self):
+        with self._lock:
+            self._deltas.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not write like counts")
+        finally:
+            # The timer thread's own connections
+            connections.close_all()
+
+
+like_counts = LikeCountBuffer()
+
+
+@atexit.register
+def flush_on_exit():
+    try:
+        like_counts.flush()
+    except Exception:
+        logger.exception("Could not write like counts on exit")
+
+
+def liked_post_ids(viewer, post_ids):
+    """Return the IDs among ``post_ids`` of the posts ``viewer`` has liked, in one query."""
+    if not viewer.is_authenticated or not post_ids:
+        return set()
+    return set(
+        PostLike.objects.filter(user_id=viewer.pk, post_id__in=post_ids).values_list('post_id', flat=True)
+    )
+
+
+async def aliked_post_ids(viewer, post_ids):
+    """Async version of ``liked_post_ids``."""
+    if not viewer.is_authenticated or not post_ids:
+        return set()
+    return {
+        post_id async for post_id in
+        PostLike.objects.filter(user_id=viewer.pk, post_id__in=post_ids).values_list('post_id', flat=True)
+    }
+
+
+def reconcile_like_counts():
+    """Recount the likes of every post and return the number of posts whose count was wrong."""
+    expected = Coalesce(Subquery(
+        PostLike.objects.filter(post=OuterRef('pk')).order_by().values('post')
+        .annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), Value(0))
+    # updated_at moves too, as the rendered posts changed
+    return Post.objects.filter(~Q(like_count=expected)).update(like_count=expected, updated_at=timezone.now())
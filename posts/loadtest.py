@@ -0,0 +1,189 @@
+"""
+Replay a mix of API traffic against a running server.
+
+``run_load_test`` logs in as seeded users, then starts ``concurrency``
+threads that each pick a user and an action at random, weighted by the
+mix, for ``seconds``:
+
+- ``feed``: ``GET /api/post/``
+- ``search``: ``GET /api/users/?search=`` with a name prefix
+- ``connect``: a connection request to a random user
+- ``post``: a new post, public or private
+- ``like``: a like of one of the newest public posts, or the unlike of one
+  this user liked before, so the few hottest rows take every write
+
+Only the standard library is used, so the server can run anywhere that
+``base_url`` reaches. Each action reports its throughput and p50/p95
+latency; 4xx answers (e.g. a connection request that already exists) are
+counted separately from errors, which are 5xx answers and failed requests.
+"""
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from itertools import accumulate
+from urllib.parse import quote
+
+from .benchmark import percentile
+
+ACTIONS = ('feed', 'search', 'connect', 'post', 'like')
+DEFAULT_MIX = 'feed=60,search=15,connect=10,post=15'
+SEARCH_TERMS = ('seed', 'seed user', 'user', 'seed user 1', 'seed user 42')
+# Number of the newest public posts that every like goes to
+HOT_POSTS = 10
+
+
+def parse_mix(mix):
+    """Parse ``'feed=60,search=15'`` into weights for every action in ``ACTIONS``."""
+    weights = dict.fromkeys(ACTIONS, 0)
+    for part in filter(None, (part.strip() for part in mix.split(','))):
+        action, _, weight = part.partition('=')
+        if action not in weights:
+            raise ValueError(f"Unknown action {action!r}; choose from {', '.join(ACTIONS)}.")
+        try:
+            weights[action] = int(weight)
+        except ValueError:
+            raise ValueError(f"Weight of {action!r} must be an integer.")
+        if weights[action] < 0:
+            raise ValueError(f"Weight of {action!r} must not be negative.")
+    if not any(weights.values()):
+        raise ValueError("The traffic mix needs at least one positive weight.")
+    return weights
+
+
+class LoadClient:
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, token=None, data=None):
+        """Send one request and return ``(status, body)``; the status is ``None`` if it failed."""
+        headers = {'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+        except (OSError, ValueError):
+            return None, b''
+
+    def login(self, mobile, password):
+        status, body = self.request('POST', '/api/users/login/', data={'mobile': mobile, 'password': password})
+        if status != 200:
+            raise RuntimeError(f"Login as {mobile} failed with status {status}.")
+        return json.loads(body)['access']
+
+
+def run_load_test(base_url, users, password, mix=DEFAULT_MIX, concurrency=4, seconds=10.0, seed=0):
+    """
+    Replay ``mix`` against ``base_url`` as ``users``, a list of ``(id, mobile)``
+    pairs, and return the results per action and in total.
+    """
+    weights = parse_mix(mix)
+    actions = [action for action in ACTIONS if weights[action]]
+    cum_weights = list(accumulate(weights[action] for action in actions))
+
+    client = LoadClient(base_url)
+    sessions = [(user_id, client.login(mobile, password)) for user_id, mobile in users]
+    user_ids = [user_id for user_id, _ in users]
+
+    hot_post_ids = []
+    if weights['like']:
+        status, body = client.request('GET', f'/api/post/?visibility=public&page_size={HOT_POSTS}', sessions[0][1])
+        if status == 200:
+            hot_post_ids = [post['id'] for post in json.loads(body)['results']]
+        if not hot_post_ids:
+            raise RuntimeError("There are no public posts to like.")
+    liked = set()
+    liked_lock = threading.Lock()
+
+    def feed(rng, user_id, token):
+        return client.request('GET', '/api/post/', token)
+
+    def search(rng, user_id, token):
+        return client.request('GET', f"/api/users/?search={quote(rng.choice(SEARCH_TERMS))}", token)
+
+    def connect(rng, user_id, token):
+        target = rng.choice(user_ids)
+        return client.request('POST', f'/api/users/{target}/send_connection_request/', token)
+
+    def post(rng, user_id, token):
+        data = {
+            'content': f"Load test post {rng.getrandbits(32):08x}",
+            'visibility': 'public' if rng.random() < 0.7 else 'private',
+        }
+        return client.request('POST', '/api/post/', token, data)
+
+    def like(rng, user_id, token):
+        post_id = rng.choice(hot_post_ids)
+        with liked_lock:
+            # Alternate, so each user keeps liking rather than being refused
+            action = 'unlike' if (user_id, post_id) in liked else 'like'
+            liked.symmetric_difference_update({(user_id, post_id)})
+        return client.request('POST', f'/api/post/{post_id}/{action}/', token)
+
+    handlers = {'feed': feed, 'search': search, 'connect': connect, 'post': post, 'like': like}
+    latencies = {action: [] for action in actions}
+    rejected = dict.fromkeys(actions, 0)
+    errors = dict.fromkeys(actions, 0)
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = None
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        samples = {action: [] for action in actions}
+        outcomes = {action: [0, 0] for action in actions}
+        barrier.wait()
+        while time.perf_counter() < deadline:
+            action = rng.choices(actions, cum_weights=cum_weights)[0]
+            user_id, token = rng.choice(sessions)
+            started = time.perf_counter()
+            status, _ = handlers[action](rng, user_id, token)
+            samples[action].append((time.perf_counter() - started) * 1000)
+            if status is None or status >= 500:
+                outcomes[action][1] += 1
+            elif status >= 400:
+                outcomes[action][0] += 1
+        with lock:
+            for action in actions:
+                latencies[action].extend(samples[action])
+                rejected[action] += outcomes[action][0]
+                errors[action] += outcomes[action][1]
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    deadline = time.perf_counter() + seconds
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    def summary(samples, rejected, errors):
+        return {
+            'requests': len(samples),
+            'per_second': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(samples, 50), 3) if samples else None,
+            'p95_ms': round(percentile(samples, 95), 3) if samples else None,
+            'rejected': rejected,
+            'errors': errors,
+        }
+
+    results = {action: summary(latencies[action], rejected[action], errors[action]) for action in actions}
+    results['total'] = summary(
+        [sample for samples in latencies.values() for sample in samples],
+        sum(rejected.values()),
+        sum(errors.values()),
+    )
+    return results
@@ -0,0 +1,115 @@
+import json
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from posts.benchmark import ApiBenchmark, seed_graph, serialization_costs
+from posts.likes import like_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with a synthetic social graph, exercise every API "
+        "action and report query counts and p50/p95 latency as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--connections', type=int, default=5000)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='bench_output.json', help="Where to write the JSON report.")
+        parser.add_argument('--compare', help="A previous report to compare against.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline report: {exc}")
+
+        # Run against a fresh test database so the dev database is never touched
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            started = time.perf_counter()
+            user_ids = seed_graph(
+                users=options['users'],
+                posts=options['posts'],
+                connections=options['connections'],
+                seed=options['seed'],
+            )
+            seed_seconds = time.perf_counter() - started
+            benchmark = ApiBenchmark(user_ids, options['iterations'], options['seed'])
+            # Jobs are queued as in production, whatever DEBUG makes the default
+            with override_settings(JOBS_EAGER=False):
+                results = benchmark.run()
+            serialization = serialization_costs(benchmark.viewer)
+        finally:
+            # Pending like counts must not be written once the database is gone
+            like_counts.clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'commit': self.git_revision(),
+                'database': settings.DATABASES['default']['ENGINE'],
+                'users': options['users'],
+                'posts': options['posts'],
+                'connections': options['connections'],
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+                'seed_seconds': round(seed_seconds, 3),
+            },
+            'endpoints': results,
+            'serialization': serialization,
+        }
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+        self.print_report(results, baseline)
+        self.print_serialization(serialization)
+        self.stdout.write(f"Report written to {options['output']}")
+
+        over_budget = [name for name, row in results.items() if row['queries'] > row['query_budget']]
+        if over_budget:
+            raise CommandError(f"Query budget exceeded by: {', '.join(over_budget)}")
+
+    def print_report(self, results, baseline):
+        previous = (baseline or {}).get('endpoints', {})
+        self.stdout.write(f"{'endpoint':36} {'queries':>8} {'p50 ms':>9} {'p95 ms':>9}  change p50")
+        for name, row in results.items():
+            change = ''
+            if name in previous and previous[name]['p50_ms']:
+                delta = (row['p50_ms'] - previous[name]['p50_ms']) / previous[name]['p50_ms'] * 100
+                change = f"{delta:+.1f}%"
+            self.stdout.write(
+                f"{name:36} {row['queries']:>3}/{row['query_budget']:<4} "
+                f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f}  {change}"
+            )
+
+    def print_serialization(self, costs):
+        self.stdout.write(f"{'per-row cost':36} {'model/json':>10} {'lean/fast':>10}")
+        for label, slow, fast in (
+            ('posts serialization (us)', 'posts.model_us', 'posts.lean_us'),
+            ('users serialization (us)', 'users.model_us', 'users.lean_us'),
+            ('JSON rendering (us)', 'render.json_us', 'render.fast_us'),
+        ):
+            self.stdout.write(f"{label:36} {costs[slow]:>10.2f} {costs[fast]:>10.2f}")
+
+    def git_revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,86 @@
+import json
+import multiprocessing
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from posts.benchmark import concurrent_feed_load, seed_graph
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure feed read throughput while posts are created concurrently, on a "
+        "throwaway SQLite file with SQLite's defaults and in SQLite production mode."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--connections', type=int, default=3000)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=10.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='sqlite_bench_output.json', help="Where to write the JSON report.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("benchmark_sqlite needs DB_ENGINE to be SQLite.")
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError("benchmark_sqlite needs to fork worker processes.")
+
+        modes = (('default', {}), ('production', settings.SQLITE_PRODUCTION_OPTIONS))
+        results = {}
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for mode, sqlite_options in modes:
+                    path = os.path.join(directory, f'{mode}.sqlite3')
+                    results[mode] = self.measure(path, sqlite_options, options)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'meta': {key: options[key] for key in (
+                'users', 'posts', 'connections', 'readers', 'writers', 'seconds', 'seed'
+            )},
+            'modes': results,
+        }
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+        self.stdout.write(f"{'mode':12} {'':7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'failed':>7}")
+        for mode, sides in results.items():
+            for kind, row in sides.items():
+                self.stdout.write(
+                    f"{mode:12} {kind:7} {row['per_second']:>8.1f} {self.ms(row['p50_ms'])} "
+                    f"{self.ms(row['p95_ms'])} {self.ms(row['max_ms'])} {row['failed']:>7}"
+                )
+        self.stdout.write(f"Report written to {options['output']}")
+
+    def measure(self, path, sqlite_options, options):
+        """Seed a fresh database file opened with ``sqlite_options`` and load it."""
+        settings_dict = connection.settings_dict
+        saved = settings_dict['OPTIONS'], settings_dict['TEST']['NAME']
+        # Every thread's connection is opened from this same settings dict
+        settings_dict['OPTIONS'] = dict(sqlite_options)
+        settings_dict['TEST']['NAME'] = path
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user_ids = seed_graph(
+                users=options['users'],
+                posts=options['posts'],
+                connections=options['connections'],
+                seed=options['seed'],
+            )
+            return concurrent_feed_load(user_ids, options['readers'], options['writers'], options['seconds'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            settings_dict['OPTIONS'], settings_dict['TEST']['NAME'] = saved
+
+    def ms(self, value):
+        return f"{value:>9.2f}" if value is not None else f"{'-':>9}"
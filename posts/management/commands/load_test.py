@@ -0,0 +1,70 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import SEED_PASSWORD
+from posts.loadtest import DEFAULT_MIX, parse_mix, run_load_test
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a mix of feed, search, connect, post and like requests against a running "
+        "server as users created by seed_data, and report throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the server.")
+        parser.add_argument('--users', type=int, default=50, help="Number of seeded users to log in as.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=30.0)
+        parser.add_argument('--mix', default=DEFAULT_MIX, help="Relative weight of each action.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default=SEED_PASSWORD, help="Password of the seeded users.")
+        parser.add_argument('--output', help="Where to write the JSON report.")
+
+    def handle(self, *args, **options):
+        try:
+            parse_mix(options['mix'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        # The server may use another database, but seeded users share IDs and mobiles
+        seeded = list(User.objects.filter(email__startswith='seed').values_list('id', 'mobile'))
+        if not seeded:
+            raise CommandError("No seeded users found; run seed_data first.")
+        users = random.Random(options['seed']).sample(seeded, min(options['users'], len(seeded)))
+
+        try:
+            results = run_load_test(
+                options['url'], users, options['password'],
+                mix=options['mix'],
+                concurrency=options['concurrency'],
+                seconds=options['seconds'],
+                seed=options['seed'],
+            )
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        if options['output']:
+            report = {
+                'meta': {key: options[key] for key in ('url', 'users', 'concurrency', 'seconds', 'mix', 'seed')},
+                'actions': results,
+            }
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+
+        self.stdout.write(
+            f"{'action':8} {'reqs':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'4xx':>6} {'errors':>7}"
+        )
+        for action, row in results.items():
+            self.stdout.write(
+                f"{action:8} {row['requests']:>7} {row['per_second']:>8.1f} {self.ms(row['p50_ms'])} "
+                f"{self.ms(row['p95_ms'])} {row['rejected']:>6} {row['errors']:>7}"
+            )
+
+    def ms(self, value):
+        return f"{value:>9.2f}" if value is not None else f"{'-':>9}"
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.feed import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild every user's feed timeline from the post and connection tables, e.g. "
+        "after a bulk import or fan-out jobs that failed for good."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, help="Authors whose posts are rebuilt per transaction."
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        written = rebuild_timelines(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} timeline entries."))
@@ -0,0 +1,68 @@
+import statistics
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import BATCH_SIZE, SEED_PASSWORD, seed_graph
+from posts.models import Post
+from users.models import UserConnection
+
+
+class Command(BaseCommand):
+    help = (
+        "Add a reproducible synthetic social graph to the configured database: users, "
+        "connections with power-law degrees and posts, for load testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--posts', type=int, default=200000)
+        parser.add_argument('--connections', type=int, default=50000)
+        parser.add_argument('--graph', choices=('power-law', 'uniform'), default='power-law')
+        parser.add_argument('--exponent', type=float, default=2.5, help="Power-law exponent of connection degrees.")
+        parser.add_argument('--public-ratio', type=float, default=0.7, help="Share of posts that are public.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default=SEED_PASSWORD, help="Password of every seeded user.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['exponent'] <= 1:
+            raise CommandError("--exponent must be greater than 1.")
+        if not 0 <= options['public_ratio'] <= 1:
+            raise CommandError("--public-ratio must be between 0 and 1.")
+
+        started = time.perf_counter()
+        user_ids = seed_graph(
+            users=options['users'],
+            posts=options['posts'],
+            connections=options['connections'],
+            seed=options['seed'],
+            graph=options['graph'],
+            exponent=options['exponent'],
+            public_ratio=options['public_ratio'],
+            password=options['password'],
+            batch_size=options['batch_size'],
+        )
+        seconds = time.perf_counter() - started
+
+        # Seeded users get consecutive IDs after any existing ones
+        first_id = user_ids[0] if user_ids else 0
+        degrees = Counter()
+        for user_from_id, user_to_id in UserConnection.objects.filter(
+            user_from_id__gte=first_id, status='accepted'
+        ).values_list('user_from_id', 'user_to_id').iterator():
+            degrees[user_from_id] += 1
+            degrees[user_to_id] += 1
+        counts = [degrees[user_id] for user_id in user_ids] or [0]
+        posts = Post.objects.filter(user_id__gte=first_id)
+
+        self.stdout.write(f"Seeded {len(user_ids)} users in {seconds:.1f}s")
+        self.stdout.write(
+            f"Accepted connections per user: median {statistics.median(counts):g}, "
+            f"max {max(counts)}, none {counts.count(0)} users"
+        )
+        self.stdout.write(
+            f"Posts: {posts.count()} ({posts.filter(visibility='public').count()} public)"
+        )
+        self.stdout.write(f"Users log in with mobile 9XXXXXXXXX and password {options['password']!r}")
@@ -0,0 +1,91 @@
+import glob
+import json
+import os
+import statistics
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import percentile
+
+SORT_KEYS = ('p95_ms', 'mean_ms', 'db_ms', 'queries', 'requests')
+
+
+def load_samples(directory):
+    """Merge the per-process files written by ``SQLProfilingMiddleware`` into samples per endpoint."""
+    endpoints = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as fh:
+                snapshot = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        for endpoint, samples in snapshot.get('endpoints', {}).items():
+            endpoints.setdefault(endpoint, []).extend(samples)
+    return endpoints
+
+
+def summarize(samples):
+    totals = [sample[0] for sample in samples]
+    duplicates = Counter()
+    for *_, duplicated in samples:
+        for sql, count in duplicated:
+            duplicates[sql] = max(duplicates[sql], count)
+    return {
+        'requests': len(samples),
+        'mean_ms': round(statistics.fmean(totals), 3),
+        'p50_ms': round(percentile(totals, 50), 3),
+        'p95_ms': round(percentile(totals, 95), 3),
+        'db_ms': round(statistics.fmean(sample[1] for sample in samples), 3),
+        'queries': round(statistics.fmean(sample[2] for sample in samples), 1),
+        'max_queries': max(sample[2] for sample in samples),
+        'serialize_ms': round(statistics.fmean(sample[3] for sample in samples), 3),
+        'render_ms': round(statistics.fmean(sample[4] for sample in samples), 3),
+        # Most repeated query per request first
+        'duplicates': [{'sql': sql, 'max_per_request': count} for sql, count in duplicates.most_common()],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the slowest endpoints and their duplicated queries from the samples "
+        "recorded by SQLProfilingMiddleware (DJANGO_SQL_PROFILING=1)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=SORT_KEYS, default='p95_ms')
+        parser.add_argument('--limit', type=int, default=20, help="Number of endpoints to show.")
+        parser.add_argument('--json', action='store_true', help="Print the full report as JSON.")
+        parser.add_argument('--reset', action='store_true', help="Delete the recorded samples afterwards.")
+
+    def handle(self, *args, **options):
+        directory = settings.SQL_PROFILING_DIR
+        endpoints = load_samples(directory)
+        if not endpoints:
+            raise CommandError(f"No profiling samples in {directory}; run the server with DJANGO_SQL_PROFILING=1.")
+
+        report = {endpoint: summarize(samples) for endpoint, samples in endpoints.items()}
+        ranked = sorted(report.items(), key=lambda item: item[1][options['sort']], reverse=True)[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(dict(ranked), indent=2))
+        else:
+            self.print_report(ranked)
+
+        if options['reset']:
+            for path in glob.glob(os.path.join(directory, '*.json')):
+                os.remove(path)
+
+    def print_report(self, ranked):
+        self.stdout.write(
+            f"{'endpoint':44} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'db ms':>8} "
+            f"{'queries':>8} {'ser ms':>8} {'render ms':>9}"
+        )
+        for endpoint, row in ranked:
+            self.stdout.write(
+                f"{endpoint:44} {row['requests']:>6} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                f"{row['db_ms']:>8.2f} {row['queries']:>8.1f} {row['serialize_ms']:>8.2f} {row['render_ms']:>9.2f}"
+            )
+            for duplicate in row['duplicates'][:3]:
+                self.stdout.write(f"    {duplicate['max_per_request']}x {duplicate['sql'][:120]}")
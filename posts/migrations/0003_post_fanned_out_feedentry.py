@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-18 18:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    """Materialize timelines for the private posts that already exist."""
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    UserConnection = apps.get_model('users', 'UserConnection')
+
+    connections = {}
+    for user_from_id, user_to_id in UserConnection.objects.filter(
+        status='accepted'
+    ).values_list('user_from_id', 'user_to_id'):
+        connections.setdefault(user_from_id, set()).add(user_to_id)
+        connections.setdefault(user_to_id, set()).add(user_from_id)
+
+    entries = []
+    for post_id, user_id, created_at in Post.objects.filter(
+        visibility='private'
+    ).values_list('id', 'user_id', 'created_at').iterator():
+        for owner_id in connections.get(user_id, set()) | {user_id}:
+            entries.append(FeedEntry(owner_id=owner_id, post_id=post_id, created_at=created_at))
+    FeedEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_post_posts_post_visibil_686270_idx_and_more'),
+        ('users', '0003_userconnection'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'created_at', 'post'], name='posts_feede_owner_i_1af400_idx')],
+                'unique_together': {('owner', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
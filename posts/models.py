@@ -5,8 +5,52 @@ class Post(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
     image = models.ImageField(upload_to='posts/', null=True, blank=True)
+    # Storage names of the resized copies of ``image``, keyed by variant name
+    image_variants = models.JSONField(default=dict, blank=True)
     visibility = models.CharField(max_length=10, choices=[('public', 'Public'), ('private', 'Private')])
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also moved by writes that bypass save(), e.g. new image variants
+    updated_at = models.DateTimeField(auto_now=True)
+    # False when the author had too many connections to push this post into
+    # their timelines; such posts are pulled into feeds at read time instead.
+    fanned_out = models.BooleanField(default=True)
+    # Denormalized total of ``likes``, written in batches by posts.likes; may
+    # briefly go negative while processes write their batches out of order
+    like_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (created_at, id) within these prefixes
+            models.Index(fields=['visibility', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.name}'s post"
+
+# Materialized timeline row: ``post`` appears in the feed of ``owner``
+class FeedEntry(models.Model):
+    owner = models.ForeignKey(User, related_name='feed_entries', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='feed_entries', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()  # Copied from the post so the feed is one index range
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', 'created_at', 'post']),
+        ]
+
+    def __str__(self):
+        return f"{self.owner.name} <- post {self.post_id}"
+
+# A user liking a post; the post's like_count follows these rows
+class PostLike(models.Model):
+    user = models.ForeignKey(User, related_name='post_likes', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='likes', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'post')  # Also serves the viewer's liked posts on a page
 
     def __str__(self):
-        return f"{self.user.name}'s post"
\ No newline at end of file
+        return f"{self.user.name} likes post {self.post_id}"
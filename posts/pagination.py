@@ -0,0 +1,167 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from urllib import parse
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset pagination over ``(created_at, id)``, newest first.
+
+    Every page is fetched with a single range query that seeks past the cursor
+    position, so the cost of a page does not grow with how far the client has
+    scrolled. Cursors are opaque base64 tokens encoding the boundary row and
+    the direction of travel.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.default_page_size = settings.FEED_PAGE_SIZE
+        self.max_page_size = settings.FEED_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the requested page of ``queryset`` as model instances."""
+        self.prepare(request)
+        rows = self.seek(queryset, 'created_at', 'id')
+        return self.finish(rows, key=lambda row: (row.created_at, row.pk))
+
+    def paginate_sources(self, sources, request, view=None):
+        """
+        Return the requested page of the newest-first merge of several sources.
+
+        Each source is a ``(queryset, created_at_field, id_field)`` triple and
+        is seeked and limited independently, so every source costs one bounded
+        range query. The page is returned as ``(created_at, id)`` pairs.
+        """
+        self.prepare(request)
+        merged = {}
+        for queryset, created_field, id_field in sources:
+            for key in self.seek(queryset.values_list(created_field, id_field),
+                                 created_field, id_field):
+                merged[key[1]] = key
+        return self.merge(merged)
+
+    async def apaginate_sources(self, sources, request, view=None):
+        """Async version of ``paginate_sources``, reading each source with the async ORM."""
+        self.prepare(request)
+        merged = {}
+        for queryset, created_field, id_field in sources:
+            async for key in self.seek_queryset(queryset.values_list(created_field, id_field),
+                                                created_field, id_field):
+                merged[key[1]] = key
+        return self.merge(merged)
+
+    def merge(self, keys):
+        rows = sorted(keys.values(), reverse=not self.reverse)
+        return self.finish(rows, key=lambda row: row)
+
+    def prepare(self, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            self.reverse, self.position = False, None
+        else:
+            self.reverse, self.position = cursor
+
+    def seek(self, queryset, created_field, id_field):
+        """Fetch up to one page (plus one row) past the cursor position."""
+        return list(self.seek_queryset(queryset, created_field, id_field))
+
+    def seek_queryset(self, queryset, created_field, id_field):
+        if self.position is not None:
+            created_at, pk = self.position
+            if self.reverse:
+                queryset = queryset.filter(
+                    Q(**{f'{created_field}__gte': created_at}) &
+                    (Q(**{f'{created_field}__gt': created_at}) | Q(**{f'{id_field}__gt': pk}))
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{created_field}__lte': created_at}) &
+                    (Q(**{f'{created_field}__lt': created_at}) | Q(**{f'{id_field}__lt': pk}))
+                )
+
+        if self.reverse:
+            ordering = (created_field, id_field)
+        else:
+            ordering = (f'-{created_field}', f'-{id_field}')
+        # Fetch one extra row to find out whether another page follows.
+        return queryset.order_by(*ordering)[:self.page_size + 1]
+
+    def finish(self, rows, key):
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+        self.page_keys = [key(row) for row in self.page]
+
+        if self.reverse:
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.default_page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        created_at, pk = self.page_keys[-1]
+        return self.encode_cursor(False, created_at, pk)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        created_at, pk = self.page_keys[0]
+        return self.encode_cursor(True, created_at, pk)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens['r'][0]))
+            created_at = datetime.fromisoformat(tokens['t'][0])
+            pk = int(tokens['i'][0])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, (created_at, pk)
+
+    def encode_cursor(self, reverse, created_at, pk):
+        querystring = parse.urlencode({
+            'r': int(reverse),
+            't': created_at.isoformat(),
+            'i': pk,
+        }, doseq=True)
+        encoded = urlsafe_b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
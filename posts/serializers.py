@@ -1,10 +1,92 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
+from .fragments import render_posts
+from .likes import liked_post_ids
 from .models import Post
-from users.serializers import UserSerializer
+from users.serializers import (
+    DATETIME_FIELD, UserSerializer, lean_user, lean_user_values, resolve_connection_statuses,
+)
+
+# The ``.values()`` names ``lean_post`` reads; updated_at is only for ETags
+POST_LEAN_VALUES = [
+    "id", "content", "image", "image_variants", "visibility", "created_at", "updated_at", "like_count",
+] + lean_user_values("user__")
+
+image_storage = Post._meta.get_field("image").storage
+
+
+def variant_urls(variants, request):
+    """Return the URL of each resized copy of an image, absolute when ``request`` is given."""
+    urls = {}
+    for name, path in variants.items():
+        url = default_storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def resolve_liked_posts(context, post_ids):
+    """
+    Load which of ``post_ids`` the viewer has liked in one query and share it
+    with the post serializers through ``context``.
+    """
+    request = context.get("request")
+    if "liked_post_ids" in context or not request or not request.user.is_authenticated:
+        return
+    context["liked_post_ids"] = liked_post_ids(request.user, post_ids)
+
+
+def lean_post(row, request, statuses, liked):
+    """Render a ``.values()`` row as ``PostSerializer`` would, fields in the same order."""
+    image = None
+    if row["image"]:
+        image = image_storage.url(row["image"])
+        if request is not None:
+            image = request.build_absolute_uri(image)
+    return {
+        "id": row["id"],
+        "user": lean_user(row, statuses, "user__"),
+        "content": row["content"],
+        "image": image,
+        "image_variants": variant_urls(row["image_variants"], request),
+        "visibility": row["visibility"],
+        "created_at": DATETIME_FIELD.to_representation(row["created_at"]),
+        "like_count": max(row["like_count"], 0),
+        "liked_by_me": row["id"] in liked,
+    }
+
+
+class PostListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get("request")
+        if posts and isinstance(posts[0], dict):
+            resolve_connection_statuses(self.context, [row["user__id"] for row in posts])
+            resolve_liked_posts(self.context, [row["id"] for row in posts])
+            statuses = self.context.get("connection_statuses") or {}
+            liked = self.context.get("liked_post_ids") or set()
+            if settings.POST_FRAGMENT_CACHE_TIMEOUT:
+                return render_posts(posts, request, statuses, liked, lambda row: lean_post(row, request, {}, set()))
+            return [lean_post(row, request, statuses, liked) for row in posts]
+        resolve_connection_statuses(self.context, [post.user_id for post in posts])
+        resolve_liked_posts(self.context, [post.pk for post in posts])
+        if settings.POST_FRAGMENT_CACHE_TIMEOUT:
+            child = type(self.child)
+            context = {"request": request, "connection_statuses": {}, "liked_post_ids": set()}
+            return render_posts(
+                posts, request, self.context.get("connection_statuses") or {},
+                self.context.get("liked_post_ids") or set(),
+                lambda post: dict(child(post, context=context).data),
+            )
+        return super().to_representation(posts)
+
 
 class PostSerializer(serializers.ModelSerializer):
     """Serializer for Post model."""
     user = UserSerializer(read_only=True)  # Nested user info
+    image_variants = serializers.SerializerMethodField()
+    like_count = serializers.SerializerMethodField()
+    liked_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -13,7 +95,29 @@ class PostSerializer(serializers.ModelSerializer):
             "user",
             "content",
             "image",
+            "image_variants",
             "visibility",
             "created_at",
+            "like_count",
+            "liked_by_me",
         ]
         read_only_fields = ["id", "user", "created_at"]
+        list_serializer_class = PostListSerializer
+
+    def get_image_variants(self, obj):
+        """Return the URL of each resized copy of the image, once built."""
+        return variant_urls(obj.image_variants, self.context.get("request"))
+
+    def get_like_count(self, obj):
+        # Negative while an unlike is written before its like, see posts.likes
+        return max(obj.like_count, 0)
+
+    def get_liked_by_me(self, obj):
+        """Return whether the requesting user has liked the post."""
+        liked = self.context.get("liked_post_ids")
+        if liked is not None:
+            return obj.pk in liked
+        request = self.context.get("request")
+        if not request or not request.user.is_authenticated:
+            return False
+        return obj.pk in liked_post_ids(request.user, [obj.pk])
@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from backend.pubsub import publish_event
+from backend.routers import pin_to_primary
+from users.counters import adjust_post_count
+from users.graph import connection_graph
+from users.models import UserConnection
+from users.signals import connections_bulk_updated
+from .feed import backfill_accepted_connections, prune_connection
+from .likes import like_counts
+from .models import Post, PostLike
+
+
+@receiver(pre_save, sender=UserConnection)
+def remember_accepted(sender, instance, **kwargs):
+    # users.signals resets _stored_status on post_save, possibly before
+    # repair_timelines_on_save runs
+    instance._was_accepted = instance._stored_status == 'accepted'
+
+
+@receiver(post_save, sender=UserConnection)
+def repair_timelines_on_save(sender, instance, created, **kwargs):
+    """Queue a timeline backfill when a connection is accepted, prune them when it no longer is."""
+    if instance.status == 'accepted':
+        backfill_accepted_connections.enqueue(pairs=[[instance.user_from_id, instance.user_to_id]])
+    elif instance._was_accepted:
+        prune_connection(instance.user_from_id, instance.user_to_id)
+
+
+@receiver(post_delete, sender=UserConnection)
+def repair_timelines_on_delete(sender, instance, **kwargs):
+    if instance._stored_status == 'accepted':
+        prune_connection(instance.user_from_id, instance.user_to_id)
+
+
+@receiver(connections_bulk_updated)
+def repair_timelines_in_bulk(sender, pairs, status, **kwargs):
+    if status == 'accepted':
+        backfill_accepted_connections.enqueue(pairs=[list(pair) for pair in pairs])
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, **kwargs):
+    if created:
+        adjust_post_count(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    adjust_post_count(instance.user_id, -1)
+
+
+@receiver(post_save, sender=PostLike)
+def count_like(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: like_counts.add(instance.post_id, 1))
+
+
+@receiver(post_delete, sender=PostLike)
+def count_unlike(sender, instance, **kwargs):
+    transaction.on_commit(lambda: like_counts.add(instance.post_id, -1))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=PostLike)
+@receiver(post_delete, sender=PostLike)
+def pin_author(sender, instance, **kwargs):
+    # Authors of posts and of likes alike
+    pin_to_primary(instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+def announce_post(sender, instance, created, **kwargs):
+    """Tell the author's connections about a new post once it is committed."""
+    if not created:
+        return
+    transaction.on_commit(lambda: publish_event(
+        connection_graph.neighbors(instance.user_id), 'post.created',
+        post_id=instance.pk, user_id=instance.user_id, visibility=instance.visibility,
+        created_at=instance.created_at,
+    ))
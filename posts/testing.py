@@ -0,0 +1,58 @@
+"""
+Base classes for the API test suites.
+"""
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from users.graph import connection_graph
+from .benchmark import QUERY_BUDGETS, ApiBenchmark, data_queries, seed_graph
+from .fragments import fragment_cache
+from .likes import like_counts
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], JOBS_EAGER=True, LIKE_COUNT_FLUSH_INTERVAL=0,
+)
+class ApiTestCase(TestCase):
+    """
+    Base class for API tests, with fast password hashing and cold caches.
+    Background jobs run inside the request and like counts are written as
+    soon as the like commits, so their effects can be asserted.
+    """
+
+    def setUp(self):
+        # The graph, fragment and like count caches outlive the per-test transaction rollback
+        connection_graph.clear()
+        fragment_cache().clear()
+        like_counts.clear()
+        # Nor may buffered like counts be written once the test database is gone
+        self.addCleanup(like_counts.clear)
+
+
+@override_settings(JOBS_EAGER=False)
+class QueryBudgetTestCase(ApiTestCase):
+    """
+    Base class for tests that hold API actions to their ``QUERY_BUDGETS``.
+    Background jobs are queued, as in production, not run.
+    """
+    seed_users = 60
+    seed_posts = 300
+    seed_connections = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_ids = seed_graph(cls.seed_users, cls.seed_posts, cls.seed_connections, seed=1)
+
+    def setUp(self):
+        super().setUp()
+        self.bench = ApiBenchmark(self.user_ids, iterations=2, seed=1)
+        self.actions = dict(self.bench.requests())
+
+    def assertWithinBudget(self, name):
+        for i in range(self.bench.iterations):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.actions[name](i)
+            self.assertLess(response.status_code, 400, response.content)
+            queries = data_queries(captured)
+            self.assertLessEqual(len(queries), QUERY_BUDGETS[name], "\n".join(queries))
@@ -1,3 +1,975 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.test import AsyncRequestFactory, LiveServerTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend import assets, profiling
+from backend.events import StreamTicket, event_stream
+from backend.pubsub import get_broker, user_channel
+from backend.renderers import FastJSONRenderer
+from users.graph import connection_graph
+from users.models import User, UserConnection
+from . import async_views
+from .benchmark import SEED_PASSWORD, seed_graph
+from .feed import fan_out_post
+from .fragments import fragment_cache
+from .likes import like_counts, reconcile_like_counts
+from .loadtest import HOT_POSTS, parse_mix, run_load_test
+from .models import Post, PostLike, FeedEntry
+from .serializers import PostSerializer
+from .testing import ApiTestCase, QueryBudgetTestCase
+from .uploadhandlers import PostImageUploadHandler
+
+
+class PostQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertWithinBudget('posts.list')
+
+    def test_list_next_page(self):
+        self.actions['posts.list'](0)
+        self.assertWithinBudget('posts.list_next_page')
+
+    def test_retrieve(self):
+        self.assertWithinBudget('posts.retrieve')
+
+    def test_create(self):
+        self.assertWithinBudget('posts.create')
+
+    def test_my_posts(self):
+        self.assertWithinBudget('posts.my_posts')
+
+    def test_like(self):
+        self.assertWithinBudget('posts.like')
+
+    def test_unlike(self):
+        self.actions['posts.like'](0)
+        self.actions['posts.like'](1)
+        self.assertWithinBudget('posts.unlike')
+
+
+class FeedTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.carol = User.objects.create_user('1000000003', 'Carol', 'carol@example.com', 'password')
+        self.clients = {}
+        for user in (self.alice, self.bob, self.carol):
+            self.clients[user] = APIClient()
+            self.clients[user].force_authenticate(user)
+
+    def post(self, user, content, visibility):
+        response = self.clients[user].post('/api/post/', {'content': content, 'visibility': visibility})
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def feed(self, user, **params):
+        response = self.clients[user].get('/api/post/', params)
+        self.assertEqual(response.status_code, 200)
+        return [post['content'] for post in response.data['results']]
+
+    def connect(self, user_from, user_to):
+        UserConnection.objects.create(user_from=user_from, user_to=user_to, status='accepted')
+
+    def test_private_posts_reach_connections_only(self):
+        self.connect(self.alice, self.bob)
+        self.post(self.bob, 'bob private', 'private')
+        self.post(self.carol, 'carol public', 'public')
+        self.post(self.carol, 'carol private', 'private')
+
+        self.assertEqual(self.feed(self.alice), ['carol public', 'bob private'])
+        self.assertEqual(self.feed(self.bob), ['carol public', 'bob private'])
+        self.assertEqual(self.feed(self.carol), ['carol private', 'carol public'])
+        self.assertEqual(self.feed(self.alice, visibility='private'), ['bob private'])
+
+    def test_accepting_connection_backfills_timeline(self):
+        self.post(self.bob, 'bob private', 'private')
+        self.assertEqual(self.feed(self.alice), [])
+
+        self.connect(self.alice, self.bob)
+        self.assertEqual(self.feed(self.alice), ['bob private'])
+
+    def test_removing_connection_prunes_timeline(self):
+        self.connect(self.alice, self.bob)
+        self.post(self.bob, 'bob private', 'private')
+
+        UserConnection.objects.filter(user_from=self.alice, user_to=self.bob).delete()
+        self.assertEqual(self.feed(self.alice), [])
+        self.assertEqual(self.feed(self.bob), ['bob private'])
+
+    def test_reverse_request_does_not_prune_accepted_connection(self):
+        self.connect(self.alice, self.bob)
+        self.post(self.bob, 'bob private', 'private')
+        self.post(self.alice, 'alice private', 'private')
+
+        reverse = UserConnection.objects.create(user_from=self.bob, user_to=self.alice)
+        reverse.status = 'rejected'
+        reverse.save()
+        reverse.delete()
+        self.assertEqual(self.feed(self.alice), ['alice private', 'bob private'])
+        self.assertEqual(self.feed(self.bob), ['alice private', 'bob private'])
+
+    def test_rejecting_pending_request_does_not_prune(self):
+        self.post(self.bob, 'bob private', 'private')
+        with patch('posts.signals.prune_connection') as prune:
+            connection = UserConnection.objects.create(user_from=self.alice, user_to=self.bob)
+            connection.status = 'rejected'
+            connection.save()
+            connection.delete()
+        prune.assert_not_called()
+
+    @override_settings(FEED_FANOUT_MAX_DEGREE=0)
+    def test_high_degree_authors_are_pulled_on_read(self):
+        self.connect(self.alice, self.bob)
+        self.post(self.bob, 'bob private', 'private')
+
+        self.assertFalse(Post.objects.get().fanned_out)
+        self.assertFalse(FeedEntry.objects.filter(owner=self.alice).exists())
+        self.assertEqual(self.feed(self.alice), ['bob private'])
+
+    @override_settings(FEED_FANOUT_MAX_DEGREE=1)
+    def test_feed_merges_timeline_public_and_pulled_posts(self):
+        dave = User.objects.create_user('1000000004', 'Dave', 'dave@example.com', 'password')
+        self.clients[dave] = APIClient()
+        self.clients[dave].force_authenticate(dave)
+        self.connect(self.alice, self.bob)
+        self.connect(self.bob, self.carol)
+        self.connect(dave, self.alice)
+        self.post(self.bob, 'bob private', 'private')
+        self.post(dave, 'dave private', 'private')
+        self.post(self.carol, 'carol public', 'public')
+        self.post(self.alice, 'alice private', 'private')
+        self.post(self.bob, 'bob later', 'private')
+
+        # Alice and Bob have two connections each, so their posts only reach
+        # their own timelines
+        self.assertEqual(set(Post.objects.filter(fanned_out=False).values_list('content', flat=True)),
+                         {'bob private', 'alice private', 'bob later'})
+        self.assertEqual(
+            set(FeedEntry.objects.filter(owner=self.alice).values_list('post__content', flat=True)),
+            {'dave private', 'alice private'},
+        )
+        self.assertEqual(
+            self.feed(self.alice),
+            ['bob later', 'alice private', 'carol public', 'dave private', 'bob private'],
+        )
+        self.assertEqual(
+            self.feed(self.alice, page_size=2),
+            ['bob later', 'alice private'],
+        )
+
+    def test_feed_reads_do_not_join_connections(self):
+        self.connect(self.alice, self.bob)
+        self.post(self.bob, 'bob private', 'private')
+        self.feed(self.alice)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.feed(self.alice), ['bob private'])
+        # Only the authors' connection statuses, not the feed itself
+        feed_queries = [query['sql'] for query in queries if 'posts_' in query['sql']]
+        self.assertTrue(feed_queries)
+        self.assertFalse([sql for sql in feed_queries if 'users_userconnection' in sql])
+
+    def test_rebuild_timelines_command(self):
+        self.connect(self.alice, self.bob)
+        self.post(self.bob, 'bob private', 'private')
+        self.post(self.carol, 'carol private', 'private')
+        # Lost fan-out and a stray entry from a removed connection
+        FeedEntry.objects.filter(owner=self.alice).delete()
+        FeedEntry.objects.create(owner=self.alice, post=Post.objects.get(content='carol private'),
+                                 created_at=timezone.now())
+
+        out = StringIO()
+        call_command('rebuild_timelines', batch_size=1, stdout=out)
+        self.assertIn('Wrote 3 timeline entries.', out.getvalue())
+        self.assertEqual(self.feed(self.alice), ['bob private'])
+        self.assertEqual(self.feed(self.carol), ['carol private'])
+
+    def test_cursor_pages_cover_feed_once(self):
+        for i in range(7):
+            self.post(self.alice, f'post {i}', ('public', 'private')[i % 2])
+
+        seen = []
+        response = self.clients[self.alice].get('/api/post/', {'page_size': 3})
+        while True:
+            seen.extend(post['content'] for post in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.clients[self.alice].get(response.data['next'])
+        self.assertEqual(seen, [f'post {i}' for i in reversed(range(7))])
+
+        previous = self.clients[self.alice].get(response.data['previous'])
+        self.assertEqual([post['content'] for post in previous.data['results']], ['post 3', 'post 2', 'post 1'])
+
+    def test_invalid_cursor(self):
+        response = self.clients[self.alice].get('/api/post/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_unchanged_feed_is_not_modified(self):
+        self.post(self.bob, 'Hello', 'public')
+        client = self.clients[self.alice]
+        etag = client.get('/api/post/').headers['ETag']
+        self.assertEqual(client.get('/api/post/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.post(self.carol, 'Again', 'public')
+        response = client.get('/api/post/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+
+    def test_public_posts_are_shared_cacheable(self):
+        public = self.post(self.bob, 'Hello', 'public')
+        private = self.post(self.bob, 'Secret', 'private')
+        client = self.clients[self.alice]
+
+        response = client.get(f"/api/post/{public['id']}/")
+        self.assertIn('public', response.headers['Cache-Control'])
+        self.assertIn('Authorization', response.headers['Vary'])
+        response = client.get(f"/api/post/{public['id']}/", HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('ETag', response.headers)
+        self.assertIn('private', client.get(f"/api/post/{private['id']}/").headers['Cache-Control'])
+
+
+class KeysetPaginationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.ids = [
+            Post.objects.create(user=self.alice, content=f'post {i}', visibility='public').pk for i in range(5)
+        ]
+
+    def walk(self, path, key, **params):
+        pages = []
+        response = self.client.get(path, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([post['id'] for post in response.data[key]])
+            if not response.data['next']:
+                return pages, response
+            response = self.client.get(response.data['next'])
+
+    def test_ties_on_created_at_are_broken_by_id(self):
+        Post.objects.update(created_at=timezone.now())
+        for path, key in (('/api/post/', 'results'), ('/api/post/my_posts/', 'posts')):
+            pages, _ = self.walk(path, key, page_size=2)
+            self.assertEqual(pages, [self.ids[:2:-1], self.ids[2:0:-1], self.ids[:1]])
+
+    def test_page_boundaries_are_stable_under_new_posts(self):
+        first = self.client.get('/api/post/', {'page_size': 2})
+        Post.objects.create(user=self.alice, content='newer', visibility='public')
+        second = self.client.get(first.data['next'])
+        self.assertEqual([post['id'] for post in second.data['results']], self.ids[2:0:-1])
+
+        previous = self.client.get(second.data['previous'])
+        self.assertEqual([post['id'] for post in previous.data['results']], self.ids[:2:-1])
+        self.assertIsNotNone(previous.data['previous'])
+
+    def test_invalid_cursors(self):
+        for cursor in ('not-a-cursor', 'cj0xJnQ9eA==', 'dD0yMDI0LTAxLTAx', '\u00e9'):
+            response = self.client.get('/api/post/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+    def test_page_size_is_capped(self):
+        with override_settings(FEED_MAX_PAGE_SIZE=3):
+            response = self.client.get('/api/post/', {'page_size': 100})
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class FragmentCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        for i in range(3):
+            Post.objects.create(user=self.bob, content=f'Post {i}', visibility='public')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def feed(self):
+        return self.client.get('/api/post/').data['results']
+
+    def test_repeat_reads_skip_serialization(self):
+        first = self.feed()
+        with patch.object(PostSerializer, 'to_representation', side_effect=AssertionError) as rendered:
+            self.assertEqual(self.feed(), first)
+        rendered.assert_not_called()
+
+    def test_lean_rows_are_cached(self):
+        first = self.feed()
+        with patch('posts.serializers.lean_post', side_effect=AssertionError) as rendered:
+            self.assertEqual(self.feed(), first)
+        rendered.assert_not_called()
+
+    @override_settings(LEAN_SERIALIZATION=False)
+    def test_instances_are_cached(self):
+        first = self.feed()
+        with patch.object(PostSerializer, 'to_representation', side_effect=AssertionError) as rendered:
+            self.assertEqual(self.feed(), first)
+        rendered.assert_not_called()
+
+    def test_scheme_is_part_of_key(self):
+        Post.objects.update(image='posts/a.png')
+        self.assertTrue(self.feed()[0]['image'].startswith('http://'))
+        self.assertTrue(self.client.get('/api/post/', secure=True).data['results'][0]['image'].startswith('https://'))
+
+    def test_matches_uncached_output(self):
+        UserConnection.objects.create(user_from=self.bob, user_to=self.alice, status='accepted')
+        self.feed()
+        with override_settings(POST_FRAGMENT_CACHE_TIMEOUT=0):
+            uncached = self.client.get('/api/post/').content
+        self.assertEqual(self.client.get('/api/post/').content, uncached)
+
+    def test_connection_status_is_overlaid_per_viewer(self):
+        self.feed()
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob)
+        self.assertEqual({post['user']['connection_status'] for post in self.feed()}, {'pending'})
+
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        self.assertEqual({post['user']['connection_status'] for post in client.get('/api/post/').data['results']}, {'none'})
+
+    def test_author_updates_invalidate(self):
+        self.feed()
+        self.bob.name = 'Robert'
+        self.bob.save()
+        self.assertEqual({post['user']['name'] for post in self.feed()}, {'Robert'})
+
+    @override_settings(POST_FRAGMENT_CACHE_TIMEOUT=0)
+    def test_can_be_disabled(self):
+        with patch('posts.serializers.render_posts') as render_posts:
+            self.assertEqual(len(self.feed()), 3)
+        render_posts.assert_not_called()
+
+
+class LeanSerializationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bób \u2028', 'bob@example.com', 'password')
+        UserConnection.objects.create(user_from=self.bob, user_to=self.alice, status='accepted')
+        liked = Post.objects.create(user=self.bob, content='Héllo "world"\n\u2029', visibility='public')
+        PostLike.objects.create(user=self.alice, post=liked)
+        Post.objects.create(
+            user=self.alice, content='Picture', visibility='private', image='posts/picture.jpg',
+            image_variants={'thumbnail': 'posts/variants/1/thumbnail.webp'},
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_feed_matches_model_serializers(self):
+        with override_settings(LEAN_SERIALIZATION=False, POST_FRAGMENT_CACHE_TIMEOUT=0):
+            expected = self.client.get('/api/post/')
+        response = self.client.get('/api/post/')
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response.headers['ETag'], expected.headers['ETag'])
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'naïve \u2028 "quoted" \\ \t\x01', 'number': 10 ** 20, 'nested': [{1: None, 'b': True}],
+            'when': timezone.now(), 'lazy': gettext_lazy('Invalid cursor'), 'empty': {},
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class LikeTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.posts = [Post.objects.create(user=self.bob, content=f'Post {i}', visibility='public') for i in range(4)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def like(self, post, user=None, action='like'):
+        client = self.client
+        if user is not None:
+            client = APIClient()
+            client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post(f'/api/post/{post.pk}/{action}/')
+
+    def like_count(self, post):
+        return Post.objects.values_list('like_count', flat=True).get(pk=post.pk)
+
+    def test_like_and_unlike(self):
+        post = self.posts[0]
+        self.assertEqual(self.like(post).status_code, 201)
+        self.assertEqual(self.like(post).status_code, 400)
+        self.assertEqual(self.like_count(post), 1)
+        data = self.client.get(f'/api/post/{post.pk}/').data
+        self.assertEqual((data['like_count'], data['liked_by_me']), (1, True))
+
+        self.assertEqual(self.like(post, action='unlike').status_code, 200)
+        self.assertEqual(self.like(post, action='unlike').status_code, 400)
+        self.assertEqual(self.like_count(post), 0)
+        data = self.client.get(f'/api/post/{post.pk}/').data
+        self.assertEqual((data['like_count'], data['liked_by_me']), (0, False))
+
+        self.assertEqual(self.client.post('/api/post/999999/like/').status_code, 404)
+        self.assertEqual(self.client.post('/api/post/999999/unlike/').status_code, 404)
+
+    @override_settings(LIKE_COUNT_FLUSH_INTERVAL=60)
+    def test_counts_are_written_in_batches(self):
+        carol = User.objects.create_user('1000000003', 'Carol', 'carol@example.com', 'password')
+        for user in (self.alice, self.bob, carol):
+            self.like(self.posts[0], user)
+        self.like(self.posts[1])
+        self.like(self.posts[2])
+        self.like(self.posts[3])
+        self.like(self.posts[3], action='unlike')
+        self.assertEqual(self.like_count(self.posts[0]), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(like_counts.flush(), 3)
+        # One UPDATE per distinct change: +3 and +1
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 2)
+        self.assertEqual([self.like_count(post) for post in self.posts], [3, 1, 1, 0])
+        self.assertEqual(like_counts.flush(), 0)
+
+    @override_settings(LIKE_COUNT_FLUSH_INTERVAL=60, LIKE_COUNT_BUFFER_SIZE=2)
+    def test_full_buffer_is_written_at_once(self):
+        self.like(self.posts[0])
+        self.assertEqual(self.like_count(self.posts[0]), 0)
+        self.like(self.posts[1])
+        self.assertEqual([self.like_count(post) for post in self.posts[:2]], [1, 1])
+
+    def test_liked_by_me_is_one_query_per_page(self):
+        self.like(self.posts[1])
+        self.like(self.posts[3])
+        for lean in (True, False):
+            with override_settings(LEAN_SERIALIZATION=lean), CaptureQueriesContext(connection) as queries:
+                results = self.client.get('/api/post/').data['results']
+            self.assertEqual(
+                {post['id'] for post in results if post['liked_by_me']}, {self.posts[1].pk, self.posts[3].pk}
+            )
+            self.assertEqual(len([query for query in queries if 'posts_postlike' in query['sql']]), 1)
+
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        self.assertFalse(any(post['liked_by_me'] for post in client.get('/api/post/').data['results']))
+
+    def test_like_changes_etag(self):
+        etag = self.client.get('/api/post/').headers['ETag']
+        with override_settings(LIKE_COUNT_FLUSH_INTERVAL=60):
+            self.like(self.posts[0])
+        response = self.client.get('/api/post/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_negative_counts_render_as_zero(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(like_count=-1)
+        self.assertEqual(self.client.get(f'/api/post/{self.posts[0].pk}/').data['like_count'], 0)
+        self.assertEqual(self.client.get('/api/post/').data['results'][-1]['like_count'], 0)
+
+    def test_reconcile(self):
+        PostLike.objects.create(user=self.alice, post=self.posts[0])
+        Post.objects.filter(pk=self.posts[1].pk).update(like_count=-1)
+        self.assertEqual(reconcile_like_counts(), 2)
+        self.assertEqual([self.like_count(post) for post in self.posts], [1, 0, 0, 0])
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Repaired like counts for 0 posts.', out.getvalue())
+
+
+class AsyncViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        UserConnection.objects.create(user_from=self.bob, user_to=self.alice, status='accepted')
+        for i in range(5):
+            post = Post.objects.create(user=self.bob, content=f'Post {i}', visibility=('public', 'private')[i % 2])
+            fan_out_post(post)
+            if i < 2:
+                PostLike.objects.create(user=self.alice, post=post)
+        self.auth = f"Bearer {RefreshToken.for_user(self.alice).access_token}"
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth)
+
+    def call(self, view, path, method='get', data=None, **kwargs):
+        factory = getattr(AsyncRequestFactory(), method)
+        headers = {'Authorization': self.auth} if self.auth else {}
+        request = factory(path, data or {}, headers={**headers, **kwargs.pop('headers', {})})
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_feed_matches_sync_view(self):
+        first = self.client.get('/api/post/', {'page_size': 2})
+        self.assertEqual(self.call(async_views.feed, '/api/post/', data={'page_size': 2}).content, first.content)
+
+        next_page = first.data['next']
+        response = self.call(async_views.feed, next_page)
+        self.assertEqual(response.content, self.client.get(next_page).content)
+
+    def test_retrieve_matches_sync_view(self):
+        post_id = Post.objects.filter(visibility='public').values_list('id', flat=True).first()
+        expected = self.client.get(f'/api/post/{post_id}/')
+        response = self.call(async_views.post_detail, f'/api/post/{post_id}/', pk=post_id)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response.headers['ETag'], expected.headers['ETag'])
+        self.assertEqual(response.headers['Cache-Control'], expected.headers['Cache-Control'])
+
+        response = self.call(
+            async_views.post_detail, f'/api/post/{post_id}/', pk=post_id,
+            headers={'If-None-Match': expected.headers['ETag']},
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_errors_match_sync_view(self):
+        response = self.call(async_views.post_detail, '/api/post/999999/', pk=999999)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, self.client.get('/api/post/999999/').content)
+
+        self.auth = None
+        response = self.call(async_views.feed, '/api/post/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.headers['WWW-Authenticate'], 'Bearer realm="api"')
+
+    def test_writes_go_to_viewset(self):
+        response = self.call(async_views.feed, '/api/post/', method='post', data={
+            'content': 'Written', 'visibility': 'public',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Post.objects.filter(content='Written', user=self.alice).exists())
+
+
+class EventStreamTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.carol = User.objects.create_user('1000000003', 'Carol', 'carol@example.com', 'password')
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='accepted')
+        self.token = str(RefreshToken.for_user(self.bob).access_token)
+        self.ticket = str(StreamTicket.for_user(self.bob))
+
+    def post_as(self, user, path, data=None):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post(path, data or {})
+
+    async def test_post_reaches_accepted_connections_only(self):
+        bob = get_broker().subscribe([user_channel(self.bob.pk)])
+        carol = get_broker().subscribe([user_channel(self.carol.pk)])
+        async with bob, carol:
+            response = await sync_to_async(self.post_as)(
+                self.alice, '/api/post/', {'content': 'Hello', 'visibility': 'private'}
+            )
+            event = await bob.get(timeout=1)
+            self.assertEqual(
+                {key: event[key] for key in ('type', 'post_id', 'user_id', 'visibility')},
+                {'type': 'post.created', 'post_id': response.data['id'], 'user_id': self.alice.pk,
+                 'visibility': 'private'},
+            )
+            self.assertIsNone(await carol.get(timeout=0.05))
+
+    async def test_stream(self):
+        request = AsyncRequestFactory().get('/api/events/', {'ticket': self.ticket})
+        response = await event_stream(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content
+        try:
+            self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+            await sync_to_async(self.post_as)(self.carol, f'/api/users/{self.bob.pk}/send_connection_request/')
+            self.assertEqual(
+                await anext(chunks),
+                f'event: connection.requested\ndata: {{"type":"connection.requested","user_id":{self.carol.pk}}}\n\n'.encode(),
+            )
+            await sync_to_async(self.post_as)(self.alice, '/api/post/', {'content': 'Hi', 'visibility': 'public'})
+            self.assertTrue((await anext(chunks)).startswith(b'event: post.created\n'))
+            with override_settings(EVENT_STREAM_HEARTBEAT=0.01):
+                self.assertEqual(await anext(chunks), b': keepalive\n\n')
+        finally:
+            await chunks.aclose()
+
+    async def test_stream_requires_a_token(self):
+        response = await event_stream(AsyncRequestFactory().get('/api/events/'))
+        self.assertEqual(response.status_code, 401)
+        response = await event_stream(AsyncRequestFactory().get('/api/events/', {'ticket': 'bad'}))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_access_tokens_are_not_tickets(self):
+        response = await event_stream(AsyncRequestFactory().get('/api/events/', {'ticket': self.token}))
+        self.assertEqual(response.status_code, 401)
+        # Nor is the old query parameter read
+        response = await event_stream(AsyncRequestFactory().get('/api/events/', {'access_token': self.token}))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_expired_ticket(self):
+        with override_settings(EVENT_STREAM_TICKET_LIFETIME=-1):
+            ticket = str(StreamTicket.for_user(self.bob))
+        response = await event_stream(AsyncRequestFactory().get('/api/events/', {'ticket': ticket}))
+        self.assertEqual(response.status_code, 401)
+
+    def test_tickets_are_not_access_tokens(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.ticket}')
+        self.assertEqual(client.get('/api/users/me/').status_code, 401)
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_ticket(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        response = client.post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StreamTicket(response.data['ticket'])['user_id'], self.bob.pk)
+        self.assertEqual(APIClient().post('/api/events/ticket/').status_code, 401)
+
+    def test_unavailable_without_async_views(self):
+        # Rather than the SPA shell, which EventSource would retry forever
+        response = self.client.get('/api/events/', {'ticket': self.ticket})
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        self.assertEqual(client.post('/api/events/ticket/').status_code, 501)
+
+
+class SQLProfilingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(SQL_PROFILING=True, SQL_PROFILING_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        Post.objects.create(user=self.alice, content='Hello', visibility='public')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/post/')
+        timing = dict(metric.split(';', 1) for metric in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'serialize', 'render', 'total'})
+        self.assertIn(f'desc="{len(captured)} queries (0 duplicated)"', timing['db'])
+
+    def test_duplicated_queries(self):
+        def view(request):
+            for user_id in (1, 2, 3):
+                User.objects.filter(pk=user_id).first()
+            return HttpResponse()
+
+        response = profiling.SQLProfilingMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('desc="3 queries (2 duplicated)"', response['Server-Timing'])
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            profiling.fingerprint("SELECT * FROM t WHERE a = %s AND b IN (%s, %s) AND c = 'x' LIMIT 21"),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ? LIMIT ?",
+        )
+
+    def test_report(self):
+        self.client.get('/api/post/')
+        self.client.get(f'/api/users/{self.alice.pk}/')
+        profiling.get_aggregate().flush(force=True)
+
+        out = StringIO()
+        call_command('sql_profile', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertIn('GET post-list', report)
+        self.assertGreaterEqual(report['GET post-list']['requests'], 1)
+        self.assertIn('GET user-detail', report)
+
+    @override_settings(SQL_PROFILING=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.SQLProfilingMiddleware(lambda request: HttpResponse())
+        self.assertNotIn('Server-Timing', APIClient().get('/api/post/'))
+
+
+class SyntheticDataTests(ApiTestCase):
+    def accepted_degrees(self, user_ids):
+        degrees = dict.fromkeys(user_ids, 0)
+        for user_from_id, user_to_id in UserConnection.objects.filter(
+            user_from_id__in=user_ids, status='accepted'
+        ).values_list('user_from_id', 'user_to_id'):
+            degrees[user_from_id] += 1
+            degrees[user_to_id] += 1
+        return sorted(degrees.values(), reverse=True)
+
+    def test_power_law_graph(self):
+        user_ids = seed_graph(200, 0, 600, seed=3, graph='power-law')
+        degrees = self.accepted_degrees(user_ids)
+        # A few hubs hold a large share of the connections
+        self.assertGreater(degrees[0], 5 * degrees[len(degrees) // 2])
+        self.assertEqual(UserConnection.objects.count(), 600)
+
+    def test_seed_is_reproducible(self):
+        first = seed_graph(50, 100, 80, seed=7, graph='power-law', public_ratio=0.5)
+        second = seed_graph(50, 100, 80, seed=7, graph='power-law', public_ratio=0.5)
+
+        def shape(user_ids):
+            index = {user_id: i for i, user_id in enumerate(user_ids)}
+            connections = UserConnection.objects.filter(user_from_id__in=user_ids)
+            posts = Post.objects.filter(user_id__in=user_ids)
+            return (
+                sorted((index[c.user_from_id], index[c.user_to_id], c.status) for c in connections),
+                sorted((index[p.user_id], p.visibility) for p in posts),
+            )
+        self.assertEqual(shape(first), shape(second))
+
+    def test_seed_after_deletions_and_foreign_mobiles(self):
+        first = seed_graph(3, 0, 0)
+        User.objects.filter(pk=first[0]).delete()
+        User.objects.create_user('+15550001', 'Dana', 'dana@example.com', 'password')
+        second = seed_graph(3, 0, 0)
+        self.assertEqual(len(second), 3)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(
+            sorted(User.objects.filter(pk__in=second).values_list('mobile', flat=True)),
+            ['9000000003', '9000000004', '9000000005'],
+        )
+
+    def test_seed_data_command(self):
+        out = StringIO()
+        call_command('seed_data', users=30, posts=60, connections=40, stdout=out)
+        self.assertEqual(User.objects.filter(email__startswith='seed').count(), 30)
+        self.assertIn('Posts: 60', out.getvalue())
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('feed=3, post=1'), {'feed': 3, 'search': 0, 'connect': 0, 'post': 1, 'like': 0})
+        for mix in ('feed=1,comment=1', 'feed=x', 'feed=0', 'search=-1'):
+            with self.assertRaises(ValueError):
+                parse_mix(mix)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestTests(LiveServerTestCase):
+    def setUp(self):
+        connection_graph.clear()
+        fragment_cache().clear()
+
+    def test_mixed_traffic(self):
+        user_ids = seed_graph(20, 50, 30, seed=1)
+        users = list(User.objects.filter(pk__in=user_ids[:3]).values_list('id', 'mobile'))
+        results = run_load_test(self.live_server_url, users, SEED_PASSWORD, concurrency=1, seconds=1.0)
+
+        self.assertEqual(set(results), {'feed', 'search', 'connect', 'post', 'total'})
+        self.assertGreater(results['total']['requests'], 0)
+        self.assertEqual(results['total']['errors'], 0)
+
+    @override_settings(LIKE_COUNT_FLUSH_INTERVAL=0)
+    def test_likes_on_hot_posts(self):
+        user_ids = seed_graph(20, 50, 30, seed=1)
+        users = list(User.objects.filter(pk__in=user_ids[:3]).values_list('id', 'mobile'))
+        results = run_load_test(self.live_server_url, users, SEED_PASSWORD, mix='like=1', concurrency=1, seconds=1.0)
+
+        self.assertGreater(results['like']['requests'], 0)
+        self.assertEqual((results['like']['rejected'], results['like']['errors']), (0, 0))
+        self.assertLessEqual(PostLike.objects.values('post').distinct().count(), HOT_POSTS)
+        self.assertEqual(sum(Post.objects.values_list('like_count', flat=True)), PostLike.objects.count())
+
+
+class StaticAssetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(assets.find_asset.cache_clear)
+        self.addCleanup(assets.get_spa_shell.cache_clear)
+        self.addCleanup(assets.fingerprinted_files.cache_clear)
+        assets.fingerprinted_files.cache_clear()
+        self.script = b"console.log('hello');\n" * 100
+        for name, content in (
+            ('app-Dq3xY7_k.js', self.script), ('app-Version1.js', self.script),
+            ('logo.svg', b'<svg/>'), ('logo-Dark2024.svg', b'<svg/>'), ('page.html', b'<p>' * 200),
+        ):
+            with open(os.path.join(self.directory, name), 'wb') as fh:
+                fh.write(content)
+        storage = assets.CompressedStaticFilesStorage(location=self.directory)
+        self.processed = {name: processed for name, _, processed in storage.post_process(
+            ['app-Dq3xY7_k.js', 'logo.svg', 'page.html']
+        )}
+        manifest = os.path.join(self.directory, 'manifest.json')
+        with open(manifest, 'w') as fh:
+            json.dump({'index.html': {
+                'file': 'assets/app-Dq3xY7_k.js', 'src': 'index.html', 'isEntry': True,
+                'css': ['assets/app-Bx9_fT2k.css'],
+            }}, fh)
+        settings = override_settings(STATIC_ROOT=self.directory, VITE_MANIFEST=manifest)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.factory = RequestFactory()
+
+    def get(self, path, **headers):
+        return assets.serve_asset(self.factory.get('/assets/' + path, headers=headers), path)
+
+    def test_precompressed(self):
+        self.assertEqual(self.processed, {'app-Dq3xY7_k.js': True, 'logo.svg': False, 'page.html': True})
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'app-Dq3xY7_k.js.gz')))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'logo.svg.gz')))
+
+        response = self.get('app-Dq3xY7_k.js', accept_encoding='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.script)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response = self.get('app-Dq3xY7_k.js', accept_encoding='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), self.script)
+
+    def test_cache_headers(self):
+        response = self.get('app-Dq3xY7_k.js')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.get('app-Dq3xY7_k.js', if_none_match=response['ETag']).status_code, 304)
+        self.assertEqual(self.get('page.html')['Cache-Control'], 'public, no-cache')
+        self.assertTrue(assets.is_fingerprinted('app-Bx9_fT2k.css'))
+
+    def test_names_that_look_hashed_are_revalidated(self):
+        # Not in the manifest, so they may change under the same name
+        for path in ('app-Version1.js', 'logo-Dark2024.svg'):
+            self.assertEqual(self.get(path)['Cache-Control'], 'public, no-cache')
+
+    def test_hashed_files_of_manifest_storage(self):
+        storage = ManifestStaticFilesStorage(location=self.directory)
+        storage.hashed_files = {'admin/css/base.css': 'admin/css/base.0123456789ab.css'}
+        with patch.object(assets, 'staticfiles_storage', storage):
+            self.assertTrue(assets.is_fingerprinted('admin/css/base.0123456789ab.css'))
+            self.assertFalse(assets.is_fingerprinted('admin/css/base.css'))
+
+    def test_missing_manifest(self):
+        with override_settings(VITE_MANIFEST=os.path.join(self.directory, 'missing.json')):
+            self.assertEqual(self.get('app-Dq3xY7_k.js')['Cache-Control'], 'public, no-cache')
+
+    def test_missing(self):
+        for path in ('missing.js', '../manage.py'):
+            with self.assertRaises(Http404):
+                self.get(path)
+
+    def test_spa_shell(self):
+        index = os.path.join(self.directory, 'page.html')
+        with override_settings(SPA_INDEX=index), self.assertNumQueries(0):
+            response = self.client.get('/feed/123', headers={'accept-encoding': 'gzip'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), b'<p>' * 200)
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+            self.assertEqual(self.client.get('/', headers={
+                'accept-encoding': 'gzip', 'if-none-match': response['ETag'],
+            }).status_code, 304)
+        self.assertFalse(response.templates)
+
+
+class ImageVariantTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, size=(1600, 900)):
+        exif = Image.Exif()
+        exif[0x010F] = 'Test Camera'
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+        image = SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+        with self.settings(MEDIA_ROOT=self.media_root, POST_IMAGE_ASYNC=False):
+            return self.client.post('/api/post/', {'content': 'photo', 'visibility': 'public', 'image': image})
+
+    def test_variants_are_resized_and_stripped(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(response.data['image_variants']), {'thumbnail', 'feed', 'full'})
+
+        post = Post.objects.get()
+        widths = {}
+        for name, path in post.image_variants.items():
+            with Image.open(f'{self.media_root}/{path}') as variant:
+                self.assertEqual(variant.format, 'WEBP')
+                self.assertFalse(variant.getexif())
+                widths[name] = variant.size
+        self.assertEqual(widths, {'thumbnail': (320, 180), 'feed': (1080, 608), 'full': (1600, 900)})
+
+    def test_rejects_files_that_are_not_images(self):
+        upload = SimpleUploadedFile('photo.jpg', b'not really a jpeg' * 100, content_type='image/jpeg')
+        response = self.client.post('/api/post/', {'content': 'photo', 'visibility': 'public', 'image': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertFalse(Post.objects.exists())
+
+    def test_rejects_oversized_uploads(self):
+        with self.settings(POST_IMAGE_MAX_UPLOAD_SIZE=1024):
+            response = self.upload()
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Post.objects.exists())
+
+    def test_posts_without_image_have_no_variants(self):
+        response = self.client.post('/api/post/', {'content': 'text', 'visibility': 'public'})
+        self.assertEqual(response.data['image_variants'], {})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImageUploadOverHttpTests(LiveServerTestCase):
+    """Refused uploads must reach a real client as a response, not a reset connection."""
+
+    def setUp(self):
+        user = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.token = str(RefreshToken.for_user(user).access_token)
+
+    def upload(self, content):
+        boundary = 'boundary'
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="content"\r\n\r\nphoto\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="photo.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'
+        ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+        request = urllib.request.Request(f'{self.live_server_url}/api/post/', data=body, headers={
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': f'multipart/form-data; boundary={boundary}',
+        })
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as error:
+            return error.code, json.load(error)
+
+    def test_oversized_image(self):
+        with self.settings(POST_IMAGE_MAX_UPLOAD_SIZE=16 * 1024):
+            # Small enough to pass the Content-Length check, refused mid-stream
+            status, data = self.upload(b'\xff\xd8\xff' + b'0' * 40 * 1024)
+        self.assertEqual(status, 413)
+        self.assertIn('image', data)
+
+    def test_not_an_image(self):
+        status, data = self.upload(b'not really a jpeg' * 20000)
+        self.assertEqual(status, 400)
+        self.assertIn('image', data)
+        self.assertFalse(Post.objects.exists())
+
+    def test_connection_is_not_reset(self):
+        handler = PostImageUploadHandler()
+        handler.new_file('image', 'photo.jpg', 'image/jpeg', 0, None)
+        with self.assertRaises(StopUpload) as raised:
+            handler.receive_data_chunk(b'not an image', 0)
+        self.assertFalse(raised.exception.connection_reset)
+        self.assertEqual(handler.status_code, 400)
@@ -0,0 +1,103 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+# Room for the non-file form fields and multipart boundaries
+FORM_OVERHEAD = 64 * 1024
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+
+def sniff_image_format(header):
+    """Return the image format named by the leading bytes of a file, if any."""
+    for signature, name in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return name
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+class StreamedImageFile(TemporaryUploadedFile):
+    """A temporary upload created in ``POST_IMAGE_UPLOAD_TEMP_DIR``."""
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        directory = settings.POST_IMAGE_UPLOAD_TEMP_DIR or settings.FILE_UPLOAD_TEMP_DIR
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix=".upload" + ext, dir=directory)
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+
+
+class PostImageUploadHandler(FileUploadHandler):
+    """
+    Stream a post image to disk chunk by chunk, validating it as it arrives.
+
+    Requests whose declared length exceeds ``POST_IMAGE_MAX_UPLOAD_SIZE`` are
+    refused before any of the body is read, files that do not start with a
+    known image signature are refused after the first chunk, and uploads that
+    grow past the limit stop being written as soon as they do; the rest of
+    the body is read and discarded. Memory use stays at one chunk whatever
+    the file size. The reason for a refusal is left in
+    ``error`` and ``status_code`` for the view to report.
+    """
+    field_name = 'image'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self.status_code = None
+
+    def reject(self, message, status_code):
+        self.error = message
+        self.status_code = status_code
+        # Without connection_reset the parser drains the rest of the body, so
+        # the view's error response reaches the client rather than a reset
+        raise StopUpload()
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > settings.POST_IMAGE_MAX_UPLOAD_SIZE + FORM_OVERHEAD:
+            self.error = self.too_large_message()
+            self.status_code = 413
+            # Returning parsed data stops Django from reading the body at all
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, field_name, *args, **kwargs):
+        if field_name != self.field_name:
+            raise SkipFile()
+        super().new_file(field_name, *args, **kwargs)
+        self.file = StreamedImageFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and sniff_image_format(raw_data[:16]) is None:
+            self.file.close()
+            self.reject("Upload a valid JPEG, PNG, GIF or WebP image.", 400)
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.file.close()
+            self.reject(self.too_large_message(), 413)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+    def too_large_message(self):
+        limit = settings.POST_IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)
+        return f"Image files may not be larger than {limit} MB."
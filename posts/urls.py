@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import PostViewSet
 
 post_router = DefaultRouter()
@@ -8,3 +10,10 @@ post_router.register(r'', PostViewSet, basename='post')
 urlpatterns = [
     path('post/', include(post_router.urls))
 ]
+
+# Under ASGI, serve the hot reads with async views ahead of the router
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('post/', async_views.feed),
+        path('post/<int:pk>/', async_views.post_detail),
+    ] + urlpatterns
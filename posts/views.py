@@ -1,65 +1,136 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import permissions
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from .models import Post
-from users.models import UserConnection
-from .serializers import PostSerializer
+from .likes import liked_post_ids
+from .models import Post, PostLike
+from .serializers import PostSerializer, POST_LEAN_VALUES
+from .pagination import KeysetCursorPagination
+from .feed import feed_sources, fan_out_post
+from .images import schedule_variants
+from .uploadhandlers import PostImageUploadHandler
+from backend.routers import replica_view
+from users.conditional import make_etag, not_modified, user_version, with_cache_headers
+
+
+def post_etag(request, posts, liked, *extra):
+    """
+    Return the ETag of ``posts`` (instances or lean rows) as rendered for the
+    requesting user, who has liked the ``liked`` post IDs, without
+    serializing them.
+    """
+    viewer = request.user
+    versions = [post_version(post) for post in posts]
+    return make_etag(viewer.pk, viewer.feed_version, request.get_host(), extra, versions, sorted(liked))
+
+
+def post_version(post):
+    """``(id, updated_at, author version)`` of a post or of a lean ``.values()`` row."""
+    if isinstance(post, dict):
+        return post['id'], post['updated_at'], user_version(post, 'user__')
+    return post.pk, post.updated_at, user_version(post.user)
+
 
 class PostViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
+    @replica_view
     def list(self, request):
         """Retrieve posts with respect to visibility and connection rules."""
-        user = request.user
-
-        # Get IDs of users the current user is connected to (accepted)
-        connected_user_ids = UserConnection.objects.filter(
-            user_from=user, status='accepted'
-        ).values_list('user_to_id', flat=True)
+        # Public posts OR private posts of self OR private posts from connected users,
+        # read from the user's precomputed timeline
+        visibility = request.query_params.get('visibility')
 
-        # Public posts OR private posts of self OR private posts from connected users
-        posts = Post.objects.filter(
-            Q(visibility='public') |
-            Q(user=user) |
-            Q(visibility='private', user_id__in=connected_user_ids)
-        )
+        paginator = KeysetCursorPagination()
+        keys = paginator.paginate_sources(feed_sources(request.user, visibility), request, view=self)
+        ids = [pk for _, pk in keys]
+        if settings.LEAN_SERIALIZATION:
+            posts = {row['id']: row for row in Post.objects.filter(pk__in=ids).values(*POST_LEAN_VALUES)}
+        else:
+            posts = Post.objects.select_related('user').in_bulk(ids)
+        page = [posts[pk] for pk in ids if pk in posts]
+        liked = liked_post_ids(request.user, ids)
 
-        # Optional: Filter by visibility if query param provided
-        visibility = request.query_params.get('visibility')
-        if visibility:
-            posts = posts.filter(visibility=visibility)
+        etag = post_etag(request, page, liked, paginator.get_next_link(), paginator.get_previous_link())
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
 
-        serializer = PostSerializer(posts.order_by('-created_at'), many=True)
-        return Response(serializer.data)
+        serializer = PostSerializer(page, many=True, context={"request": request, "liked_post_ids": liked})
+        return with_cache_headers(paginator.get_paginated_response(serializer.data), etag)
 
     def retrieve(self, request, pk=None):
         """Retrieve a single post by ID."""
-        post = get_object_or_404(Post, pk=pk)
-        serializer = PostSerializer(post)
-        return Response(serializer.data)
+        post = get_object_or_404(Post.objects.select_related('user'), pk=pk)
+        liked = liked_post_ids(request.user, [post.pk])
+        etag = post_etag(request, [post], liked)
+        public = post.visibility == 'public'
+        response = not_modified(request, etag, public)
+        if response is not None:
+            return response
+
+        serializer = PostSerializer(post, context={"request": request, "liked_post_ids": liked})
+        return with_cache_headers(Response(serializer.data), etag, public)
 
     def create(self, request):
         """Create a new post."""
-        serializer = PostSerializer(data=request.data)
+        # Stream and validate the image upload before the serializer sees it
+        upload_handler = PostImageUploadHandler(request)
+        request.upload_handlers = [upload_handler]
+        data = request.data
+        if upload_handler.error:
+            return Response({"image": [upload_handler.error]}, status=upload_handler.status_code)
+
+        # A new post has no likes to look up
+        serializer = PostSerializer(data=data, context={"request": request, "liked_post_ids": set()})
         if serializer.is_valid():
-            serializer.save(user=request.user)
+            with transaction.atomic():
+                post = serializer.save(user=request.user)
+                fan_out_post(post)
+                schedule_variants(post)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=["get"])
     def my_posts(self, request):
         """Retrieve posts created by the authenticated user."""
-        posts = Post.objects.filter(user=request.user)
+        posts = Post.objects.filter(user=request.user).select_related('user')
 
         visibility = request.query_params.get('visibility')
         if visibility:
             posts = posts.filter(visibility=visibility)
 
-        serializer = PostSerializer(posts, many=True)
+        paginator = KeysetCursorPagination()
+        page = paginator.paginate_queryset(posts, request, view=self)
+        serializer = PostSerializer(page, many=True, context={"request": request})
         return Response({
-            "count": posts.count(),
+            "count": posts.count() if visibility else request.user.post_count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
             "posts": serializer.data
         })
+
+    @action(detail=True, methods=["post"])
+    def like(self, request, pk=None):
+        """Like a post as the authenticated user."""
+        post = get_object_or_404(Post, pk=pk)
+        with transaction.atomic():
+            _, created = PostLike.objects.get_or_create(user=request.user, post=post)
+
+        if not created:
+            return Response({"detail": "Post already liked."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"detail": "Post liked."}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["post"])
+    def unlike(self, request, pk=None):
+        """Remove the authenticated user's like from a post."""
+        post = get_object_or_404(Post, pk=pk)
+        with transaction.atomic():
+            deleted, _ = PostLike.objects.filter(user=request.user, post=post).delete()
+
+        if not deleted:
+            return Response({"detail": "Post not liked."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"detail": "Post unliked."}, status=status.HTTP_200_OK)
@@ -0,0 +1,96 @@
+"""
+Async versions of the user list and search, retrieve and connections
+endpoints for ASGI deployments.
+
+They mirror the corresponding ``UserViewSet`` actions response for response
+but read through the async ORM and render lean ``.values()`` rows. They are
+routed in place of the DRF views when ``ASYNC_VIEWS`` is on.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from rest_framework.response import Response
+
+from backend.asyncapi import async_api_view
+from backend.routers import replica_view
+from .conditional import make_etag, not_modified, user_version, with_cache_headers
+from .graph import connection_graph
+from .models import User
+from .pagination import OffsetPagination
+from .search import UserSearch, search_filter
+from .serializers import UserSerializer, aconnection_status_map, lean_user, lean_user_values
+from .views import UserViewSet, connections_of
+
+
+async def render_users(request, rows):
+    statuses = await aconnection_status_map(request.user, {row['id'] for row in rows})
+    context = {"request": request, "connection_statuses": statuses}
+    return UserSerializer(rows, many=True, context=context).data
+
+
+@async_api_view(UserViewSet.as_view({'get': 'list'}), stateless_read=True)
+@replica_view
+async def user_list(request):
+    """Retrieve all users with optional search functionality"""
+    search = request.query_params.get('search', None)
+    if search:
+        # Ranked prefix matches from the full-text index
+        queryset = UserSearch(search, exclude_id=request.user.id).values(*lean_user_values())
+    else:
+        queryset = User.objects.exclude(id=request.user.id).order_by('id').values(*lean_user_values())
+
+    paginator = OffsetPagination()
+    page = await paginator.apaginate_queryset(queryset, request)
+    return paginator.get_paginated_response(await render_users(request, page))
+
+
+@async_api_view(UserViewSet.as_view({'get': 'retrieve'}))
+@replica_view
+async def user_detail(request, pk):
+    """Retrieve details of a single user"""
+    user = await User.objects.filter(pk=pk).values(*lean_user_values()).afirst()
+    if user is None:
+        raise Http404("No User matches the given query.")
+
+    etag = make_etag(request.user.pk, request.user.feed_version, user_version(user))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    data = await render_users(request, [user])
+    return with_cache_headers(Response(data[0]), etag)
+
+
+@async_api_view(UserViewSet.as_view({'get': 'connections'}))
+async def connections(request):
+    """Retrieve all user connections filtered by status (bidirectional)"""
+    user_id = request.query_params.get('user')
+    user = await aget_object_or_404(User, pk=user_id) if user_id else request.user
+
+    status_param = request.query_params.get('status')
+    search = request.query_params.get('search')
+
+    if status_param == 'accepted':
+        # Accepted neighbours come straight from the connection graph cache
+        neighbor_ids = await sync_to_async(connection_graph.neighbors)(user.id)
+        other_users = User.objects.filter(id__in=neighbor_ids)
+        if search:
+            other_users = other_users.filter(search_filter(search))
+        statuses = dict.fromkeys(neighbor_ids, 'accepted')
+        rows = [row async for row in other_users.values(*lean_user_values())]
+        connection_data = [lean_user(row, statuses) for row in rows]
+    else:
+        # Keep the other user's side of each connection
+        fields = ['user_from_id', 'status', *lean_user_values('user_from__'), *lean_user_values('user_to__')]
+        others = []
+        statuses = {}
+        async for row in connections_of(user, status_param, search).values(*fields):
+            prefix = 'user_to__' if row['user_from_id'] == user.id else 'user_from__'
+            others.append((row, prefix))
+            statuses[row[prefix + 'id']] = row['status']
+        connection_data = [lean_user(row, statuses, prefix) for row, prefix in others]
+
+    return Response({
+        "count": len(connection_data),
+        "connections": connection_data
+    })
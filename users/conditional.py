@@ -0,0 +1,57 @@
+"""
+Conditional GET support for the read endpoints.
+
+Views build an ETag from everything their representation depends on (row
+``updated_at`` watermarks, denormalized counters and the viewer's
+``feed_version``) before serializing anything, and answer with 304 when the
+client already holds it. No ``Last-Modified`` is sent: counters and
+``feed_version`` change representations without moving any ``updated_at``,
+so a date would let ``If-Modified-Since`` revalidate stale data.
+
+Every response varies by ``Authorization``. Representations that are the same
+for any viewer of a public post may be stored by shared caches, which must
+revalidate them; everything else is ``private``.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+
+def make_etag(*parts):
+    """Return a strong ETag for the given representation inputs."""
+    return '"%s"' % hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+VERSION_FIELDS = ('id', 'updated_at', 'post_count', 'accepted_connection_count')
+
+
+def user_version(user, prefix=''):
+    """
+    The fields of ``user`` that its serialized representation changes with.
+    ``user`` may also be a ``.values()`` row, read through ``prefix``.
+    """
+    if isinstance(user, dict):
+        return tuple(user[prefix + name] for name in VERSION_FIELDS)
+    return tuple(getattr(user, name) for name in VERSION_FIELDS)
+
+
+def not_modified(request, etag, public=False):
+    """
+    Return a 304 response if the client's ETag still matches, or ``None`` if
+    the view has to render the body.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        return None
+    return with_cache_headers(response, etag, public)
+
+
+def with_cache_headers(response, etag, public=False):
+    response.headers['ETag'] = etag
+    if public:
+        patch_cache_control(response, public=True, max_age=settings.HTTP_CACHE_PUBLIC_MAX_AGE, must_revalidate=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -0,0 +1,95 @@
+"""
+Denormalized per-user totals.
+
+``User.post_count``, ``accepted_connection_count`` and
+``pending_incoming_count`` are kept in step with the ``Post`` and
+``UserConnection`` write paths by relative ``F()`` updates, so concurrent
+writers never lose an increment and reads are a column lookup. The
+``reconcile_counters`` management command repairs any drift, e.g. after raw
+SQL or bulk loads that bypass the signals. ``feed_version`` is bumped the
+same way and only ever compared for equality, so it needs no reconciling.
+Every update drops the users from the authentication cache, whose copies
+would otherwise serve stale counters and ``feed_version`` ETags.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from backend.authentication import forget_principals
+from .models import User, UserConnection
+
+
+def apply_deltas(field, deltas):
+    """
+    Add ``deltas[user_id]`` to ``field`` for every user, with one UPDATE per
+    distinct delta rather than one per user.
+    """
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        # Counters that drifted low stay at zero rather than failing their
+        # CHECK constraint; reconcile_counters repairs them
+        User.objects.filter(pk__in=user_ids).update(**{field: Greatest(F(field) + delta, 0)})
+        forget_principals(*user_ids)
+
+
+def connection_deltas(pairs, old_status, new_status):
+    """
+    Return the counter changes, per field and user, of moving the
+    ``(user_from_id, user_to_id)`` connections in ``pairs`` from
+    ``old_status`` to ``new_status``; either may be ``None`` for a
+    connection that is being created or deleted.
+    """
+    accepted = Counter()
+    pending = Counter()
+    sign = {old_status: -1, new_status: 1} if old_status != new_status else {}
+    for status, delta in sign.items():
+        for user_from_id, user_to_id in pairs:
+            if status == 'accepted':
+                accepted[user_from_id] += delta
+                accepted[user_to_id] += delta
+            elif status == 'pending':
+                pending[user_to_id] += delta
+    return {'accepted_connection_count': accepted, 'pending_incoming_count': pending}
+
+
+def update_connection_counters(pairs, old_status, new_status):
+    for field, deltas in connection_deltas(pairs, old_status, new_status).items():
+        apply_deltas(field, deltas)
+    if old_status != new_status:
+        # Connection status is rendered into every post and profile they see
+        apply_deltas('feed_version', {user_id: 1 for pair in pairs for user_id in pair})
+
+
+def adjust_post_count(user_id, delta):
+    apply_deltas('post_count', {user_id: delta})
+
+
+def reconcile_counters():
+    """
+    Recompute every counter from the source tables and return the number of
+    users whose stored values were wrong.
+    """
+    from posts.models import Post
+
+    def count(queryset, field):
+        return Coalesce(Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+            .annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ), Value(0))
+
+    accepted = UserConnection.objects.filter(status='accepted')
+    expected = {
+        'post_count': count(Post.objects.all(), 'user'),
+        'accepted_connection_count': count(accepted, 'user_from') + count(accepted, 'user_to'),
+        'pending_incoming_count': count(UserConnection.objects.filter(status='pending'), 'user_to'),
+    }
+    drifted = Q()
+    for field, value in expected.items():
+        drifted |= ~Q(**{field: value})
+    forget_principals(*User.objects.filter(drifted).values_list('pk', flat=True))
+    return User.objects.filter(drifted).update(**expected)
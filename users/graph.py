@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import UserConnection
+
+
+class ConnectionGraphCache:
+    """
+    Per-process LRU cache of each user's accepted neighbour IDs.
+
+    Neighbour sets are loaded from ``UserConnection`` on first use and kept as
+    frozensets, so mutual-connection lookups are an in-memory intersection.
+    Entries are dropped by the ``UserConnection`` signals in ``users.signals``
+    and expire after ``CONNECTION_GRAPH_CACHE_TTL`` seconds to bound staleness
+    caused by writes in other processes. Every drop bumps the user's
+    generation, and a set loaded while the generation moved is returned but
+    not cached, as it may predate the change.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def neighbors(self, user_id):
+        """Return the IDs of every user with an accepted connection to ``user_id``."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+            generation = self._generations.get(user_id, 0)
+
+        neighbor_ids = self.load(user_id)
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return neighbor_ids
+            self._entries[user_id] = (now + settings.CONNECTION_GRAPH_CACHE_TTL, neighbor_ids)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > settings.CONNECTION_GRAPH_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return neighbor_ids
+
+    def mutual(self, user_a_id, user_b_id):
+        """Return the IDs of users connected to both ``user_a_id`` and ``user_b_id``."""
+        return self.neighbors(user_a_id) & self.neighbors(user_b_id)
+
+    def load(self, user_id):
+        # One covering index seek per direction rather than an OR across both
+        # columns, which the database can only answer by merging row IDs
+        outgoing = UserConnection.objects.filter(
+            user_from_id=user_id, status='accepted'
+        ).values_list('user_to_id', flat=True)
+        incoming = UserConnection.objects.filter(
+            user_to_id=user_id, status='accepted'
+        ).values_list('user_from_id', flat=True)
+        return frozenset(outgoing.union(incoming, all=True))
+
+    def invalidate(self, *user_ids):
+        """
+        Drop the cached neighbours of ``user_ids`` now and again once the
+        current transaction commits, so no reader caches the pre-commit state.
+        """
+        self._discard(user_ids)
+        transaction.on_commit(lambda: self._discard(user_ids))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            # Loads in flight must not cache what they read before the clear
+            for user_id in self._generations:
+                self._generations[user_id] += 1
+
+    def _discard(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+
+connection_graph = ConnectionGraphCache()
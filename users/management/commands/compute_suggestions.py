@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.suggestions import compute_suggestions
+
+
+class Command(BaseCommand):
+    help = "Precompute ranked people-you-may-know suggestions for every user."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, help="Suggestions kept per user (default: SUGGESTIONS_TOP_K).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = compute_suggestions(top_k=options['top_k'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} suggestions in {time.perf_counter() - started:.2f}s."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the user full-text search index from the users table."
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS("User search index rebuilt."))
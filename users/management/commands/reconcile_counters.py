@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.likes import reconcile_like_counts
+from users.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized post and connection counters on every user and the like counts on every post."
+
+    def handle(self, *args, **options):
+        repaired = reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(f"Repaired counters for {repaired} users."))
+        repaired = reconcile_like_counts()
+        self.stdout.write(self.style.SUCCESS(f"Repaired like counts for {repaired} posts."))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 19:30
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS users_user_fts "
+            "USING fts5(name, email, mobile, prefix='2 3', tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO users_user_fts (rowid, name, email, mobile) "
+            "SELECT id, name, email, mobile FROM users_user"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in ('name', 'email', 'mobile'):
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS users_user_{column}_trgm "
+                f"ON users_user USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS users_user_fts")
+    elif vendor == 'postgresql':
+        for column in ('name', 'email', 'mobile'):
+            schema_editor.execute(f"DROP INDEX IF EXISTS users_user_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_connectionsuggestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2 on 2026-10-18 18:56
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    UserConnection = apps.get_model('users', 'UserConnection')
+    Post = apps.get_model('posts', 'Post')
+
+    counters = {
+        'post_count': Counter(dict(
+            Post.objects.values_list('user_id').annotate(total=Count('id')).order_by()
+        )),
+        'accepted_connection_count': Counter(),
+        'pending_incoming_count': Counter(dict(
+            UserConnection.objects.filter(status='pending')
+            .values_list('user_to_id').annotate(total=Count('id')).order_by()
+        )),
+    }
+    accepted = UserConnection.objects.filter(status='accepted')
+    for field in ('user_from_id', 'user_to_id'):
+        counters['accepted_connection_count'].update(dict(
+            accepted.values_list(field).annotate(total=Count('id')).order_by()
+        ))
+
+    for field, totals in counters.items():
+        for user_id, total in totals.items():
+            User.objects.filter(pk=user_id).update(**{field: total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_search_index'),
+        ('posts', '0004_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='accepted_connection_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='pending_incoming_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_feed_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userconnection',
+            index=models.Index(fields=['user_from', 'status', 'user_to'], name='users_conn_from_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userconnection',
+            index=models.Index(fields=['user_to', 'status', 'user_from'], name='users_conn_to_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userconnection',
+            index=models.Index(condition=models.Q(('status', 'accepted')), fields=['user_from', 'user_to'], name='users_conn_accepted_idx'),
+        ),
+    ]
@@ -26,12 +26,31 @@ class User(AbstractUser):
     email = models.EmailField(unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized totals, maintained by users.counters
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+    accepted_connection_count = models.PositiveIntegerField(default=0, editable=False)
+    pending_incoming_count = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped whenever this user's connections change, which changes how
+    # every post and profile is rendered for them; part of their ETags
+    feed_version = models.PositiveIntegerField(default=0, editable=False)
     username = None
     USERNAME_FIELD = "mobile"
     REQUIRED_FIELDS = ['name', 'email']
     
     objects = CustomUserManager()
-    
+
+    COUNTER_FIELDS = ('post_count', 'accepted_connection_count', 'pending_incoming_count', 'feed_version')
+
+    def save(self, *args, **kwargs):
+        # The counters only change through F() updates; writing back the
+        # values loaded with this instance would undo concurrent increments
+        if self.pk is not None and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -51,7 +70,32 @@ class UserConnection(models.Model):
     
     class Meta:
         unique_together = ('user_from', 'user_to')  # Ensure a connection is unique
-        
+        # Bidirectional lookups run as one seek per direction (see
+        # users.graph.connection_pairs); with the other user's ID in the
+        # index, each seek is answered from the index alone
+        indexes = [
+            models.Index(fields=['user_from', 'status', 'user_to'], name='users_conn_from_status_idx'),
+            models.Index(fields=['user_to', 'status', 'user_from'], name='users_conn_to_status_idx'),
+            # The accepted graph alone, read whole by timeline rebuilds and
+            # pair by pair by the timeline backfill
+            models.Index(
+                fields=['user_from', 'user_to'], condition=models.Q(status='accepted'), name='users_conn_accepted_idx'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user_from.name} -> {self.user_from.name}"
-    
\ No newline at end of file
+
+# Precomputed "people you may know" entry, ranked per user by mutual connections
+class ConnectionSuggestion(models.Model):
+    user = models.ForeignKey(User, related_name='suggestions', on_delete=models.CASCADE)
+    suggested_user = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    mutual_count = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'rank')  # Also serves the ranked per-user read
+
+    def __str__(self):
+        return f"{self.user.name} may know {self.suggested_user.name}"
@@ -0,0 +1,82 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import QuerySet
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class OffsetPagination(BasePagination):
+    """
+    Limit/offset pagination that fetches one extra row instead of counting.
+
+    Works with querysets and with any other sliceable result set, such as
+    ``users.search.UserSearch``.
+    """
+    limit_query_param = 'limit'
+    offset_query_param = 'offset'
+
+    def __init__(self):
+        self.default_limit = settings.USER_SEARCH_PAGE_SIZE
+        self.max_limit = settings.USER_SEARCH_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.prepare(request)
+        return self.finish(list(queryset[self.offset:self.offset + self.limit + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async version of ``paginate_queryset``. Querysets are read with the
+        async ORM; other result sets are sliced in a worker thread.
+        """
+        self.prepare(request)
+        window = slice(self.offset, self.offset + self.limit + 1)
+        if isinstance(queryset, QuerySet):
+            rows = [row async for row in queryset[window]]
+        else:
+            rows = await sync_to_async(queryset.__getitem__)(window)
+        return self.finish(rows)
+
+    def prepare(self, request):
+        self.base_url = request.build_absolute_uri()
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+
+    def finish(self, rows):
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.limit_query_param],
+                strict=True,
+                cutoff=self.max_limit
+            )
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_offset(self, request):
+        try:
+            return _positive_int(request.query_params[self.offset_query_param])
+        except (KeyError, ValueError):
+            return 0
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.base_url, self.offset_query_param, self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.offset <= 0:
+            return None
+        if self.offset - self.limit <= 0:
+            return remove_query_param(self.base_url, self.offset_query_param)
+        return replace_query_param(self.base_url, self.offset_query_param, self.offset - self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,146 @@
+"""
+Full-text user search.
+
+On SQLite, users are indexed in the ``users_user_fts`` FTS5 table, kept in
+sync by the ``User`` signals in ``users.signals``; every search term is matched
+as a prefix and results are ranked by bm25 with the name weighted highest. On
+PostgreSQL, the ``pg_trgm`` GIN indexes created by the migration serve the
+``icontains`` filters and results are ranked by trigram similarity. Other
+backends fall back to unranked ``icontains`` filters.
+"""
+import re
+
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import User
+
+FTS_TABLE = 'users_user_fts'
+TOKEN_RE = re.compile(r'\w+')
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query matching every term as a prefix."""
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(text.lower()))
+
+
+def icontains_filter(text, prefix=''):
+    return (
+        Q(**{f'{prefix}name__icontains': text}) |
+        Q(**{f'{prefix}email__icontains': text}) |
+        Q(**{f'{prefix}mobile__icontains': text})
+    )
+
+
+def search_filter(text, prefix=''):
+    """
+    Return a ``Q`` matching users (through ``prefix`` when filtering a related
+    model) whose name, email or mobile matches ``text``.
+    """
+    if not fts_enabled():
+        return icontains_filter(text, prefix)
+    match = match_expression(text)
+    if not match:
+        return Q(**{f'{prefix}id__in': []})
+    return Q(**{f'{prefix}id__in': RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])})
+
+
+class UserSearch:
+    """
+    Lazily ranked search results that can be sliced like a queryset.
+
+    Each slice costs one ranked query for the matching IDs and one primary key
+    lookup for the users themselves.
+    """
+
+    def __init__(self, text, exclude_id=None, fields=None):
+        self.text = text
+        self.exclude_id = exclude_id
+        self.fields = fields
+
+    def values(self, *fields):
+        """Return the same search yielding ``.values()`` rows instead of users."""
+        return UserSearch(self.text, self.exclude_id, fields)
+
+    def __getitem__(self, page):
+        if not isinstance(page, slice):
+            raise TypeError("UserSearch only supports slicing.")
+        offset = page.start or 0
+        limit = page.stop - offset
+
+        if fts_enabled():
+            user_ids = self.fts_ids(offset, limit)
+        elif connection.vendor == 'postgresql':
+            user_ids = self.trigram_ids(offset, limit)
+        else:
+            user_ids = list(
+                self.filtered().order_by('id').values_list('id', flat=True)[offset:offset + limit]
+            )
+        if self.fields:
+            users = {row['id']: row for row in User.objects.filter(id__in=user_ids).values(*self.fields)}
+        else:
+            users = User.objects.in_bulk(user_ids)
+        return [users[user_id] for user_id in user_ids if user_id in users]
+
+    def filtered(self):
+        return User.objects.filter(icontains_filter(self.text)).exclude(id=self.exclude_id)
+
+    def fts_ids(self, offset, limit):
+        match = match_expression(self.text)
+        if not match:
+            return []
+        # Raw SQL bypasses the router, so ask it where User reads go
+        with connections[router.db_for_read(User)].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid != %s '
+                f'ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0), rowid LIMIT %s OFFSET %s',
+                [match, self.exclude_id or 0, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def trigram_ids(self, offset, limit):
+        from django.contrib.postgres.search import TrigramSimilarity
+        from django.db.models.functions import Greatest
+
+        return list(
+            self.filtered().annotate(similarity=Greatest(
+                TrigramSimilarity('name', self.text),
+                TrigramSimilarity('email', self.text),
+                TrigramSimilarity('mobile', self.text),
+            )).order_by('-similarity', 'id').values_list('id', flat=True)[offset:offset + limit]
+        )
+
+
+def index_user(user):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [user.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, email, mobile) VALUES (%s, %s, %s, %s)',
+            [user.pk, user.name, user.email, user.mobile]
+        )
+
+
+def unindex_user(user_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [user_id])
+
+
+def rebuild_search_index():
+    """Reindex every user, e.g. after bulk loads that bypass model signals."""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, email, mobile) '
+            f'SELECT id, name, email, mobile FROM {User._meta.db_table}'
+        )
@@ -1,7 +1,95 @@
+from django.conf import settings
 from rest_framework import serializers
-from django.db.models import Q
 from .models import User, UserConnection
 
+
+def connection_status_map(viewer, user_ids):
+    """Return the status of the latest connection between ``viewer`` and each of ``user_ids``."""
+    user_ids = set(user_ids) - {viewer.pk}
+    if not user_ids:
+        return {}
+    return latest_statuses(viewer, connections_with(viewer, user_ids))
+
+
+async def aconnection_status_map(viewer, user_ids):
+    """Async version of ``connection_status_map``."""
+    user_ids = set(user_ids) - {viewer.pk}
+    if not user_ids:
+        return {}
+    return latest_statuses(viewer, [row async for row in connections_with(viewer, user_ids)])
+
+
+def connections_with(viewer, user_ids):
+    """``viewer``'s connections with ``user_ids``, oldest first, as a UNION ALL of one index seek per direction."""
+    fields = ('user_from_id', 'user_to_id', 'status', 'created_at')
+    sent = UserConnection.objects.filter(user_from_id=viewer.pk, user_to_id__in=user_ids).values_list(*fields)
+    received = UserConnection.objects.filter(user_from_id__in=user_ids, user_to_id=viewer.pk).values_list(*fields)
+    return sent.union(received, all=True).order_by('created_at')
+
+
+def latest_statuses(viewer, connections):
+    # Later rows overwrite earlier ones, so the latest connection wins
+    return {
+        user_to_id if user_from_id == viewer.pk else user_from_id: status
+        for user_from_id, user_to_id, status, created_at in connections
+    }
+
+
+def resolve_connection_statuses(context, user_ids):
+    """
+    Load the viewer's connection status with every user in ``user_ids`` in one
+    query and share it with nested serializers through ``context``.
+    """
+    request = context.get("request")
+    if "connection_statuses" in context or not request or not request.user.is_authenticated:
+        return
+    context["connection_statuses"] = connection_status_map(request.user, set(user_ids))
+
+
+# Lean serialization: list serializers given ``.values()`` rows instead of
+# model instances build each representation directly, skipping the DRF field
+# machinery. The output must stay identical to ``UserSerializer``'s.
+
+# Formats datetimes exactly like the serializers' DateTimeFields
+DATETIME_FIELD = serializers.DateTimeField()
+
+
+def lean_user_values(prefix=''):
+    """The ``.values()`` names ``lean_user`` reads, through ``prefix`` for related rows."""
+    return [prefix + name for name in (
+        "id", "name", "email", "mobile", "created_at", "updated_at",
+        "is_active", "post_count", "accepted_connection_count",
+    )]
+
+
+def lean_user(row, statuses, prefix=''):
+    """Render a ``.values()`` row as ``UserSerializer`` would, fields in the same order."""
+    user_id = row[prefix + "id"]
+    return {
+        "id": user_id,
+        "name": row[prefix + "name"],
+        "email": row[prefix + "email"],
+        "mobile": row[prefix + "mobile"],
+        "created_at": DATETIME_FIELD.to_representation(row[prefix + "created_at"]),
+        "updated_at": DATETIME_FIELD.to_representation(row[prefix + "updated_at"]),
+        "is_active": row[prefix + "is_active"],
+        "post_count": row[prefix + "post_count"],
+        "accepted_connection_count": row[prefix + "accepted_connection_count"],
+        "connection_status": statuses.get(user_id, "none"),
+    }
+
+
+class UserListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, 'all') else data)
+        if users and isinstance(users[0], dict):
+            resolve_connection_statuses(self.context, [row["id"] for row in users])
+            statuses = self.context.get("connection_statuses") or {}
+            return [lean_user(row, statuses) for row in users]
+        resolve_connection_statuses(self.context, [user.pk for user in users])
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
     connection_status = serializers.SerializerMethodField()
 
@@ -15,26 +103,25 @@ class UserSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
             "is_active",
+            "post_count",
+            "accepted_connection_count",
             "connection_status"
         ]
-        read_only_fields = ["id", "created_at", "updated_at"]
+        read_only_fields = ["id", "created_at", "updated_at", "post_count", "accepted_connection_count"]
+        list_serializer_class = UserListSerializer
 
     def get_connection_status(self, obj):
         """Return the connection status between the requesting user and the target user."""
+        statuses = self.context.get("connection_statuses")
+        if statuses is not None:
+            return statuses.get(obj.pk, "none")
+
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return "none"
 
-        # Check for a connection either way
-        connection = UserConnection.objects.filter(
-            Q(user_from=request.user, user_to=obj) |
-            Q(user_from=obj, user_to=request.user)
-        ).order_by('-created_at').first()  # In case multiple, get the latest
-
-        if connection:
-            return connection.status  # 'accepted', 'pending', or 'rejected'
-        
-        return "none"
+        # Check for a connection either way; the latest wins
+        return connection_status_map(request.user, [obj.pk]).get(obj.pk, "none")
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -52,8 +139,6 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """Create a new user with hashed password."""
-        print(validated_data)
-        print("Creating user with:", validated_data)  # Debugging
         user = User.objects.create_user(**validated_data)
         return user
 
@@ -69,6 +154,19 @@ class RegisterSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("A user with this mobile number already exists.")
         return value
     
+class BulkConnectionSerializer(serializers.Serializer):
+    """Serializer for the user IDs of a bulk connection operation"""
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.CONNECTION_BULK_MAX_IDS,
+    )
+
+    def validate_user_ids(self, value):
+        """Drop duplicate IDs, keeping the first occurrence."""
+        return list(dict.fromkeys(value))
+
+
 class LoginSerializer(serializers.Serializer):
     mobile = serializers.CharField(max_length=15)
     password = serializers.CharField()
@@ -0,0 +1,100 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from backend.authentication import forget_principals
+from backend.pubsub import publish_event
+from backend.routers import pin_to_primary
+from .counters import update_connection_counters
+from .graph import connection_graph
+from .models import User, UserConnection
+from .search import index_user, unindex_user
+
+# Sent by bulk connection operations, which bypass the model signals, with the
+# (user_from_id, user_to_id) pairs whose connection moved from
+# ``previous_status`` (``None`` for new rows) to ``status``
+connections_bulk_updated = Signal()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_principal(sender, instance, **kwargs):
+    # Authenticated requests must see deactivations and profile edits
+    forget_principals(instance.pk)
+
+
+@receiver(post_save, sender=UserConnection)
+@receiver(post_delete, sender=UserConnection)
+def invalidate_connection_graph(sender, instance, **kwargs):
+    connection_graph.invalidate(instance.user_from_id, instance.user_to_id)
+
+
+@receiver(connections_bulk_updated)
+def invalidate_connection_graph_in_bulk(sender, pairs, **kwargs):
+    connection_graph.invalidate(*{user_id for pair in pairs for user_id in pair})
+
+
+@receiver(post_save, sender=UserConnection)
+@receiver(post_delete, sender=UserConnection)
+def pin_connected_users(sender, instance, **kwargs):
+    # Both users see the change in their feeds and profiles
+    pin_to_primary(instance.user_from_id, instance.user_to_id)
+
+
+@receiver(connections_bulk_updated)
+def pin_connected_users_in_bulk(sender, pairs, **kwargs):
+    pin_to_primary(*{user_id for pair in pairs for user_id in pair})
+
+
+@receiver(post_init, sender=UserConnection)
+def remember_connection_status(sender, instance, **kwargs):
+    instance._stored_status = instance.__dict__.get('status') if instance.pk else None
+
+
+def announce_connection(user_from_id, user_to_id, old_status, new_status):
+    if old_status == new_status:
+        return
+    if new_status == 'pending':
+        publish_event([user_to_id], 'connection.requested', user_id=user_from_id)
+    elif new_status == 'accepted':
+        publish_event([user_from_id], 'connection.accepted', user_id=user_to_id)
+
+
+# Registered before update_counters_on_save, which resets _stored_status
+@receiver(post_save, sender=UserConnection)
+def announce_connection_on_save(sender, instance, **kwargs):
+    announce_connection(instance.user_from_id, instance.user_to_id, instance._stored_status, instance.status)
+
+
+@receiver(connections_bulk_updated)
+def announce_connections_in_bulk(sender, pairs, status, previous_status=None, **kwargs):
+    for user_from_id, user_to_id in pairs:
+        announce_connection(user_from_id, user_to_id, previous_status, status)
+
+
+@receiver(post_save, sender=UserConnection)
+def update_counters_on_save(sender, instance, **kwargs):
+    pair = (instance.user_from_id, instance.user_to_id)
+    update_connection_counters([pair], instance._stored_status, instance.status)
+    instance._stored_status = instance.status
+
+
+@receiver(post_delete, sender=UserConnection)
+def update_counters_on_delete(sender, instance, **kwargs):
+    pair = (instance.user_from_id, instance.user_to_id)
+    update_connection_counters([pair], instance._stored_status, None)
+
+
+@receiver(connections_bulk_updated)
+def update_counters_in_bulk(sender, pairs, status, previous_status=None, **kwargs):
+    update_connection_counters(pairs, previous_status, status)
+
+
+@receiver(post_save, sender=User)
+def index_user_for_search(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'name', 'email', 'mobile'} & set(update_fields):
+        index_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user_for_search(sender, instance, **kwargs):
+    unindex_user(instance.pk)
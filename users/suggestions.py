@@ -0,0 +1,84 @@
+from collections import Counter
+from heapq import nlargest
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserConnection, ConnectionSuggestion
+
+
+def load_graph():
+    """
+    Load the connection graph in one pass over ``UserConnection``.
+
+    Returns the accepted adjacency sets and, per user, every user they already
+    have a connection row with in either direction and any status.
+    """
+    adjacency = {}
+    related = {}
+    for user_from_id, user_to_id, status in UserConnection.objects.values_list(
+        'user_from_id', 'user_to_id', 'status'
+    ).iterator():
+        related.setdefault(user_from_id, set()).add(user_to_id)
+        related.setdefault(user_to_id, set()).add(user_from_id)
+        if status == 'accepted':
+            adjacency.setdefault(user_from_id, set()).add(user_to_id)
+            adjacency.setdefault(user_to_id, set()).add(user_from_id)
+    return adjacency, related
+
+
+def rank_suggestions(user_id, adjacency, related, top_k):
+    """
+    Return up to ``top_k`` ``(suggested_user_id, mutual_count)`` pairs for ``user_id``.
+
+    This is one row of the sparse product A·A of the adjacency matrix: every
+    neighbour's neighbour set is added to a counter in a single C-level update,
+    then users who are the viewer or already related to them are dropped.
+    """
+    counts = Counter()
+    for neighbor_id in adjacency.get(user_id, ()):
+        counts.update(adjacency[neighbor_id])
+
+    excluded = related.get(user_id, set())
+    candidates = (
+        (candidate_id, count) for candidate_id, count in counts.items()
+        if candidate_id != user_id and candidate_id not in excluded
+    )
+    # Ties are broken by lowest user ID so results are deterministic
+    return nlargest(top_k, candidates, key=lambda item: (item[1], -item[0]))
+
+
+def compute_suggestions(top_k=None, batch_size=1000):
+    """
+    Recompute the top-K suggestions for every user with accepted connections.
+
+    Suggestions are replaced one batch of users at a time so readers never see
+    a user with a half-written list. Returns the number of rows written.
+    """
+    top_k = top_k or settings.SUGGESTIONS_TOP_K
+    started = timezone.now()
+    adjacency, related = load_graph()
+
+    user_ids = sorted(adjacency)
+    written = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        rows = [
+            ConnectionSuggestion(
+                user_id=user_id, suggested_user_id=suggested_id,
+                mutual_count=mutual_count, rank=rank,
+            )
+            for user_id in batch
+            for rank, (suggested_id, mutual_count) in enumerate(
+                rank_suggestions(user_id, adjacency, related, top_k)
+            )
+        ]
+        with transaction.atomic():
+            ConnectionSuggestion.objects.filter(user_id__in=batch).delete()
+            ConnectionSuggestion.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+
+    # Users who lost all their accepted connections keep no stale suggestions
+    ConnectionSuggestion.objects.filter(created_at__lt=started).delete()
+    return written
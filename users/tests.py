@@ -1,3 +1,763 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.authentication import principal_cache, principal_key
+from backend.pubsub import InProcessBroker, get_broker, user_channel
+from backend.routers import PrimaryReplicaRouter, is_pinned, replica_reads
+from posts.testing import ApiTestCase, QueryBudgetTestCase
+from posts.models import Post, FeedEntry
+from . import async_views
+from .counters import reconcile_counters
+from .graph import connection_graph
+from .models import User, UserConnection, ConnectionSuggestion
+from .suggestions import compute_suggestions
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertWithinBudget('users.list')
+
+    def test_search(self):
+        self.assertWithinBudget('users.search')
+
+    def test_retrieve(self):
+        self.assertWithinBudget('users.retrieve')
+
+    def test_register(self):
+        self.assertWithinBudget('users.register')
+
+    def test_login(self):
+        self.assertWithinBudget('users.login')
+
+    def test_me(self):
+        self.assertWithinBudget('users.me')
+
+    def test_connections(self):
+        self.assertWithinBudget('users.connections')
+
+    def test_send_connection_request(self):
+        self.assertWithinBudget('users.send_connection_request')
+
+    def test_accept_connection_request(self):
+        self.assertWithinBudget('users.accept_connection_request')
+
+    def test_reject_connection_request(self):
+        self.assertWithinBudget('users.reject_connection_request')
+
+    def test_bulk_send_connection_requests(self):
+        self.assertWithinBudget('users.bulk_send_connection_requests')
+
+    def test_bulk_accept_connection_requests(self):
+        self.assertWithinBudget('users.bulk_accept_connection_requests')
+
+    def test_bulk_reject_connection_requests(self):
+        self.assertWithinBudget('users.bulk_reject_connection_requests')
+
+    def test_mutual_connections(self):
+        self.assertWithinBudget('users.mutual_connections')
+
+    def test_pending_connections(self):
+        self.assertWithinBudget('users.pending_connections')
+
+    def test_suggestions(self):
+        self.assertWithinBudget('users.suggestions')
+
+
+class ConnectionStatusTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.carol = User.objects.create_user('1000000003', 'Carol', 'carol@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_list_reports_status_in_both_directions(self):
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='accepted')
+        UserConnection.objects.create(user_from=self.carol, user_to=self.alice, status='pending')
+
+        response = self.client.get('/api/users/')
+        statuses = {user['name']: user['connection_status'] for user in response.data['results']}
+        self.assertEqual(statuses, {'Bob': 'accepted', 'Carol': 'pending'})
+
+    def test_lean_list_matches_model_serializer(self):
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='accepted')
+        for params in ({}, {'search': 'a'}):
+            with override_settings(LEAN_SERIALIZATION=False):
+                expected = self.client.get('/api/users/', params).content
+            self.assertEqual(self.client.get('/api/users/', params).content, expected)
+
+    def test_latest_connection_wins(self):
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='rejected')
+        UserConnection.objects.create(user_from=self.bob, user_to=self.alice, status='pending')
+        self.assertEqual(self.client.get(f'/api/users/{self.bob.id}/').data['connection_status'], 'pending')
+
+    def test_status_queries_do_not_grow_with_page(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/users/')
+            return len(queries)
+
+        for lean in (True, False):
+            with self.subTest(lean=lean), override_settings(LEAN_SERIALIZATION=lean):
+                few = count_queries()
+                users = [
+                    User.objects.create_user(f'20000000{i:02d}', f'User {i}', f'user{i}@example.com', 'password')
+                    for i in range(10)
+                ]
+                for user in users[::2]:
+                    UserConnection.objects.create(user_from=self.alice, user_to=user, status='accepted')
+                self.assertEqual(count_queries(), few)
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def test_statuses_are_shared_by_nested_authors(self):
+        UserConnection.objects.create(user_from=self.bob, user_to=self.alice, status='accepted')
+        for i in range(3):
+            Post.objects.create(user=self.bob, content=f'Post {i}', visibility='public')
+            Post.objects.create(user=self.carol, content=f'Other {i}', visibility='public')
+        # Load the neighbour cache, which the feed reads too
+        connection_graph.neighbors(self.alice.pk)
+        with CaptureQueriesContext(connection) as queries:
+            posts = self.client.get('/api/post/').data['results']
+        self.assertEqual(
+            {(post['user']['name'], post['user']['connection_status']) for post in posts},
+            {('Bob', 'accepted'), ('Carol', 'none')},
+        )
+        self.assertEqual(len([query for query in queries if 'users_userconnection' in query['sql']]), 1)
+
+    def test_retrieve_without_connection(self):
+        response = self.client.get(f'/api/users/{self.bob.id}/')
+        self.assertEqual(response.data['connection_status'], 'none')
+
+    def test_mutual_connections(self):
+        UserConnection.objects.create(user_from=self.alice, user_to=self.carol, status='accepted')
+        UserConnection.objects.create(user_from=self.carol, user_to=self.bob, status='accepted')
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='pending')
+
+        response = self.client.get(f'/api/users/{self.bob.id}/mutual_connections/')
+        self.assertEqual([user['name'] for user in response.data], ['Carol'])
+
+
+class BulkConnectionTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000000', 'Alice', 'alice@example.com', 'password')
+        self.others = [
+            User.objects.create_user(f'10000000{i:02d}', f'User {i}', f'user{i}@example.com', 'password')
+            for i in range(1, 11)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def results(self, response):
+        return {result['user_id']: result['status'] for result in response.data['results']}
+
+    def test_send_reports_each_user(self):
+        bob = self.others[0]
+        UserConnection.objects.create(user_from=self.alice, user_to=bob)
+
+        response = self.client.post('/api/users/bulk_send_connection_requests/', {
+            'user_ids': [bob.id, self.others[1].id, self.others[1].id, self.alice.id, 999999]
+        }, format='json')
+        self.assertEqual(self.results(response), {
+            bob.id: 'already_exists', self.others[1].id: 'sent', self.alice.id: 'invalid', 999999: 'not_found'
+        })
+        self.assertEqual(UserConnection.objects.filter(user_from=self.alice).count(), 2)
+
+    def test_send_race_reports_already_exists(self):
+        bob, carol = self.others[:2]
+        original = UserConnection.objects.filter
+
+        def filter(*args, **kwargs):
+            # Another request connects to Bob between the lookup and the insert
+            if kwargs.get('user_to_id__in') == [bob.id, carol.id] and not UserConnection.objects.exists():
+                UserConnection.objects.create(user_from=self.alice, user_to=bob)
+                return original(pk=None)
+            return original(*args, **kwargs)
+
+        with patch.object(UserConnection.objects, 'filter', side_effect=filter):
+            response = self.client.post('/api/users/bulk_send_connection_requests/', {
+                'user_ids': [bob.id, carol.id]
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.results(response), {bob.id: 'already_exists', carol.id: 'sent'})
+        self.assertEqual(UserConnection.objects.filter(user_from=self.alice).count(), 2)
+        carol.refresh_from_db()
+        self.assertEqual(carol.pending_incoming_count, 1)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_query_count_does_not_grow_with_batch(self):
+        for user in self.others:
+            UserConnection.objects.create(user_from=user, user_to=self.alice)
+
+        # Savepoint, pending rows, update, three counter updates, feed version
+        # bump, queued timeline backfill, release
+        with self.assertNumQueries(9):
+            self.client.post('/api/users/bulk_accept_connection_requests/', {
+                'user_ids': [user.id for user in self.others]
+            }, format='json')
+        self.assertEqual(UserConnection.objects.filter(user_to=self.alice, status='accepted').count(), 10)
+
+    def test_accept_updates_graph_and_timelines(self):
+        bob, carol = self.others[:2]
+        UserConnection.objects.create(user_from=bob, user_to=self.alice)
+        post = Post.objects.create(user=bob, content='Hello', visibility='private')
+        connection_graph.neighbors(self.alice.id)
+
+        response = self.client.post('/api/users/bulk_accept_connection_requests/', {
+            'user_ids': [bob.id, carol.id]
+        }, format='json')
+        self.assertEqual(self.results(response), {bob.id: 'accepted', carol.id: 'not_found'})
+        self.assertEqual(connection_graph.neighbors(self.alice.id), {bob.id})
+        self.assertTrue(FeedEntry.objects.filter(owner=self.alice, post=post).exists())
+
+    def test_reject_only_outgoing_pending(self):
+        bob, carol = self.others[:2]
+        UserConnection.objects.create(user_from=self.alice, user_to=bob)
+        UserConnection.objects.create(user_from=carol, user_to=self.alice)
+
+        response = self.client.post('/api/users/bulk_reject_connection_requests/', {
+            'user_ids': [bob.id, carol.id]
+        }, format='json')
+        self.assertEqual(self.results(response), {bob.id: 'rejected', carol.id: 'not_found'})
+
+    def test_rejects_empty_and_oversized_batches(self):
+        response = self.client.post('/api/users/bulk_send_connection_requests/', {'user_ids': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/users/bulk_send_connection_requests/', {
+            'user_ids': list(range(1, settings.CONNECTION_BULK_MAX_IDS + 2))
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CounterTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+
+    def counts(self, user):
+        user.refresh_from_db()
+        return user.post_count, user.accepted_connection_count, user.pending_incoming_count
+
+    def test_posts_are_counted(self):
+        post = Post.objects.create(user=self.alice, content='Hello')
+        Post.objects.create(user=self.alice, content='Again')
+        self.assertEqual(self.counts(self.alice), (2, 0, 0))
+        post.delete()
+        self.assertEqual(self.counts(self.alice), (1, 0, 0))
+
+    def test_connection_lifecycle(self):
+        connection = UserConnection.objects.create(user_from=self.alice, user_to=self.bob)
+        self.assertEqual(self.counts(self.bob), (0, 0, 1))
+
+        connection.status = 'accepted'
+        connection.save()
+        self.assertEqual(self.counts(self.alice), (0, 1, 0))
+        self.assertEqual(self.counts(self.bob), (0, 1, 0))
+
+        UserConnection.objects.get(pk=connection.pk).delete()
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+
+    def test_saving_a_user_keeps_concurrent_increments(self):
+        stale = User.objects.get(pk=self.alice.pk)
+        Post.objects.create(user=self.alice, content='Hello')
+        stale.name = 'Alice Smith'
+        stale.save()
+        self.assertEqual(self.counts(self.alice), (1, 0, 0))
+
+    def test_drifted_counters_do_not_block_deletes(self):
+        # Rows written behind the signals' back, then removed through the ORM
+        Post.objects.bulk_create([Post(user=self.alice, content='Imported')])
+        UserConnection.objects.bulk_create([UserConnection(user_from=self.bob, user_to=self.alice, status='accepted')])
+        Post.objects.get().delete()
+        UserConnection.objects.get().delete()
+        self.assertEqual(self.counts(self.alice), (0, 0, 0))
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Post.objects.create(user=self.alice, content='Hello')
+        UserConnection.objects.create(user_from=self.bob, user_to=self.alice, status='accepted')
+        User.objects.update(post_count=7, accepted_connection_count=0, pending_incoming_count=3)
+
+        self.assertEqual(reconcile_counters(), 2)
+        self.assertEqual(self.counts(self.alice), (1, 1, 0))
+        self.assertEqual(self.counts(self.bob), (0, 1, 0))
+        self.assertEqual(reconcile_counters(), 0)
+
+
+class ConditionalGetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def revalidate(self, url):
+        etag = self.client.get(url).headers['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_profile_is_not_modified(self):
+        response = self.client.get(f'/api/users/{self.bob.id}/')
+        self.assertIn('Authorization', response.headers['Vary'])
+        self.assertIn('private', response.headers['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/users/{self.bob.id}/', HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_connection_change_invalidates_profile(self):
+        etag = self.client.get(f'/api/users/{self.bob.id}/').headers['ETag']
+        UserConnection.objects.create(user_from=self.bob, user_to=self.alice)
+        self.alice.refresh_from_db()
+
+        response = self.client.get(f'/api/users/{self.bob.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['connection_status'], 'pending')
+
+    def test_me_changes_with_counters(self):
+        self.assertEqual(self.revalidate('/api/users/me/').status_code, 304)
+        etag = self.client.get('/api/users/me/').headers['ETag']
+        Post.objects.create(user=self.alice, content='Hello', visibility='public')
+        self.alice.refresh_from_db()
+        self.assertEqual(self.client.get('/api/users/me/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_no_last_modified(self):
+        # feed_version and counters move without updated_at, so a date would go stale
+        response = self.client.get(f'/api/users/{self.bob.id}/')
+        self.assertNotIn('Last-Modified', response.headers)
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob)
+        self.alice.refresh_from_db()
+        response = self.client.get(f'/api/users/{self.bob.id}/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['connection_status'], 'pending')
+
+
+class AsyncViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.carol = User.objects.create_user('1000000003', 'Carol', 'carol@example.com', 'password')
+        self.dave = User.objects.create_user('1000000004', 'Dave', 'dave@example.com', 'password')
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='accepted')
+        UserConnection.objects.create(user_from=self.carol, user_to=self.alice, status='pending')
+        UserConnection.objects.create(user_from=self.carol, user_to=self.bob, status='accepted')
+        self.auth = f"Bearer {RefreshToken.for_user(self.alice).access_token}"
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth)
+
+    def assertMatchesSyncView(self, view, path, params=None, **kwargs):
+        request = AsyncRequestFactory().get(path, params or {}, headers={'Authorization': self.auth})
+        response = async_to_sync(view)(request, **kwargs)
+        expected = self.client.get(path, params or {})
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+
+    def test_list_and_search(self):
+        self.assertMatchesSyncView(async_views.user_list, '/api/users/')
+        self.assertMatchesSyncView(async_views.user_list, '/api/users/', {'limit': 1, 'offset': 1})
+        self.assertMatchesSyncView(async_views.user_list, '/api/users/', {'search': 'car'})
+
+    def test_retrieve(self):
+        self.assertMatchesSyncView(async_views.user_detail, f'/api/users/{self.carol.id}/', pk=self.carol.id)
+        self.assertMatchesSyncView(async_views.user_detail, '/api/users/999999/', pk=999999)
+
+    def test_connections(self):
+        for params in ({}, {'status': 'accepted'}, {'status': 'pending'}, {'search': 'bo'},
+                       {'status': 'accepted', 'search': 'bo'}, {'user': self.carol.id}, {'user': 999999}):
+            self.assertMatchesSyncView(async_views.connections, '/api/users/connections/', params)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_only_replica_reads_leave_the_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(User), 'default')
+        with replica_reads() as alias:
+            self.assertEqual(alias, 'replica_0')
+            self.assertEqual(router.db_for_read(User), 'replica_0')
+            self.assertEqual(router.db_for_write(User), 'default')
+        self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        router = PrimaryReplicaRouter()
+        self.assertIs(router.allow_migrate('replica_0', 'users'), False)
+        self.assertIsNone(router.allow_migrate('default', 'users'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        with replica_reads() as alias:
+            self.assertEqual(alias, 'default')
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(User), 'default')
+
+
+class SQLiteProductionModeTests(SimpleTestCase):
+    def test_connections_are_tuned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': os.path.join(directory, 'db.sqlite3'),
+                'OPTIONS': settings.SQLITE_PRODUCTION_OPTIONS,
+            }, alias='sqlite_production')
+            try:
+                with database.cursor() as cursor:
+                    pragmas = {
+                        name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                        for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')
+                    }
+            finally:
+                database.close()
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000,
+            'mmap_size': settings.SQLITE_PRAGMAS['mmap_size'], 'cache_size': settings.SQLITE_PRAGMAS['cache_size'],
+        })
+        self.assertEqual(database.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReadYourWritesTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.carol = User.objects.create_user('1000000003', 'Carol', 'carol@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def assertReadsFrom(self, user, alias):
+        with replica_reads(user) as used:
+            self.assertEqual(used, alias)
+
+    def test_post_pins_author(self):
+        self.assertReadsFrom(self.alice, 'replica_0')
+        response = self.client.post('/api/post/', {'content': 'Hello', 'visibility': 'public'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(is_pinned(self.alice.pk))
+        self.assertReadsFrom(self.alice, 'default')
+        self.assertReadsFrom(self.bob, 'replica_0')
+
+    def test_connection_change_pins_both_users(self):
+        response = self.client.post(f'/api/users/{self.bob.id}/send_connection_request/')
+        self.assertEqual(response.status_code, 201)
+        self.assertReadsFrom(self.alice, 'default')
+        self.assertReadsFrom(self.bob, 'default')
+        self.assertReadsFrom(self.carol, 'replica_0')
+
+    def test_bulk_connection_change_pins_users(self):
+        response = self.client.post('/api/users/bulk_send_connection_requests/', {'user_ids': [self.carol.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertReadsFrom(self.carol, 'default')
+        self.assertReadsFrom(self.bob, 'replica_0')
+
+    @override_settings(DATABASE_REPLICA_PIN_SECONDS=0)
+    def test_pins_expire(self):
+        self.client.post('/api/post/', {'content': 'Hello', 'visibility': 'public'})
+        self.assertReadsFrom(self.alice, 'replica_0')
+
+
+class PrincipalCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.alice).access_token}")
+
+    def test_cached_user_saves_query(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get('/api/users/me/')
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['name'], 'Alice')
+        self.assertEqual(len(warm), len(cold) - 1)
+        self.assertNotIn('password', principal_cache().get(principal_key(self.alice.pk))[1])
+
+    def test_save_invalidates(self):
+        self.client.get('/api/users/me/')
+        self.alice.is_active = False
+        self.alice.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_counter_change_invalidates(self):
+        first = self.client.get('/api/users/me/')
+        self.client.post('/api/post/', {'content': 'Hello', 'visibility': 'public'})
+        # post_count is part of the ETag, so a stale copy would answer 304
+        response = self.client.get('/api/users/me/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['post_count'], 1)
+
+    @override_settings(STATELESS_READS=True)
+    def test_stateless_reads(self):
+        self.alice.is_active = False
+        self.alice.save()
+        # Only the listed read actions trust the token alone
+        response = self.client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['id'] for user in response.data['results']], [self.bob.pk])
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    @override_settings(STATELESS_READS=True)
+    def test_stateless_async_reads(self):
+        self.alice.is_active = False
+        self.alice.save()
+        headers = {'Authorization': f"Bearer {RefreshToken.for_user(self.alice).access_token}"}
+        request = AsyncRequestFactory().get('/api/users/', headers=headers)
+        self.assertEqual(async_to_sync(async_views.user_list)(request).status_code, 200)
+        request = AsyncRequestFactory().get('/api/users/connections/', headers=headers)
+        self.assertEqual(async_to_sync(async_views.connections)(request).status_code, 401)
+
+
+class EventTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.carol = User.objects.create_user('1000000003', 'Carol', 'carol@example.com', 'password')
+
+    def post_as(self, user, path, data=None):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post(path, data or {}, format='json')
+
+    async def test_broker_delivers_across_threads(self):
+        broker = InProcessBroker()
+        async with broker.subscribe(['a', 'b']) as subscription:
+            await sync_to_async(broker.publish, thread_sensitive=False)(['b', 'c'], {'type': 'ping'})
+            self.assertEqual(await subscription.get(timeout=1), {'type': 'ping'})
+            self.assertIsNone(await subscription.get(timeout=0.01))
+        self.assertEqual(dict(broker.subscribers), {})
+
+    @override_settings(EVENT_STREAM_QUEUE_SIZE=2)
+    async def test_slow_subscribers_drop_oldest_events(self):
+        broker = InProcessBroker()
+        async with broker.subscribe(['a']) as subscription:
+            for n in range(3):
+                broker.publish(['a'], {'type': 'ping', 'n': n})
+            self.assertEqual((await subscription.get(timeout=1))['n'], 1)
+            self.assertEqual(subscription.dropped, 1)
+
+    async def test_connection_events(self):
+        alice = get_broker().subscribe([user_channel(self.alice.pk)])
+        bob = get_broker().subscribe([user_channel(self.bob.pk)])
+        async with alice, bob:
+            await sync_to_async(self.post_as)(self.alice, f'/api/users/{self.bob.pk}/send_connection_request/')
+            self.assertEqual(await bob.get(timeout=1), {'type': 'connection.requested', 'user_id': self.alice.pk})
+            await sync_to_async(self.post_as)(self.bob, f'/api/users/{self.alice.pk}/accept_connection_request/')
+            self.assertEqual(await alice.get(timeout=1), {'type': 'connection.accepted', 'user_id': self.bob.pk})
+            self.assertIsNone(await bob.get(timeout=0.01))
+
+    async def test_bulk_connection_events(self):
+        bob = get_broker().subscribe([user_channel(self.bob.pk)])
+        carol = get_broker().subscribe([user_channel(self.carol.pk)])
+        async with bob, carol:
+            await sync_to_async(self.post_as)(
+                self.alice, '/api/users/bulk_send_connection_requests/', {'user_ids': [self.bob.pk, self.carol.pk]}
+            )
+            for subscription in (bob, carol):
+                self.assertEqual(
+                    await subscription.get(timeout=1), {'type': 'connection.requested', 'user_id': self.alice.pk}
+                )
+
+
+class ConnectionGraphCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+
+    def test_neighbors_are_cached(self):
+        connection_graph.neighbors(self.alice.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(connection_graph.neighbors(self.alice.id), frozenset())
+
+    def test_connection_changes_invalidate(self):
+        connection = UserConnection.objects.create(user_from=self.alice, user_to=self.bob)
+        self.assertEqual(connection_graph.neighbors(self.bob.id), frozenset())
+
+        connection.status = 'accepted'
+        connection.save()
+        self.assertEqual(connection_graph.neighbors(self.alice.id), {self.bob.id})
+        self.assertEqual(connection_graph.neighbors(self.bob.id), {self.alice.id})
+
+        connection.delete()
+        self.assertEqual(connection_graph.neighbors(self.bob.id), frozenset())
+
+    def test_load_racing_a_change_is_not_cached(self):
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='accepted')
+
+        def stale_load(user_id):
+            # The read saw the database before the connection committed, and
+            # the commit's invalidation ran before the read finished
+            connection_graph._discard([user_id])
+            return frozenset()
+
+        with patch.object(connection_graph, 'load', side_effect=stale_load):
+            self.assertEqual(connection_graph.neighbors(self.alice.id), frozenset())
+        self.assertEqual(connection_graph.neighbors(self.alice.id), {self.bob.id})
+
+    @override_settings(CONNECTION_GRAPH_CACHE_SIZE=1)
+    def test_cache_is_bounded(self):
+        connection_graph.neighbors(self.alice.id)
+        connection_graph.neighbors(self.bob.id)
+        with self.assertNumQueries(1):
+            connection_graph.neighbors(self.alice.id)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Reads SQLite query plans")
+class ConnectionQueryPlanTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('1000000001', 'Alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('1000000002', 'Bob', 'bob@example.com', 'password')
+        self.carol = User.objects.create_user('1000000003', 'Carol', 'carol@example.com', 'password')
+        UserConnection.objects.create(user_from=self.alice, user_to=self.bob, status='accepted')
+        UserConnection.objects.create(user_from=self.carol, user_to=self.alice, status='pending')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def plans(self, call):
+        """Run ``call`` and return the query plan of each ``UserConnection`` query it made."""
+        with CaptureQueriesContext(connection) as queries:
+            call()
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if 'users_userconnection' in query['sql']:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plans.append([row[3] for row in cursor.fetchall()])
+        self.assertTrue(plans)
+        return plans
+
+    def assertIndexSeeks(self, plans):
+        for plan in plans:
+            self.assertIn('UNION ALL', ' '.join(plan))
+            self.assertNotIn('MULTI-INDEX OR', plan)
+            # The full-text index is a virtual table, scanned by match
+            scans = [line for line in plan if line.startswith('SCAN') and 'VIRTUAL TABLE' not in line]
+            self.assertEqual(scans, [])
+
+    def test_neighbors_seek_covering_indexes(self):
+        [plan] = self.plans(lambda: connection_graph.load(self.alice.id))
+        self.assertIndexSeeks([plan])
+        self.assertIn('COVERING INDEX users_conn_from_status_idx', ' '.join(plan))
+        self.assertIn('COVERING INDEX users_conn_to_status_idx', ' '.join(plan))
+        self.assertEqual(connection_graph.load(self.alice.id), {self.bob.id})
+        self.assertEqual(connection_graph.load(self.bob.id), {self.alice.id})
+
+    def test_connection_status(self):
+        self.assertIndexSeeks(self.plans(lambda: self.client.get('/api/users/')))
+        self.assertIndexSeeks(self.plans(lambda: self.client.get(f'/api/users/{self.carol.id}/')))
+        response = self.client.get(f'/api/users/{self.carol.id}/')
+        self.assertEqual(response.data['connection_status'], 'pending')
+
+    def test_connections_in_both_directions(self):
+        self.assertIndexSeeks(self.plans(lambda: self.client.get('/api/users/connections/')))
+        self.assertIndexSeeks(self.plans(
+            lambda: self.client.get('/api/users/connections/', {'status': 'pending', 'search': 'car'})
+        ))
+        response = self.client.get('/api/users/connections/')
+        self.assertEqual({user['name'] for user in response.data['connections']}, {'Bob', 'Carol'})
+        response = self.client.get('/api/users/connections/', {'status': 'pending', 'search': 'car'})
+        self.assertEqual([user['name'] for user in response.data['connections']], ['Carol'])
+
+
+class SuggestionTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user(f'100000000{i}', name, f'{name.lower()}@example.com', 'password')
+            for i, name in enumerate(['Alice', 'Bob', 'Carol', 'Dave', 'Erin'])
+        ]
+        alice, bob, carol, dave, erin = self.users
+        for user_from, user_to in [(alice, bob), (alice, carol), (bob, dave), (carol, dave), (carol, erin)]:
+            UserConnection.objects.create(user_from=user_from, user_to=user_to, status='accepted')
+        self.client = APIClient()
+        self.client.force_authenticate(alice)
+
+    def test_ranked_by_mutual_connections(self):
+        compute_suggestions(top_k=5)
+
+        response = self.client.get('/api/users/suggestions/')
+        self.assertEqual(
+            [(user['name'], user['mutual_count']) for user in response.data],
+            [('Dave', 2), ('Erin', 1)]
+        )
+
+    def test_hides_users_contacted_since_precompute(self):
+        compute_suggestions(top_k=5)
+        UserConnection.objects.create(user_from=self.users[0], user_to=self.users[3])
+
+        response = self.client.get('/api/users/suggestions/')
+        self.assertEqual([user['name'] for user in response.data], ['Erin'])
+
+    def test_recompute_replaces_previous_rows(self):
+        compute_suggestions(top_k=1)
+        compute_suggestions(top_k=1)
+        self.assertEqual(ConnectionSuggestion.objects.filter(user=self.users[0]).count(), 1)
+
+
+class UserSearchTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('9000000001', 'Alice Walker', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('9100000002', 'Bob Alison', 'bob@mail.test', 'password')
+        self.carol = User.objects.create_user('9200000003', 'Carol King', 'carol@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.carol)
+
+    def search(self, text, **params):
+        response = self.client.get('/api/users/', {'search': text, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_prefix_matches_are_ranked_by_name_first(self):
+        self.assertEqual([user['name'] for user in self.search('ali')['results']], ['Alice Walker', 'Bob Alison'])
+
+    def test_matches_email_and_mobile(self):
+        self.assertEqual([user['name'] for user in self.search('mail')['results']], ['Bob Alison'])
+        self.assertEqual([user['name'] for user in self.search('91000')['results']], ['Bob Alison'])
+
+    def test_excludes_requesting_user(self):
+        self.assertEqual(self.search('carol')['results'], [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.bob.name = 'Robert Stone'
+        self.bob.save()
+        self.assertEqual([user['name'] for user in self.search('rob')['results']], ['Robert Stone'])
+        self.assertEqual([user['name'] for user in self.search('alison')['results']], [])
+
+        self.alice.delete()
+        self.assertEqual(self.search('ali')['results'], [])
+
+    def test_paginates(self):
+        page = self.search('ali', limit=1)
+        self.assertEqual([user['name'] for user in page['results']], ['Alice Walker'])
+        self.assertIsNone(page['previous'])
+
+        page = self.client.get(page['next']).data
+        self.assertEqual([user['name'] for user in page['results']], ['Bob Alison'])
+        self.assertIsNone(page['next'])
+
+    def test_connections_search_matches_other_user(self):
+        UserConnection.objects.create(user_from=self.carol, user_to=self.alice, status='accepted')
+        UserConnection.objects.create(user_from=self.bob, user_to=self.carol, status='pending')
+
+        response = self.client.get('/api/users/connections/', {'search': 'ali', 'status': 'accepted'})
+        self.assertEqual([user['name'] for user in response.data['connections']], ['Alice Walker'])
+        response = self.client.get('/api/users/connections/', {'search': 'ali'})
+        self.assertEqual([user['name'] for user in response.data['connections']], ['Alice Walker', 'Bob Alison'])
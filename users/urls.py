@@ -1,5 +1,7 @@
+from django.conf import settings
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
+from . import async_views
 from .views import UserViewSet
 
 user_router = DefaultRouter()
@@ -7,4 +9,12 @@ user_router.register(r'', UserViewSet, basename='user')
 
 urlpatterns = [
     path('users/', include(user_router.urls)),  # Map UserViewSet routes directly to /api/users/
-]
\ No newline at end of file
+]
+
+# Under ASGI, serve the hot reads with async views ahead of the router
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('users/', async_views.user_list),
+        path('users/connections/', async_views.connections),
+        path('users/<int:pk>/', async_views.user_detail),
+    ] + urlpatterns
@@ -1,40 +1,80 @@
 from rest_framework import viewsets, status
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.db.models import Q
+from django.utils import timezone
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import action
 from django.contrib.auth import authenticate
 from rest_framework import permissions
 from rest_framework_simplejwt.tokens import RefreshToken
-from .serializers import UserSerializer, RegisterSerializer, LoginSerializer, UserConnectionSerializer
-from .models import User, UserConnection
-
-class UserViewSet(viewsets.ViewSet):
+from backend.authentication import StatelessReadsMixin
+from backend.routers import replica_view
+from .serializers import UserSerializer, RegisterSerializer, LoginSerializer, UserConnectionSerializer, BulkConnectionSerializer, lean_user_values
+from .models import User, UserConnection, ConnectionSuggestion
+from .graph import connection_graph
+from .signals import connections_bulk_updated
+from .conditional import make_etag, not_modified, user_version, with_cache_headers
+from .pagination import OffsetPagination
+from .search import UserSearch, search_filter
+
+def connections_of(user, status_param=None, search=None):
+    """Return ``user``'s connections in either direction, filtered by status and by the other user."""
+    sent = UserConnection.objects.filter(user_from=user)
+    received = UserConnection.objects.filter(user_to=user)
+    if status_param:
+        sent = sent.filter(status=status_param)
+        received = received.filter(status=status_param)
+
+    # Search filter on the other user in each connection
+    if search:
+        sent = sent.filter(search_filter(search, 'user_to__'))
+        received = received.filter(search_filter(search, 'user_from__'))
+
+    # A UNION ALL of one index seek per direction, kept as a plain queryset
+    # so callers can still join the users
+    ids = sent.values('pk').union(received.values('pk'), all=True)
+    return UserConnection.objects.filter(pk__in=ids)
+
+
+class UserViewSet(StatelessReadsMixin, viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    # Only read request.user.id
+    stateless_read_actions = ('list', 'mutual_connections', 'suggestions')
     
+    @replica_view
     def list(self, request):
         """Retrieve all users with optional search functionality"""
-        queryset = User.objects.all().exclude(id=request.user.id)
-        
         # Get single search query
         search = request.query_params.get('search', None)
 
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(email__icontains=search) |
-                Q(mobile__icontains=search)
-            )
+            # Ranked prefix matches from the full-text index
+            queryset = UserSearch(search, exclude_id=request.user.id)
+        else:
+            queryset = User.objects.all().exclude(id=request.user.id).order_by('id')
+        if settings.LEAN_SERIALIZATION:
+            queryset = queryset.values(*lean_user_values())
 
-        # Serialize the filtered queryset
-        serializer = UserSerializer(queryset, many=True, context={"request": request})
-        return Response(serializer.data)
+        paginator = OffsetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+
+        # Serialize the filtered page
+        serializer = UserSerializer(page, many=True, context={"request": request})
+        return paginator.get_paginated_response(serializer.data)
 
+    @replica_view
     def retrieve(self, request, pk=None):
         """Retrieve details of a single user"""
         user = get_object_or_404(User, pk=pk)
+        etag = make_etag(request.user.pk, request.user.feed_version, user_version(user))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
         serializer = UserSerializer(user, context={"request": request})
-        return Response(serializer.data)
+        return with_cache_headers(Response(serializer.data), etag)
 
     @action(detail=False, methods=["post"], permission_classes=[permissions.AllowAny])
     def register(self, request):
@@ -68,8 +108,13 @@ class UserViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def me(self, request):
+        etag = make_etag(user_version(request.user))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
         serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+        return with_cache_headers(Response(serializer.data), etag)
     
     @action(detail=False, methods=["get"])
     def connections(self, request):
@@ -78,30 +123,28 @@ class UserViewSet(viewsets.ViewSet):
         user = get_object_or_404(User, pk=user_id) if user_id else request.user
 
         status_param = request.query_params.get('status')
-
-        connections = UserConnection.objects.filter(
-            Q(user_from=user) | Q(user_to=user)
-        )
-        if status_param:
-            connections = connections.filter(status=status_param)
-
-        # Search filter
         search = request.query_params.get('search')
-        if search:
-            connections = connections.filter(
-                Q(user_from__name__icontains=search) |
-                Q(user_to__name__icontains=search) |
-                Q(user_from__email__icontains=search) |
-                Q(user_to__email__icontains=search)
-            )
 
-        # Get the other user in each connection
-        connection_data = []
-        for connection in connections:
-            other_user = connection.user_to if connection.user_from == user else connection.user_from
-            serialized_user = UserSerializer(other_user).data
-            serialized_user['connection_status'] = connection.status
-            connection_data.append(serialized_user)
+        if status_param == 'accepted':
+            # Accepted neighbours come straight from the connection graph cache
+            neighbor_ids = connection_graph.neighbors(user.id)
+            other_users = User.objects.filter(id__in=neighbor_ids)
+            if search:
+                other_users = other_users.filter(search_filter(search))
+            statuses = dict.fromkeys(neighbor_ids, 'accepted')
+        else:
+            # Get the other user in each connection
+            other_users = []
+            statuses = {}
+            connections = connections_of(user, status_param, search)
+            for connection in connections.select_related('user_from', 'user_to'):
+                other_user = connection.user_to if connection.user_from_id == user.id else connection.user_from
+                other_users.append(other_user)
+                statuses[other_user.id] = connection.status
+
+        connection_data = UserSerializer(
+            other_users, many=True, context={"connection_statuses": statuses}
+        ).data
 
         return Response({
             "count": len(connection_data),
@@ -122,12 +165,12 @@ class UserViewSet(viewsets.ViewSet):
         if existing_connection:
             return Response({"detail": "Connection request already exists."}, status=status.HTTP_400_BAD_REQUEST)
 
-        connection = UserConnection.objects.create(
-            user_from=request.user,
-            user_to=user_to,
-            status='pending'
-        )
-        connection.save()
+        with transaction.atomic():
+            UserConnection.objects.create(
+                user_from=request.user,
+                user_to=user_to,
+                status='pending'
+            )
 
         return Response({
             "detail": "Connection request sent successfully."
@@ -148,7 +191,8 @@ class UserViewSet(viewsets.ViewSet):
             return Response({"detail": "No pending connection request found."}, status=status.HTTP_400_BAD_REQUEST)
 
         connection.status = 'accepted'
-        connection.save()
+        with transaction.atomic():
+            connection.save()
 
         return Response({"detail": "Connection request accepted."}, status=status.HTTP_200_OK)
 
@@ -166,54 +210,148 @@ class UserViewSet(viewsets.ViewSet):
             return Response({"detail": "No pending connection request found."}, status=status.HTTP_400_BAD_REQUEST)
 
         connection.status = 'rejected'
-        connection.save()
+        with transaction.atomic():
+            connection.save()
 
         return Response({"detail": "Connection request rejected."}, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=["post"])
+    def bulk_send_connection_requests(self, request):
+        """Send connection requests to many users in one transaction"""
+        serializer = BulkConnectionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        user_ids = serializer.validated_data["user_ids"]
+
+        with transaction.atomic():
+            found_ids = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+            existing_ids = set(UserConnection.objects.filter(
+                user_from=request.user, user_to_id__in=user_ids
+            ).values_list('user_to_id', flat=True))
+
+            results = {}
+            for user_id in user_ids:
+                if user_id not in found_ids:
+                    results[user_id] = "not_found"
+                elif user_id == request.user.id:
+                    results[user_id] = "invalid"
+                elif user_id in existing_ids:
+                    results[user_id] = "already_exists"
+                else:
+                    results[user_id] = "sent"
+
+            sent = [user_id for user_id, result in results.items() if result == "sent"]
+            while True:
+                try:
+                    with transaction.atomic():
+                        UserConnection.objects.bulk_create([
+                            UserConnection(user_from=request.user, user_to_id=user_id, status='pending')
+                            for user_id in sent
+                        ])
+                    break
+                except IntegrityError:
+                    # A concurrent request connected some of them first
+                    raced = set(UserConnection.objects.filter(
+                        user_from=request.user, user_to_id__in=sent
+                    ).values_list('user_to_id', flat=True))
+                    if not raced:
+                        raise
+                    for user_id in raced:
+                        results[user_id] = "already_exists"
+                    sent = [user_id for user_id in sent if user_id not in raced]
+            connections_bulk_updated.send(
+                sender=UserConnection, pairs=[(request.user.id, user_id) for user_id in sent],
+                status='pending', previous_status=None
+            )
+
+        return Response(self._bulk_results(results), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"])
+    def bulk_accept_connection_requests(self, request):
+        """Accept pending connection requests from many users in one transaction"""
+        return self._bulk_update_pending(
+            request, lambda user_ids: Q(user_from_id__in=user_ids, user_to=request.user), 'user_from_id', 'accepted'
+        )
+
+    @action(detail=False, methods=["post"])
+    def bulk_reject_connection_requests(self, request):
+        """Reject many pending connection requests in one transaction"""
+        return self._bulk_update_pending(
+            request, lambda user_ids: Q(user_from=request.user, user_to_id__in=user_ids), 'user_to_id', 'rejected'
+        )
+
+    def _bulk_update_pending(self, request, match, other_field, new_status):
+        """Move the matching pending connections to ``new_status`` and report per user ID"""
+        serializer = BulkConnectionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        user_ids = serializer.validated_data["user_ids"]
+
+        with transaction.atomic():
+            pending = UserConnection.objects.select_for_update().filter(match(user_ids), status='pending')
+            pairs = {
+                values[other_field]: (values['user_from_id'], values['user_to_id'])
+                for values in pending.values('id', 'user_from_id', 'user_to_id')
+            }
+            UserConnection.objects.filter(
+                match(list(pairs)), status='pending'
+            ).update(status=new_status, updated_at=timezone.now())
+            connections_bulk_updated.send(
+                sender=UserConnection, pairs=list(pairs.values()), status=new_status, previous_status='pending'
+            )
+
+        results = {
+            user_id: new_status if user_id in pairs else "not_found"
+            for user_id in user_ids
+        }
+        return Response(self._bulk_results(results), status=status.HTTP_200_OK)
+
+    def _bulk_results(self, results):
+        return {
+            "results": [{"user_id": user_id, "status": result} for user_id, result in results.items()]
+        }
+
     @action(detail=True, methods=["get"])
     def mutual_connections(self, request, pk=None):
         """Returns mutual connections between the logged-in user and the profile user."""
         viewer = request.user
         profile_user = get_object_or_404(User, pk=pk)
 
-        # Get all accepted connections of viewer (both directions)
-        viewer_connections = UserConnection.objects.filter(
-            Q(user_from=viewer, status='accepted') | Q(user_to=viewer, status='accepted')
-        ).values_list('user_from_id', 'user_to_id')
-
-        viewer_ids = set()
-        for uf, ut in viewer_connections:
-            viewer_ids.add(uf if uf != viewer.id else ut)
-
-        # Get all accepted connections of profile_user (both directions)
-        profile_connections = UserConnection.objects.filter(
-            Q(user_from=profile_user, status='accepted') | Q(user_to=profile_user, status='accepted')
-        ).values_list('user_from_id', 'user_to_id')
-
-        profile_ids = set()
-        for uf, ut in profile_connections:
-            profile_ids.add(uf if uf != profile_user.id else ut)
-
-        # Find mutual connection IDs
-        mutual_ids = viewer_ids.intersection(profile_ids)
+        # Intersect both users' cached accepted neighbour sets
+        mutual_ids = connection_graph.mutual(viewer.id, profile_user.id)
 
         mutual_users = User.objects.filter(id__in=mutual_ids)
-        serializer = UserSerializer(mutual_users, many=True)
+        serializer = UserSerializer(mutual_users, many=True, context={"request": request})
         return Response(serializer.data)
 
 
+    @action(detail=False, methods=["get"])
+    def suggestions(self, request):
+        """Return precomputed people-you-may-know suggestions, best first."""
+        suggestions = list(
+            ConnectionSuggestion.objects.filter(user_id=request.user.id)
+            .select_related('suggested_user').order_by('rank')
+        )
+        serializer = UserSerializer(
+            [suggestion.suggested_user for suggestion in suggestions], many=True, context={"request": request}
+        )
+
+        # Hide suggestions the user has acted on since they were computed
+        data = []
+        for suggestion, user_data in zip(suggestions, serializer.data):
+            if user_data["connection_status"] == "none":
+                user_data["mutual_count"] = suggestion.mutual_count
+                data.append(user_data)
+        return Response(data)
+
     @action(detail=False, methods=["get"])
     def pending_connections(self, request):
         """Retrieve all pending connections"""
 
         user = request.user
-        connections = UserConnection.objects.filter(user_to=user, status='pending')
+        connections = UserConnection.objects.filter(user_to=user, status='pending').select_related('user_from', 'user_to')
         serializer = UserConnectionSerializer(connections, many=True)
         return Response({
-            "count": connections.count(),
+            "count": user.pending_incoming_count,
             "connections": serializer.data
         })
-
-from django.views.generic import TemplateView
-class IndexView(TemplateView):
-    template_name = "index.html"
\ No newline at end of file